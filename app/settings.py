@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 import environ
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,6 +40,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'escolinha.middleware.MedicaoConsultasMiddleware',
+    'escolinha.middleware.FixarPrimarioMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +77,60 @@ DATABASES = {
     "default": env.db(),
 }
 
+# Conexões persistentes por DB_CONN_MAX_AGE segundos; com DB_POOL (só
+# PostgreSQL/psycopg 3) usa o pool do driver, que exige CONN_MAX_AGE = 0.
+DB_POOL = env.bool("DB_POOL", default=False)
+
+# Réplica de leitura opcional: usada pelas views @leitura_replica e pelas
+# tarefas de relatório (escolinha.roteamento). Nos testes o alias existe
+# sempre, espelhando o default.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+DATABASE_REPLICA_URL = env.str("DATABASE_REPLICA_URL", default="")
+if DATABASE_REPLICA_URL:
+    DATABASES["replica"] = env.db_url_config(DATABASE_REPLICA_URL)
+elif TESTING:
+    DATABASES["replica"] = dict(DATABASES["default"])
+if "replica" in DATABASES:
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+DATABASE_REPLICA = "replica" if DATABASE_REPLICA_URL else None
+DATABASE_ROUTERS = ["escolinha.roteamento.ReplicaRouter"]
+# Segundos em que quem gravou algo lê só do primário
+REPLICA_FIXAR_SEGUNDOS = env.int("REPLICA_FIXAR_SEGUNDOS", default=10)
+
+for _banco in DATABASES.values():
+    _banco["CONN_HEALTH_CHECKS"] = True
+    if DB_POOL and "postgresql" in _banco["ENGINE"]:
+        _banco.setdefault("OPTIONS", {})["pool"] = True
+        _banco["CONN_MAX_AGE"] = 0
+    else:
+        _banco["CONN_MAX_AGE"] = env.int("DB_CONN_MAX_AGE", default=60)
+
+
+# Cache. Sem CACHE_URL fica em memória do processo (testes e desenvolvimento);
+# em produção use o Redis (o mesmo servidor do Celery em outro banco), senão
+# as invalidações de um processo não chegam aos outros.
+
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
+# Tempo máximo de uma entrada do dashboard; a invalidação é feita por versão
+DASHBOARD_CACHE_TIMEOUT = env.int("DASHBOARD_CACHE_TIMEOUT", default=60 * 60 * 24)
+# Agregações do dashboard executadas ao mesmo tempo (threads/conexões por processo)
+DASHBOARD_CONCORRENCIA = env.int("DASHBOARD_CONCORRENCIA", default=4)
+# Maior intervalo aceito pelos endpoints de métricas: cada mês é uma versão
+# na chave do cache e um ponto na série
+METRICAS_MAX_MESES = env.int("METRICAS_MAX_MESES", default=36)
+
+# Por quanto tempo o total aproximado das listas paginadas por cursor vale
+PAGINACAO_CONTAGEM_TIMEOUT = env.int("PAGINACAO_CONTAGEM_TIMEOUT", default=60 * 5)
+
+# Validade da lista de turmas em cache; a invalidação é feita por versão
+REFERENCIA_CACHE_TIMEOUT = env.int("REFERENCIA_CACHE_TIMEOUT", default=60 * 60 * 24)
+
+# Cache do resumo por turma em segundos (0 desliga)
+TURMAS_RESUMO_CACHE_TIMEOUT = env.int("TURMAS_RESUMO_CACHE_TIMEOUT", default=0)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -129,6 +186,47 @@ CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_TIMEZONE = 'America/Sao_Paulo'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Tamanho dos lotes de bulk_create na geração mensal de pagamentos
+MENSALIDADES_BATCH_SIZE = env.int('MENSALIDADES_BATCH_SIZE', default=1000)
+# Quantidade de alunos por subtarefa na geração paralela
+MENSALIDADES_SHARD_SIZE = env.int('MENSALIDADES_SHARD_SIZE', default=5000)
+# Linhas lidas do banco por vez na exportação de pagamentos
+EXPORTACAO_CHUNK_SIZE = env.int('EXPORTACAO_CHUNK_SIZE', default=2000)
+# Acima de quantas linhas a exportação CSV vira tarefa em segundo plano
+EXPORTACAO_LIMITE_STREAMING = env.int('EXPORTACAO_LIMITE_STREAMING', default=50000)
+
+# Linhas validadas e gravadas por lote na importação de CSV
+IMPORTACAO_BATCH_SIZE = env.int('IMPORTACAO_BATCH_SIZE', default=1000)
+
+# Pagamentos quitados com vencimento há mais de tantos meses vão para o
+# arquivo (escolinha.arquivamento), em lotes deste tamanho
+ARQUIVAMENTO_MESES = env.int('ARQUIVAMENTO_MESES', default=24)
+ARQUIVAMENTO_BATCH_SIZE = env.int('ARQUIVAMENTO_BATCH_SIZE', default=1000)
+
+# Medição por requisição (escolinha.middleware): acima destes limites a
+# requisição vai para o log "escolinha.consultas" com as consultas
+CONSULTAS_LIMITE = env.int('CONSULTAS_LIMITE', default=30)
+CONSULTAS_LIMITE_MS = env.int('CONSULTAS_LIMITE_MS', default=300)
+REQUISICAO_LIMITE_MS = env.int('REQUISICAO_LIMITE_MS', default=1000)
+CONSULTAS_SERVER_TIMING = env.bool('CONSULTAS_SERVER_TIMING', default=True)
+
+# Conciliação de extratos: dias aceitos entre o vencimento e o crédito
+CONCILIACAO_DIAS_ANTES = env.int('CONCILIACAO_DIAS_ANTES', default=15)
+CONCILIACAO_DIAS_DEPOIS = env.int('CONCILIACAO_DIAS_DEPOIS', default=45)
+
+# Envio de WhatsApp (escolinha.whatsapp): backend, gateway HTTP e limite
+WHATSAPP_BACKEND = env.str('WHATSAPP_BACKEND', default='escolinha.whatsapp.ArquivoBackend')
+WHATSAPP_ARQUIVO = env.str('WHATSAPP_ARQUIVO', default=str(BASE_DIR / 'whatsapp-saida.jsonl'))
+WHATSAPP_API_URL = env.str('WHATSAPP_API_URL', default='')
+WHATSAPP_API_TOKEN = env.str('WHATSAPP_API_TOKEN', default='')
+WHATSAPP_LOTE = env.int('WHATSAPP_LOTE', default=20)
+WHATSAPP_MENSAGENS_POR_MINUTO = env.int('WHATSAPP_MENSAGENS_POR_MINUTO', default=60)
+# Mensagem reservada (enviando) há mais tempo que isso: o worker morreu no meio
+WHATSAPP_RESERVA_EXPIRA_SEGUNDOS = env.int('WHATSAPP_RESERVA_EXPIRA_SEGUNDOS', default=15 * 60)
+# Dados do Pix usados nos modelos de mensagem ({chave_pix}, {nome_pix})
+PIX_CHAVE = env.str('PIX_CHAVE', default='51997457095')
+PIX_NOME = env.str('PIX_NOME', default='Renato da Costa')
+
 SESSION_COOKIE_NAME = "avcl_sessionid"
 CSRF_COOKIE_NAME = "avcl_csrftoken"
 
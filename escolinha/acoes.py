@@ -0,0 +1,72 @@
+# escolinha/acoes.py
+"""Ações em massa sobre pagamentos (tela de pagamentos).
+
+Cada ação roda em uma transação com um único ``UPDATE``/``DELETE`` sobre o
+queryset selecionado (ids marcados ou o resultado inteiro do filtro). O
+rollup é mantido agregando a seleção uma vez antes da alteração: a nova
+chave de cada grupo é conhecida (mesmo mês/turma com outra forma, outro
+mês etc.), então os deltas saem sem agregar de novo depois.
+"""
+from django.db import transaction
+
+from . import rollup
+from .filtros import filtrar_pagamentos, filtros_pagamentos
+from .models import Pagamento
+
+
+PAGAR = "pagar"
+VENCIMENTO = "vencimento"
+EXCLUIR = "excluir"
+ACOES = (
+    (PAGAR, "Marcar como pago"),
+    (VENCIMENTO, "Alterar vencimento"),
+    (EXCLUIR, "Excluir"),
+)
+
+
+def selecionar(params, ids=None, todos=False, hoje=None):
+    """Pagamentos alvo: o filtro inteiro de ``params`` ou só os ``ids``."""
+    if todos:
+        return filtrar_pagamentos(filtros_pagamentos(params), hoje=hoje)
+    return Pagamento.objects.filter(pk__in=ids or [])
+
+
+def _mover(pagamentos, nova_chave):
+    """Deltas do rollup para ``pagamentos`` passando de cada chave atual
+    para ``nova_chave(chave)``."""
+    antes = rollup.agregar(pagamentos)
+    depois = rollup.novos_deltas()
+    for chave_, (total, quantidade) in antes.items():
+        rollup.somar(depois, nova_chave(chave_), total, quantidade)
+    return rollup.diferenca(antes, depois)
+
+
+def marcar_pagos(pagamentos, data_pagamento, forma_pagamento):
+    """Baixa os pagamentos ainda em aberto; devolve quantos foram baixados."""
+    with transaction.atomic():
+        abertos = pagamentos.filter(data_pagamento__isnull=True).order_by()
+        deltas = _mover(abertos, lambda c: (c[0], c[1], forma_pagamento, True))
+        quantidade = abertos.update(data_pagamento=data_pagamento, forma_pagamento=forma_pagamento)
+        rollup.aplicar(deltas)
+    return quantidade
+
+
+def alterar_vencimento(pagamentos, data_vencimento):
+    with transaction.atomic():
+        pagamentos = pagamentos.order_by()
+        mes = data_vencimento.replace(day=1)
+        deltas = _mover(pagamentos, lambda c: (mes, c[1], c[2], c[3]))
+        quantidade = pagamentos.update(data_vencimento=data_vencimento)
+        rollup.aplicar(deltas)
+    return quantidade
+
+
+def excluir(pagamentos):
+    with transaction.atomic():
+        pagamentos = pagamentos.order_by()
+        # Sai do rollup tudo o que havia na seleção
+        deltas = rollup.diferenca(rollup.agregar(pagamentos), rollup.novos_deltas())
+        with rollup.suspenso():
+            quantidade = pagamentos.delete()[1].get(Pagamento._meta.label, 0)
+        rollup.aplicar(deltas)
+    return quantidade
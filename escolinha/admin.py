@@ -1,19 +1,77 @@
 from django.contrib import admin
-from .models import Aluno, Pagamento, Turma
+from django.db.models import Q
+from .busca import condicao
+from .mensagens import CAMPOS
+from .models import (
+    Aluno, Campanha, Conciliacao, LancamentoExtrato, MensagemCampanha, ModeloMensagem, Pagamento, Turma,
+)
 
 @admin.register(Aluno)
 class AlunoAdmin(admin.ModelAdmin):
     list_display = ("nome_completo", "nome_responsavel", "contato_responsavel")
     search_fields = ("nome_completo", "nome_responsavel")
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        # Nome sem acento pelo índice de busca; responsável como antes
+        return queryset.filter(condicao(search_term) | Q(nome_responsavel__icontains=search_term)), False
     
 
 @admin.register(Pagamento)
 class PagamentoAdmin(admin.ModelAdmin):
     list_display = ("aluno", "data_vencimento", "data_pagamento", "forma_pagamento", "valor", "esta_pago")
     list_filter = ("forma_pagamento", "data_vencimento")
+    list_select_related = ("aluno",)
     search_fields = ("aluno__nome_completo",)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(condicao(search_term, "aluno__nome_busca")), False
+
 @admin.register(Turma)
 class TurmaAdmin(admin.ModelAdmin):
     list_display = ("nome", "descricao", "status")
-    search_fields = ("nome",)
\ No newline at end of file
+    search_fields = ("nome",)
+
+
+class MensagemCampanhaInline(admin.TabularInline):
+    model = MensagemCampanha
+    fields = ("contato", "aluno", "status", "tentativas", "erro", "enviada_em")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(Campanha)
+class CampanhaAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "tipo", "status", "criado_por", "concluida_em")
+    list_filter = ("tipo", "status")
+    inlines = (MensagemCampanhaInline,)
+
+
+@admin.register(ModeloMensagem)
+class ModeloMensagemAdmin(admin.ModelAdmin):
+    list_display = ("tipo", "updated_at")
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        form.base_fields["texto"].help_text = "Campos disponíveis: " + ", ".join(
+            f"{{{campo}}} ({descricao})" for campo, descricao in CAMPOS.items()
+        )
+        return form
+
+
+class LancamentoExtratoInline(admin.TabularInline):
+    model = LancamentoExtrato
+    fields = ("data", "valor", "descricao", "status", "pagamento")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(Conciliacao)
+class ConciliacaoAdmin(admin.ModelAdmin):
+    list_display = ("arquivo", "criado_por", "created_at")
+    inlines = (LancamentoExtratoInline,)
@@ -0,0 +1,141 @@
+# escolinha/arquivamento.py
+"""Arquivamento por ano dos pagamentos antigos já quitados.
+
+``Pagamento`` fica só com o período em uso: ``arquivar`` move os pagamentos
+pagos com vencimento anterior a ``ARQUIVAMENTO_MESES`` meses para
+``PagamentoArquivado``, em lotes. No PostgreSQL o arquivo é particionado
+por ano (uma partição criada sob demanda para cada ano arquivado); nos
+demais bancos é uma tabela única com o ano na chave. Pagamentos ligados a
+lançamentos de conciliação ficam onde estão, para não perder o vínculo.
+
+O rollup ``FaturamentoMensal`` não muda ao arquivar e as métricas que leem
+os pagamentos direto também consultam o arquivo quando o período chega até
+ele (``ultimo_ano_arquivado``): o dashboard continua contando o histórico.
+``historico_pagamentos`` junta as duas tabelas quando o histórico
+arquivado é pedido.
+"""
+from dataclasses import asdict, dataclass, field
+from datetime import date
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import rollup
+from .datas import primeiro_dia, somar_meses
+from .models import Pagamento, PagamentoArquivado
+
+
+CHAVE_ULTIMO_ANO = "arquivamento:ultimo_ano"
+
+
+@dataclass
+class ResultadoArquivamento:
+    limite: date = None
+    pagamentos: int = 0
+    anos: list = field(default_factory=list)
+    tempo: float = 0.0
+
+    def as_dict(self):
+        return {**asdict(self), "limite": self.limite.isoformat() if self.limite else None}
+
+
+def limite_arquivamento(hoje=None, meses=None):
+    """Primeiro dia do mês a partir do qual os pagamentos ficam na tabela quente."""
+    hoje = hoje or timezone.now().date()
+    meses = settings.ARQUIVAMENTO_MESES if meses is None else meses
+    return somar_meses(primeiro_dia(hoje.year, hoje.month), -meses)
+
+
+def arquivaveis(limite):
+    """Pagamentos quitados com vencimento antes de ``limite``."""
+    return Pagamento.objects.filter(
+        data_pagamento__isnull=False, data_vencimento__lt=limite, lancamentos__isnull=True,
+    )
+
+
+def ultimo_ano_arquivado():
+    """Maior ano de vencimento no arquivo (0 se vazio), guardado em cache
+    até o próximo arquivamento; quem consulta períodos posteriores não
+    precisa ler o arquivo."""
+    ano = cache.get(CHAVE_ULTIMO_ANO)
+    if ano is None:
+        ano = PagamentoArquivado.objects.aggregate(ano=Max("ano"))["ano"] or 0
+        cache.set(CHAVE_ULTIMO_ANO, ano, timeout=None)
+    return ano
+
+
+def criar_particao(ano):
+    """Partição do ano no PostgreSQL; nos demais bancos não faz nada."""
+    conexao = connections[router.db_for_write(PagamentoArquivado)]
+    if conexao.vendor != "postgresql":
+        return
+    tabela = PagamentoArquivado._meta.db_table
+    with conexao.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {conexao.ops.quote_name(f'{tabela}_{ano}')} "
+            f"PARTITION OF {conexao.ops.quote_name(tabela)} FOR VALUES IN ({int(ano)})"
+        )
+
+
+def _arquivado(pagamento):
+    return PagamentoArquivado(
+        ano=pagamento.data_vencimento.year,
+        id=pagamento.id,
+        aluno_id=pagamento.aluno_id,
+        data_vencimento=pagamento.data_vencimento,
+        data_pagamento=pagamento.data_pagamento,
+        forma_pagamento=pagamento.forma_pagamento,
+        valor=pagamento.valor,
+        created_at=pagamento.created_at,
+    )
+
+
+def arquivar(limite=None, batch_size=None, progresso=None):
+    """Move os pagamentos de ``arquivaveis(limite)`` para o arquivo, um lote
+    por transação. ``progresso(arquivados)`` é chamado a cada lote."""
+    inicio = time.monotonic()
+    limite = limite or limite_arquivamento()
+    batch_size = batch_size or settings.ARQUIVAMENTO_BATCH_SIZE
+    resultado = ResultadoArquivamento(limite=limite)
+    anos = set()
+    while True:
+        with transaction.atomic():
+            lote = list(arquivaveis(limite).select_for_update(of=("self",)).order_by("id")[:batch_size])
+            if not lote:
+                break
+            for ano in {p.data_vencimento.year for p in lote} - anos:
+                criar_particao(ano)
+                anos.add(ano)
+            PagamentoArquivado.objects.bulk_create([_arquivado(p) for p in lote])
+            # Os valores continuam no rollup: só mudam de tabela
+            with rollup.suspenso():
+                Pagamento.objects.filter(pk__in=[p.pk for p in lote]).delete()
+            # Já e de novo no commit: quem leu no meio guardou o ano antigo
+            cache.delete(CHAVE_ULTIMO_ANO)
+            transaction.on_commit(lambda: cache.delete(CHAVE_ULTIMO_ANO))
+        resultado.pagamentos += len(lote)
+        if progresso:
+            progresso(resultado.pagamentos)
+    resultado.anos = sorted(anos)
+    resultado.tempo = round(time.monotonic() - inicio, 3)
+    return resultado
+
+
+def historico_pagamentos(aluno, arquivados=False):
+    """Pagamentos do aluno por vencimento (mais recentes primeiro); com
+    ``arquivados`` inclui os do arquivo, marcados com ``arquivado``."""
+    pagamentos = list(aluno.pagamentos.order_by("-data_vencimento", "-id"))
+    for pagamento in pagamentos:
+        pagamento.aluno = aluno
+    if arquivados:
+        antigos = list(aluno.pagamentos_arquivados.order_by("-data_vencimento", "-id"))
+        for pagamento in antigos:
+            pagamento.aluno = aluno
+        # O arquivo só tem vencimentos anteriores aos da tabela quente, mas
+        # pagamentos lançados depois com vencimento antigo podem se misturar
+        pagamentos = sorted(pagamentos + antigos, key=lambda p: (p.data_vencimento, p.id), reverse=True)
+    return pagamentos
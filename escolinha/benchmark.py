@@ -0,0 +1,200 @@
+# escolinha/benchmark.py
+"""Benchmark das telas e tarefas principais contra o banco configurado.
+
+Cada cenário chama a view diretamente (``RequestFactory``, sem middleware),
+passa pelo handler WSGI ou ASGI (dados do dashboard) ou chama a função de
+geração de mensalidades, ``repeticoes`` vezes, e registra a
+mediana e o mínimo em ms e a quantidade de consultas (contadas pelo mesmo
+wrapper do ``MedicaoConsultasMiddleware``). ``comparar`` aponta os
+cenários que ficaram mais lentos que a base além da tolerância ou que
+passaram a fazer mais consultas.
+"""
+from contextlib import ExitStack
+from itertools import product
+import statistics
+import time
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+from django.test import AsyncClient, Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import views
+from .datas import somar_meses
+from .mensalidades import gerar_pagamentos
+from .middleware import Medicao, medindo
+from .models import Aluno, Pagamento, Turma
+
+
+SEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+def _view(view, caminho, usuario, params=None, **kwargs):
+    fabrica = RequestFactory()
+    if iscoroutinefunction(view):
+        view = async_to_sync(view)
+
+    async def auser():
+        return usuario
+
+    def executar():
+        request = fabrica.get(caminho, params or {})
+        request.user = usuario
+        request.auser = auser
+        resposta = view(request, **kwargs)
+        if getattr(resposta, "streaming", False):
+            for _ in resposta.streaming_content:
+                pass
+        return resposta
+    return executar
+
+
+def _dados_dashboard(usuario, *nomes):
+    """GET nas rotas ``nomes`` pelos dois handlers, WSGI e ASGI, passando
+    pelos middlewares: o mesmo conjunto de endpoints nos dois caminhos."""
+    hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"])
+    wsgi, asgi = Client(), AsyncClient()
+    wsgi.force_login(usuario)
+    async_to_sync(asgi.aforce_login)(usuario)
+
+    def pelo_wsgi():
+        with hosts:
+            for nome in nomes:
+                wsgi.get(reverse(nome))
+
+    async def _pelo_asgi():
+        for nome in nomes:
+            await asgi.get(reverse(nome))
+
+    def pelo_asgi():
+        with hosts:
+            async_to_sync(_pelo_asgi)()
+    return pelo_wsgi, pelo_asgi
+
+
+def _gerar_proximo_mes():
+    # Mede a geração do mês seguinte e desfaz tudo no fim
+    proximo = somar_meses(timezone.now().date(), 1)
+    with transaction.atomic():
+        gerar_pagamentos(proximo.year, proximo.month)
+        transaction.set_rollback(True)
+
+
+def cenarios():
+    """``{nome: função sem argumentos}`` de tudo o que é medido."""
+    usuario = get_user_model().objects.filter(is_active=True).order_by("-is_superuser", "pk").first()
+    if usuario is None:
+        raise ValueError("Crie um usuário (createsuperuser) para medir as telas.")
+    hoje = timezone.now().date()
+    competencia = f"{hoje:%Y-%m}"
+    turma = Turma.objects.filter(status=True).order_by("pk").values_list("pk", flat=True).first()
+    aluno = Aluno.objects.order_by("pk").values_list("pk", "nome_busca").first()
+    # Aluno com mais histórico, o pior caso da lista de pagamentos
+    maior = (
+        Pagamento.objects.order_by().values("aluno_id").annotate(n=Count("id"))
+        .order_by("-n").values_list("aluno_id", flat=True).first()
+    )
+    termo = aluno[1].split()[-1] if aluno else ""
+
+    # Os widgets um endpoint de cada vez (como antes) e ``metricas_dashboard``
+    # com as agregações ao mesmo tempo, cada um pelos dois handlers
+    widgets = _dados_dashboard(usuario, "metricas_indicadores", "metricas_faturamento", "metricas_formas")
+    dados = _dados_dashboard(usuario, "metricas_dashboard")
+    resultado = {
+        "dashboard": _view(views.dashboard, "/dashboard/", usuario),
+        "dashboard_widgets[wsgi]": widgets[0],
+        "dashboard_widgets[asgi]": widgets[1],
+        "dashboard_dados[wsgi]": dados[0],
+        "dashboard_dados[asgi]": dados[1],
+        "metricas_indicadores": _view(views.metricas_indicadores, "/api/metricas/indicadores/", usuario),
+        "metricas_faturamento": _view(views.metricas_faturamento, "/api/metricas/faturamento/", usuario),
+        "metricas_formas": _view(views.metricas_formas, "/api/metricas/formas/", usuario),
+    }
+    if turma:
+        resultado["metricas_indicadores[turma]"] = _view(
+            views.metricas_indicadores, "/api/metricas/indicadores/", usuario, {"turma": turma},
+        )
+
+    # Todas as combinações de filtro da tela de pagamentos
+    for status, data, com_turma, com_aluno in product(
+        ("", "pendente", "atrasado", "pago"), ("", competencia), (False, True), (False, True),
+    ):
+        params = {
+            "status": status, "data": data,
+            "turma": turma if com_turma else "", "aluno": termo if com_aluno else "",
+        }
+        params = {chave: valor for chave, valor in params.items() if valor}
+        nome = "pagamentos_filter[" + ",".join(f"{c}={v}" for c, v in params.items()) + "]"
+        resultado[nome] = _view(views.pagamentos_filter_view, "/pagamentos/", usuario, params)
+
+    for ordem in ("nome", "saldo", "atrasado", "parcelas", "ultimo_pagamento"):
+        resultado[f"alunos_list[ordem={ordem}]"] = _view(views.alunos_list, "/", usuario, {"ordem": ordem})
+    resultado["alunos_list[q]"] = _view(views.alunos_list, "/", usuario, {"q": termo})
+    resultado["alunos_list[situacao=atrasado]"] = _view(
+        views.alunos_list, "/", usuario, {"situacao": "atrasado"},
+    )
+    if maior:
+        resultado["pagamentos_list"] = _view(
+            views.pagamentos_list, f"/alunos/{maior}/pagamentos/", usuario, aluno_id=maior,
+        )
+    resultado["gerar_pagamentos_mes"] = _gerar_proximo_mes
+    return resultado
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    consultas = 0
+    for _ in range(repeticoes):
+        with medindo(Medicao()) as medicao:
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        consultas = max(consultas, medicao.quantidade)
+    return {
+        "mediana_ms": round(statistics.median(tempos), 2),
+        "min_ms": round(min(tempos), 2),
+        "consultas": consultas,
+    }
+
+
+def executar(repeticoes=3, filtro="", com_cache=False, progresso=None):
+    """Roda os cenários (os que contêm ``filtro`` no nome) e devolve o relatório."""
+    with ExitStack() as pilha:
+        if not com_cache:
+            pilha.enter_context(override_settings(CACHES=SEM_CACHE))
+        resultados = {}
+        for nome, funcao in cenarios().items():
+            if filtro and filtro not in nome:
+                continue
+            resultados[nome] = medir(funcao, repeticoes)
+            if progresso:
+                progresso(nome, resultados[nome])
+    return {
+        "gerado_em": timezone.now().isoformat(),
+        "volumes": {
+            "turmas": Turma.objects.count(),
+            "alunos": Aluno.objects.count(),
+            "pagamentos": Pagamento.objects.count(),
+        },
+        "repeticoes": repeticoes,
+        "com_cache": com_cache,
+        "resultados": resultados,
+    }
+
+
+def comparar(atual, base, tolerancia=0.2):
+    """``[(cenário, motivo)]`` das regressões de ``atual`` em relação a ``base``."""
+    regressoes = []
+    for nome, medida in atual["resultados"].items():
+        anterior = base.get("resultados", {}).get(nome)
+        if not anterior:
+            continue
+        if medida["consultas"] > anterior["consultas"]:
+            regressoes.append((nome, f"consultas {anterior['consultas']} -> {medida['consultas']}"))
+        if medida["mediana_ms"] > anterior["mediana_ms"] * (1 + tolerancia):
+            regressoes.append((nome, f"mediana {anterior['mediana_ms']} ms -> {medida['mediana_ms']} ms"))
+    return regressoes
@@ -0,0 +1,34 @@
+# escolinha/busca.py
+"""Busca de alunos por nome sem acento e sem diferenciar maiúsculas.
+
+A busca usa ``Aluno.nome_busca`` (nome normalizado, mantido em
+``Aluno.save``): cada palavra digitada precisa ser o começo de alguma
+palavra do nome, em qualquer ordem. No PostgreSQL o índice trigram
+(``pg_trgm``) atende essas consultas ``LIKE``; nos demais bancos o prefixo
+do nome usa o índice comum.
+"""
+import unicodedata
+
+from django.db.models import Q
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com espaços simples: "  João  Conceição" -> "joao conceicao"."""
+    if not texto:
+        return ""
+    sem_acento = "".join(
+        c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c)
+    )
+    return " ".join(sem_acento.lower().split())
+
+
+def condicao(termo, campo="nome_busca"):
+    """``Q`` que casa cada palavra de ``termo`` com o início de uma palavra de ``campo``."""
+    resultado = Q()
+    for palavra in normalizar(termo).split():
+        resultado &= Q(**{f"{campo}__startswith": palavra}) | Q(**{f"{campo}__contains": f" {palavra}"})
+    return resultado
+
+
+def filtrar(queryset, termo, campo="nome_busca"):
+    return queryset.filter(condicao(termo, campo))
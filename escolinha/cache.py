@@ -0,0 +1,147 @@
+# escolinha/cache.py
+"""Cache do dashboard com invalidação por versão.
+
+Cada (mês, turma) tem uma versão, e há também uma por mês para o filtro
+"todas as turmas". As entradas em cache incluem na chave as versões dos
+meses que usam; qualquer alteração em um Pagamento troca as versões do seu
+mês e turma, e as entradas antigas deixam de ser lidas (expiram sozinhas
+pelo timeout). As versões são tokens aleatórios, não contadores: se o cache
+despejar uma versão, a nova nunca coincide com uma antiga ainda guardada.
+
+Falhas do cache nunca viram erro: uma leitura que falha calcula direto, e
+uma invalidação que falha fica pendente no processo, que calcula direto
+(sem ler o cache) até conseguir trocar as versões.
+"""
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+TODAS = "todas"
+CHAVE_HITS = "dashboard:stats:hits"
+CHAVE_MISSES = "dashboard:stats:misses"
+
+# Versões que este processo não conseguiu trocar; enquanto houver alguma o
+# cache pode estar desatualizado e não é lido
+_pendentes = set()
+_trava = threading.Lock()
+
+
+def _chave_versao(mes, turma):
+    return f"dashboard:versao:{mes:%Y-%m}:{turma or TODAS}"
+
+
+def _incrementar(chave):
+    # Contadores de hits/misses. add é atômico: só um processo cria o
+    # contador, os demais incrementam
+    if not cache.add(chave, 1, timeout=None):
+        try:
+            cache.incr(chave)
+        except ValueError:  # expirou/evictado entre o add e o incr
+            cache.set(chave, 1, timeout=None)
+
+
+def _token():
+    return uuid.uuid4().hex[:12]
+
+
+def versoes(meses, turma=None):
+    """Versões atuais dos ``meses`` (primeiros dias) para a turma ou todas."""
+    chaves = [_chave_versao(mes, turma) for mes in meses]
+    atuais = cache.get_many(chaves)
+    faltando = [chave for chave in chaves if chave not in atuais]
+    if faltando:
+        # add: se outro processo criou a versão ao mesmo tempo, vale a dele
+        for chave in faltando:
+            cache.add(chave, _token(), timeout=None)
+        atuais.update(cache.get_many(faltando))
+    return [atuais.get(chave) for chave in chaves]
+
+
+def invalidar(alteracoes):
+    """Troca as versões de cada ``(mes, turma_id)`` alterado e do mês no
+    filtro de todas as turmas, depois do commit da transação."""
+    chaves = set()
+    for mes, turma_id in alteracoes:
+        mes = mes.replace(day=1)
+        chaves.add(_chave_versao(mes, turma_id))
+        chaves.add(_chave_versao(mes, None))
+
+    def trocar_versoes():
+        # Roda depois do commit: uma falha do cache não pode virar erro de
+        # uma gravação que já aconteceu
+        try:
+            _trocar(chaves)
+        except Exception:
+            logger.exception("Falha ao invalidar o cache do dashboard: %s", sorted(chaves))
+            with _trava:
+                _pendentes.update(chaves)
+
+    if chaves:
+        transaction.on_commit(trocar_versoes)
+
+
+def _trocar(chaves):
+    cache.set_many({chave: _token() for chave in chaves}, timeout=None)
+
+
+def _sem_pendentes():
+    """Tenta de novo as invalidações que falharam; False se ainda falham."""
+    with _trava:
+        pendentes = set(_pendentes)
+    if not pendentes:
+        return True
+    try:
+        _trocar(pendentes)
+    except Exception:
+        return False
+    with _trava:
+        _pendentes.difference_update(pendentes)
+    logger.info("Invalidações pendentes do cache do dashboard aplicadas: %s", sorted(pendentes))
+    return True
+
+
+def obter_ou_calcular(nome, parametros, meses, turma, calcular):
+    """Valor em cache de ``nome`` para os ``parametros``, ou ``calcular()``.
+
+    ``meses`` são os meses cujos pagamentos afetam o resultado; a chave
+    inclui as versões deles, então qualquer alteração gera um miss. Com o
+    cache fora (ou uma invalidação pendente) calcula direto.
+    """
+    if not _sem_pendentes():
+        return calcular()
+    try:
+        versao = ".".join(str(v) for v in versoes(meses, turma))
+        chave = f"dashboard:{nome}:{':'.join(str(p) for p in parametros)}:{turma or TODAS}:{versao}"
+        valor = cache.get(chave)
+        if valor is not None:
+            _incrementar(CHAVE_HITS)
+            return valor
+        _incrementar(CHAVE_MISSES)
+    except Exception:
+        logger.exception("Falha ao ler o cache do dashboard (%s)", nome)
+        return calcular()
+    valor = calcular()
+    try:
+        cache.set(chave, valor, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+    except Exception:
+        logger.exception("Falha ao gravar o cache do dashboard (%s)", nome)
+    return valor
+
+
+def estatisticas():
+    contadores = cache.get_many([CHAVE_HITS, CHAVE_MISSES])
+    hits = contadores.get(CHAVE_HITS, 0)
+    misses = contadores.get(CHAVE_MISSES, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "taxa_acerto": round(hits / total * 100, 2) if total else None,
+    }
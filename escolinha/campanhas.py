@@ -0,0 +1,155 @@
+# escolinha/campanhas.py
+"""Campanhas de cobrança por WhatsApp.
+
+``criar_campanha`` seleciona os pagamentos em aberto que atendem aos filtros
+da tela de pagamentos e grava uma ``MensagemCampanha`` por contato (irmãos
+com o mesmo responsável recebem uma só mensagem), com o texto já
+renderizado a partir do modelo da campanha. O envio é feito pelas
+tarefas em ``escolinha.tasks``, em lotes espaçados para respeitar
+``WHATSAPP_MENSAGENS_POR_MINUTO``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import mensagens
+from .filtros import ORDEM_PAGAMENTOS, filtrar_pagamentos, filtros_pagamentos
+from .models import Campanha, MensagemCampanha
+from .whatsapp import ErroEnvioPermanente, obter_backend
+
+
+def criar_campanha(tipo, parametros, usuario=None, hoje=None):
+    """Cria a campanha e as mensagens para os filtros ``parametros``.
+
+    Só entram pagamentos em aberto: o status ``pago`` é ignorado e, sem
+    status, valem pendentes e atrasados. Quem responde por mais de um aluno
+    (ou tem mais de uma mensalidade em aberto) recebe uma só mensagem, com
+    os nomes e o total somado.
+    """
+    filtros = filtros_pagamentos(parametros)
+    if filtros["status"] == "pago":
+        filtros["status"] = ""
+    linhas = (
+        filtrar_pagamentos(filtros, hoje=hoje)
+        .filter(data_pagamento__isnull=True)
+        .exclude(aluno__contato_responsavel__isnull=True)
+        .exclude(aluno__contato_responsavel="")
+        .order_by(*ORDEM_PAGAMENTOS)
+        .values_list("aluno__contato_responsavel", "aluno_id", "aluno__nome_completo",
+                     "aluno__nome_responsavel", "valor", "data_vencimento")
+        .iterator(chunk_size=2000)
+    )
+    destinatarios = {}
+    for contato, aluno_id, nome, responsavel, valor, vencimento in linhas:
+        atual = destinatarios.setdefault(contato, {
+            "aluno_id": aluno_id, "nomes": [], "responsavel": responsavel,
+            "valor": 0, "vencimento": vencimento,
+        })
+        if nome not in atual["nomes"]:
+            atual["nomes"].append(nome)
+        atual["valor"] += valor
+        atual["vencimento"] = min(atual["vencimento"], vencimento)
+
+    modelo = mensagens.modelos()[tipo]
+    with transaction.atomic():
+        campanha = Campanha.objects.create(
+            tipo=tipo,
+            filtros={campo: filtros[campo] for campo in ("aluno", "status", "turma", "data")},
+            criado_por=usuario,
+        )
+        MensagemCampanha.objects.bulk_create([
+            MensagemCampanha(
+                campanha=campanha, aluno_id=dados["aluno_id"], contato=contato,
+                texto=mensagens.renderizar(modelo, mensagens.valores(
+                    " e ".join(dados["nomes"]), dados["responsavel"], dados["valor"], dados["vencimento"],
+                )),
+            )
+            for contato, dados in destinatarios.items()
+        ], batch_size=1000)
+    return campanha
+
+
+def lotes_pendentes(campanha):
+    """Ids das mensagens pendentes em lotes de ``WHATSAPP_LOTE``."""
+    ids = list(campanha.mensagens.filter(status=MensagemCampanha.PENDENTE).values_list("id", flat=True))
+    tamanho = settings.WHATSAPP_LOTE
+    return [ids[i:i + tamanho] for i in range(0, len(ids), tamanho)]
+
+
+def intervalo_entre_lotes():
+    """Segundos entre o início de dois lotes para não passar do limite."""
+    return settings.WHATSAPP_LOTE * 60 / settings.WHATSAPP_MENSAGENS_POR_MINUTO
+
+
+def enviar_lote(ids, ultima_tentativa=False, backend=None):
+    """Envia as mensagens pendentes de ``ids``; devolve os ids que falharam
+    temporariamente (para nova tentativa) e os contadores do lote.
+
+    Cada mensagem é reservada (``pendente -> enviando``, com ``reservada_em``)
+    com um ``UPDATE`` condicional, então uma tarefa entregue duas vezes não
+    envia em dobro.
+    """
+    backend = backend or obter_backend()
+    repetir = []
+    enviadas = falhas = 0
+    for mensagem in MensagemCampanha.objects.filter(pk__in=ids, status=MensagemCampanha.PENDENTE):
+        reservada = MensagemCampanha.objects.filter(
+            pk=mensagem.pk, status=MensagemCampanha.PENDENTE,
+        ).update(status=MensagemCampanha.ENVIANDO, reservada_em=timezone.now())
+        if not reservada:
+            continue
+        mensagem.tentativas += 1
+        try:
+            mensagem.id_externo = backend.enviar(mensagem.contato, mensagem.texto) or ""
+        except ErroEnvioPermanente as erro:
+            mensagem.status, mensagem.erro = MensagemCampanha.FALHA, str(erro)
+        except Exception as erro:  # ErroEnvio ou falha inesperada do backend
+            mensagem.erro = str(erro) or erro.__class__.__name__
+            if ultima_tentativa:
+                mensagem.status = MensagemCampanha.FALHA
+            else:
+                mensagem.status = MensagemCampanha.PENDENTE
+                repetir.append(mensagem.pk)
+        else:
+            mensagem.status, mensagem.erro = MensagemCampanha.ENVIADA, ""
+            mensagem.enviada_em = timezone.now()
+        mensagem.save(update_fields=["status", "tentativas", "erro", "id_externo", "enviada_em"])
+        if mensagem.status == MensagemCampanha.ENVIADA:
+            enviadas += 1
+        elif mensagem.status == MensagemCampanha.FALHA:
+            falhas += 1
+    return repetir, {"enviadas": enviadas, "falhas": falhas, "repetir": len(repetir)}
+
+
+def expirar_reservas(campanha_id):
+    """Marca como falha as mensagens reservadas há mais de
+    ``WHATSAPP_RESERVA_EXPIRA_SEGUNDOS`` (o worker parou entre a reserva e o
+    fim do envio). Não voltam para a fila: podem ter sido entregues."""
+    limite = timezone.now() - timedelta(seconds=settings.WHATSAPP_RESERVA_EXPIRA_SEGUNDOS)
+    return MensagemCampanha.objects.filter(
+        campanha_id=campanha_id, status=MensagemCampanha.ENVIANDO, reservada_em__lt=limite,
+    ).update(status=MensagemCampanha.FALHA, erro="Envio interrompido; a mensagem pode ter sido entregue.")
+
+
+def atualizar_status(campanha_id):
+    """Marca a campanha como concluída quando não há mais nada a enviar
+    (depois de expirar as reservas abandonadas)."""
+    expirar_reservas(campanha_id)
+    em_aberto = MensagemCampanha.objects.filter(
+        campanha_id=campanha_id, status__in=(MensagemCampanha.PENDENTE, MensagemCampanha.ENVIANDO),
+    ).exists()
+    if not em_aberto:
+        Campanha.objects.filter(pk=campanha_id).exclude(status=Campanha.CONCLUIDA).update(
+            status=Campanha.CONCLUIDA, concluida_em=timezone.now(),
+        )
+
+
+def resumo(campanha):
+    """Quantidade de mensagens por status, em uma query."""
+    contagem = dict(
+        campanha.mensagens.order_by().values("status").annotate(total=Count("id")).values_list("status", "total")
+    )
+    return {status: contagem.get(status, 0) for status, _ in MensagemCampanha.STATUS}
@@ -0,0 +1,282 @@
+# escolinha/conciliacao.py
+"""Conciliação de extratos bancários/Pix (CSV ou OFX) com os pagamentos.
+
+Fluxo de ``conciliar``:
+
+1. lê os créditos do extrato (``ler_extrato``);
+2. carrega de uma vez os pagamentos em aberto com vencimento na janela das
+   datas do extrato e monta índices em memória (por valor, por palavra do
+   nome do responsável/aluno e por telefone);
+3. pontua os candidatos de cada crédito só com esses índices, sem query por
+   lançamento;
+4. baixa os casos seguros com um único ``bulk_update`` (e os deltas do
+   rollup) e manda os ambíguos para a fila de revisão.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+import csv
+import hashlib
+import io
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+from . import rollup
+from .busca import normalizar
+from .models import Conciliacao, LancamentoExtrato, Pagamento
+
+
+# Palavras comuns em descrições de extrato que não identificam ninguém
+_IGNORAR = {"pix", "recebido", "recebida", "transferencia", "ted", "doc", "de", "da", "do", "dos", "das", "e",
+            "credito", "cred", "pagamento", "pgto", "ltda", "me"}
+
+PONTOS_TELEFONE = 3
+PONTOS_RESPONSAVEL = 2
+PONTOS_ALUNO = 1
+# Pontuação mínima (além do valor e da data) para baixar sem revisão
+PONTOS_CONFIAVEL = 2
+MAX_CANDIDATOS = 5
+
+
+@dataclass
+class Credito:
+    identificador: str
+    data: date
+    valor: Decimal
+    descricao: str
+
+
+# ----- Leitura do extrato -----
+def _valor(texto):
+    texto = texto.strip().replace("R$", "").replace(" ", "")
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    return Decimal(texto)
+
+
+def _data(texto):
+    texto = texto.strip()
+    for formato in ("%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {texto}")
+
+
+_COLUNAS = {
+    "data": ("data", "date", "data_lancamento", "data_movimento"),
+    "valor": ("valor", "amount", "valor_r$", "credito"),
+    "descricao": ("descricao", "historico", "memo", "nome", "detalhes", "lancamento"),
+}
+
+
+def ler_csv(texto):
+    """Créditos de um extrato CSV (colunas de data, valor e descrição)."""
+    try:
+        dialeto = csv.Sniffer().sniff(texto[:4096], delimiters=",;")
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(io.StringIO(texto), dialect=dialeto)
+    cabecalho = {normalizar(nome).replace(" ", "_"): nome for nome in leitor.fieldnames or []}
+    colunas = {}
+    for campo, nomes in _COLUNAS.items():
+        colunas[campo] = next((cabecalho[n] for n in nomes if n in cabecalho), None)
+    if not colunas["data"] or not colunas["valor"]:
+        raise ValueError("O CSV precisa das colunas de data e valor.")
+
+    creditos = []
+    vistos = defaultdict(int)
+    for linha in leitor:
+        try:
+            valor = _valor(linha[colunas["valor"]] or "")
+            data = _data(linha[colunas["data"]] or "")
+        except (InvalidOperation, ValueError):
+            continue  # linhas de saldo, cabeçalhos repetidos etc.
+        if valor <= 0:
+            continue
+        descricao = (linha.get(colunas["descricao"]) or "").strip() if colunas["descricao"] else ""
+        base = f"{data}|{valor}|{descricao}"
+        vistos[base] += 1  # dois créditos iguais no mesmo dia são distintos
+        identificador = hashlib.sha1(f"{base}|{vistos[base]}".encode()).hexdigest()
+        creditos.append(Credito(identificador, data, valor, descricao[:255]))
+    return creditos
+
+
+_OFX_TRANSACAO = re.compile(r"<STMTTRN>(.*?)(?:</STMTTRN>|(?=<STMTTRN>)|(?=</BANKTRANLIST>))", re.S | re.I)
+
+
+def _ofx_campo(bloco, nome):
+    achado = re.search(rf"<{nome}>([^<\r\n]*)", bloco, re.I)
+    return achado.group(1).strip() if achado else ""
+
+
+def ler_ofx(texto):
+    """Créditos de um extrato OFX (SGML ou XML) sem dependências extras."""
+    creditos = []
+    for bloco in _OFX_TRANSACAO.findall(texto):
+        try:
+            valor = _valor(_ofx_campo(bloco, "TRNAMT"))
+            data = datetime.strptime(_ofx_campo(bloco, "DTPOSTED")[:8], "%Y%m%d").date()
+        except (InvalidOperation, ValueError, TypeError):
+            continue
+        if valor <= 0:
+            continue
+        descricao = " ".join(filter(None, (_ofx_campo(bloco, "NAME"), _ofx_campo(bloco, "MEMO"))))
+        identificador = _ofx_campo(bloco, "FITID") or hashlib.sha1(f"{data}|{valor}|{descricao}".encode()).hexdigest()
+        creditos.append(Credito(identificador[:100], data, valor, descricao[:255]))
+    return creditos
+
+
+def ler_extrato(nome, conteudo):
+    """Créditos do arquivo ``nome`` (bytes em ``conteudo``)."""
+    texto = conteudo.decode("utf-8-sig", errors="replace") if isinstance(conteudo, bytes) else conteudo
+    if nome.lower().endswith(".ofx") or "<OFX>" in texto[:2000].upper():
+        return ler_ofx(texto)
+    return ler_csv(texto)
+
+
+# ----- Índices e pontuação -----
+def _palavras(texto):
+    return {p for p in normalizar(texto).split() if len(p) > 2 and p not in _IGNORAR}
+
+
+class Indices:
+    """Pagamentos em aberto indexados para a pontuação dos créditos."""
+
+    def __init__(self, pagamentos):
+        self.pagamentos = {}
+        self.por_valor = defaultdict(list)
+        for pk, aluno_id, valor, vencimento, aluno, responsavel, contato in pagamentos:
+            self.pagamentos[pk] = {
+                "aluno_id": aluno_id,
+                "valor": valor,
+                "vencimento": vencimento,
+                "aluno": _palavras(aluno),
+                "responsavel": _palavras(responsavel),
+                # Últimos 8 dígitos: o número sem DDD/9 extra, como costuma sair no extrato
+                "telefone": (contato or "")[-8:] if len(contato or "") >= 8 else "",
+            }
+            self.por_valor[valor].append(pk)
+
+    def candidatos(self, credito, antes, depois):
+        """``[(pontos, distância em dias, pagamento_id)]`` do crédito."""
+        palavras = _palavras(credito.descricao)
+        digitos = re.sub(r"\D", "", credito.descricao)
+        resultado = []
+        for pk in self.por_valor.get(credito.valor, ()):
+            dados = self.pagamentos[pk]
+            distancia = (credito.data - dados["vencimento"]).days
+            if not -antes <= distancia <= depois:
+                continue
+            pontos = 0
+            if dados["telefone"] and dados["telefone"] in digitos:
+                pontos += PONTOS_TELEFONE
+            if dados["responsavel"] and len(dados["responsavel"] & palavras) >= min(2, len(dados["responsavel"])):
+                pontos += PONTOS_RESPONSAVEL
+            if dados["aluno"] and len(dados["aluno"] & palavras) >= min(2, len(dados["aluno"])):
+                pontos += PONTOS_ALUNO
+            resultado.append((pontos, abs(distancia), pk))
+        resultado.sort(key=lambda c: (-c[0], c[1], c[2]))
+        return resultado
+
+
+def carregar_indices(creditos):
+    """Uma query: pagamentos em aberto com vencimento na janela do extrato."""
+    antes, depois = settings.CONCILIACAO_DIAS_ANTES, settings.CONCILIACAO_DIAS_DEPOIS
+    inicio = min(c.data for c in creditos) - timedelta(days=depois)
+    fim = max(c.data for c in creditos) + timedelta(days=antes)
+    return Indices(
+        Pagamento.objects.filter(data_pagamento__isnull=True, data_vencimento__range=(inicio, fim))
+        .values_list("id", "aluno_id", "valor", "data_vencimento", "aluno__nome_completo",
+                     "aluno__nome_responsavel", "aluno__contato_responsavel")
+        .iterator(chunk_size=5000)
+    )
+
+
+# ----- Aplicação -----
+def baixar(pagamentos_por_data, forma="PIX"):
+    """Marca como pagos ``{pagamento_id: data}`` ainda em aberto com um
+    ``bulk_update`` e aplica os deltas do rollup; devolve os ids baixados."""
+    with transaction.atomic():
+        abertos = Pagamento.objects.select_for_update().filter(
+            pk__in=list(pagamentos_por_data), data_pagamento__isnull=True,
+        )
+        antes = rollup.agregar(abertos)
+        pagamentos = list(abertos)
+        for pagamento in pagamentos:
+            pagamento.data_pagamento = pagamentos_por_data[pagamento.pk]
+            pagamento.forma_pagamento = forma
+        Pagamento.objects.bulk_update(pagamentos, ["data_pagamento", "forma_pagamento"], batch_size=1000)
+        baixados = [p.pk for p in pagamentos]
+        depois = rollup.agregar(Pagamento.objects.filter(pk__in=baixados))
+        rollup.aplicar(rollup.diferenca(antes, depois))
+    return baixados
+
+
+def conciliar(nome, conteudo, usuario=None):
+    """Processa o extrato e devolve a ``Conciliacao`` criada."""
+    creditos = ler_extrato(nome, conteudo)
+    conciliacao = Conciliacao.objects.create(arquivo=nome[:255], criado_por=usuario)
+    if not creditos:
+        return conciliacao
+
+    # Créditos já conciliados em extratos anteriores (mesmo arquivo reenviado)
+    ja_conciliados = set(
+        LancamentoExtrato.objects.filter(
+            identificador__in={c.identificador for c in creditos}, status=LancamentoExtrato.CONCILIADO,
+        ).values_list("identificador", flat=True)
+    )
+    indices = carregar_indices(creditos)
+    antes, depois = settings.CONCILIACAO_DIAS_ANTES, settings.CONCILIACAO_DIAS_DEPOIS
+
+    usados = set()
+    lancamentos = []
+    baixas = {}
+    for credito in creditos:
+        lancamento = LancamentoExtrato(
+            conciliacao=conciliacao, identificador=credito.identificador,
+            data=credito.data, valor=credito.valor, descricao=credito.descricao,
+        )
+        lancamentos.append(lancamento)
+        if credito.identificador in ja_conciliados:
+            lancamento.status = LancamentoExtrato.IGNORADO
+            continue
+        candidatos = [c for c in indices.candidatos(credito, antes, depois) if c[2] not in usados]
+        if not candidatos:
+            lancamento.status = LancamentoExtrato.SEM_CORRESPONDENCIA
+            continue
+        melhor = candidatos[0]
+        segundo = candidatos[1][0] if len(candidatos) > 1 else -1
+        if melhor[0] >= PONTOS_CONFIAVEL and melhor[0] > segundo:
+            lancamento.status = LancamentoExtrato.CONCILIADO
+            lancamento.pagamento_id = melhor[2]
+            usados.add(melhor[2])
+            baixas[melhor[2]] = credito.data
+        else:
+            lancamento.status = LancamentoExtrato.REVISAO
+            lancamento.candidatos = [c[2] for c in candidatos[:MAX_CANDIDATOS]]
+
+    with transaction.atomic():
+        baixados = set(baixar(baixas)) if baixas else set()
+        for lancamento in lancamentos:
+            # Pago por outra pessoa entre a leitura e a baixa: vai para revisão
+            if lancamento.status == LancamentoExtrato.CONCILIADO and lancamento.pagamento_id not in baixados:
+                lancamento.status = LancamentoExtrato.REVISAO
+                lancamento.candidatos = [lancamento.pagamento_id]
+                lancamento.pagamento_id = None
+        LancamentoExtrato.objects.bulk_create(lancamentos, batch_size=1000)
+    return conciliacao
+
+
+def confirmar(lancamento, pagamento_id):
+    """Baixa manual de um lançamento da fila de revisão."""
+    if pagamento_id not in baixar({pagamento_id: lancamento.data}):
+        return False
+    lancamento.status = LancamentoExtrato.CONCILIADO
+    lancamento.pagamento_id = pagamento_id
+    lancamento.save(update_fields=["status", "pagamento"])
+    return True
@@ -0,0 +1,54 @@
+# escolinha/concorrencia.py
+"""Execução concorrente de consultas independentes em views assíncronas.
+
+``em_paralelo`` roda funções síncronas (ORM, cache) em um pool de threads
+limitado a ``DASHBOARD_CONCORRENCIA``; cada thread usa a própria conexão
+com o banco, então as agregações do dashboard rodam ao mesmo tempo em vez
+de uma depois da outra. O contexto de quem chamou (réplica, medição de
+consultas) vai junto para as threads. Uma função só, ou
+``DASHBOARD_CONCORRENCIA`` 1, roda na thread da requisição.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .middleware import acompanhar_medicoes
+
+
+_pools = {}
+_trava = threading.Lock()
+
+
+def _pool(tamanho):
+    with _trava:
+        if tamanho not in _pools:
+            _pools[tamanho] = ThreadPoolExecutor(max_workers=tamanho, thread_name_prefix="dashboard")
+        return _pools[tamanho]
+
+
+def _na_thread(funcao):
+    def executar():
+        # Respeita CONN_MAX_AGE/health checks como o ciclo de uma requisição
+        close_old_connections()
+        try:
+            with acompanhar_medicoes():
+                return funcao()
+        finally:
+            close_old_connections()
+    return executar
+
+
+async def em_paralelo(*funcoes):
+    """Resultados de ``funcoes`` (sem argumentos), na mesma ordem."""
+    tamanho = settings.DASHBOARD_CONCORRENCIA
+    if tamanho <= 1 or len(funcoes) == 1:
+        return [await sync_to_async(funcao)() for funcao in funcoes]
+    executor = _pool(tamanho)
+    return await asyncio.gather(*(
+        sync_to_async(_na_thread(funcao), thread_sensitive=False, executor=executor)()
+        for funcao in funcoes
+    ))
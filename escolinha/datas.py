@@ -0,0 +1,34 @@
+# escolinha/datas.py
+from datetime import date
+import calendar
+
+
+def primeiro_dia(ano, mes):
+    return date(ano, mes, 1)
+
+
+def ultimo_dia(ano, mes):
+    return date(ano, mes, calendar.monthrange(ano, mes)[1])
+
+
+def somar_meses(dia, meses):
+    """Primeiro dia do mês ``meses`` meses antes/depois de ``dia``."""
+    indice = dia.year * 12 + (dia.month - 1) + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def competencias(inicio, fim):
+    """Primeiros dias de cada mês entre ``inicio`` e ``fim`` (inclusive)."""
+    atual = primeiro_dia(inicio.year, inicio.month)
+    fim = primeiro_dia(fim.year, fim.month)
+    meses = []
+    while atual <= fim:
+        meses.append(atual)
+        atual = somar_meses(atual, 1)
+    return meses
+
+
+def parse_competencia(valor):
+    """Converte ``"AAAA-MM"`` no primeiro dia do mês; ValueError se inválido."""
+    ano, mes = map(int, valor.split("-"))
+    return primeiro_dia(ano, mes)
@@ -0,0 +1,144 @@
+# escolinha/exportacao.py
+"""Exportação dos pagamentos filtrados em CSV/XLSX.
+
+As linhas saem de ``values_list(...).iterator(chunk_size=...)`` — tuplas,
+sem instanciar modelos nem guardar o resultado inteiro —, então a memória
+fica constante seja qual for o tamanho da exportação. O CSV é enviado em
+streaming pela view; exportações grandes (e o XLSX) rodam em uma tarefa
+Celery que grava o arquivo no storage para download posterior.
+
+Textos que começam com ``=``, ``+``, ``-``, ``@`` (ou tab/CR) saem com um
+apóstrofo na frente, para o Excel não os interpretar como fórmula.
+"""
+import csv
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .filtros import ORDEM_PAGAMENTOS, filtrar_pagamentos
+
+
+FORMATOS = ("csv", "xlsx")
+PASTA = "exportacoes"
+
+CABECALHO = ("Aluno", "Turma", "Vencimento", "Pagamento", "Forma", "Valor", "Status")
+CAMPOS = (
+    "aluno__nome_completo", "aluno__turma__nome", "data_vencimento",
+    "data_pagamento", "forma_pagamento", "valor",
+)
+
+
+# Início de célula que as planilhas tratam como fórmula
+INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _segura(linha):
+    return [f"'{valor}" if isinstance(valor, str) and valor.startswith(INICIO_FORMULA) else valor
+            for valor in linha]
+
+
+def _status(data_vencimento, data_pagamento, hoje):
+    if data_pagamento is not None:
+        return "Pago"
+    return "Atrasado" if data_vencimento < hoje else "Pendente"
+
+
+def linhas_pagamentos(filtros, hoje=None, chunk_size=None, using=None):
+    """Tuplas ``CABECALHO`` dos pagamentos filtrados, na ordem da listagem.
+    ``using`` fixa o banco (o gerador pode ser consumido fora da view)."""
+    hoje = hoje or timezone.now().date()
+    pagamentos = (
+        filtrar_pagamentos(filtros, hoje=hoje)
+        .using(using)
+        .order_by(*ORDEM_PAGAMENTOS)
+        .values_list(*CAMPOS)
+        .iterator(chunk_size=chunk_size or settings.EXPORTACAO_CHUNK_SIZE)
+    )
+    for aluno, turma, vencimento, pagamento, forma, valor in pagamentos:
+        yield (aluno, turma, vencimento, pagamento or "", forma, valor,
+               _status(vencimento, pagamento, hoje))
+
+
+class _Eco:
+    """Arquivo falso para ``csv.writer``: devolve a linha em vez de gravar."""
+
+    def write(self, valor):
+        return valor
+
+
+def csv_em_partes(linhas):
+    """Gera o CSV linha a linha (com BOM para o Excel abrir em UTF-8)."""
+    escritor = csv.writer(_Eco())
+    yield "\ufeff" + escritor.writerow(CABECALHO)
+    for linha in linhas:
+        yield escritor.writerow(_segura(linha))
+
+
+def gravar_csv(linhas, arquivo):
+    arquivo.write("\ufeff")
+    escritor = csv.writer(arquivo)
+    escritor.writerow(CABECALHO)
+    escritor.writerows(_segura(linha) for linha in linhas)
+
+
+def gravar_xlsx(linhas, arquivo):
+    """Grava a planilha em modo ``write_only`` (uma linha por vez)."""
+    from openpyxl import Workbook
+
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet("Pagamentos")
+    aba.append(CABECALHO)
+    for linha in linhas:
+        aba.append(_segura(linha))
+    planilha.save(arquivo)
+
+
+def nome_arquivo(tarefa_id, formato):
+    return f"{PASTA}/{tarefa_id}.{formato}"
+
+
+def nome_concluida(tarefa_id):
+    return f"{PASTA}/{tarefa_id}.json"
+
+
+def exportar_para_arquivo(filtros, formato, tarefa_id, hoje=None):
+    """Grava a exportação em ``default_storage``; devolve o nome salvo.
+
+    O storage grava o arquivo aos poucos (e pode trocar o nome se já
+    existir), então só depois de completo é gravado ``nome_concluida`` com
+    o nome e o formato: é ele que indica que a exportação terminou.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+    linhas = linhas_pagamentos(filtros, hoje=hoje)
+    modo = "w+" if formato == "csv" else "w+b"
+    opcoes = {"newline": "", "encoding": "utf-8"} if formato == "csv" else {}
+    with tempfile.TemporaryFile(modo, **opcoes) as temporario:
+        if formato == "csv":
+            gravar_csv(linhas, temporario)
+        else:
+            gravar_xlsx(linhas, temporario)
+        temporario.seek(0)
+        nome = default_storage.save(nome_arquivo(tarefa_id, formato), File(temporario))
+    concluida = nome_concluida(tarefa_id)
+    default_storage.delete(concluida)  # tarefa repetida: vale o arquivo novo
+    default_storage.save(concluida, ContentFile(json.dumps({"arquivo": nome, "formato": formato}).encode()))
+    return nome
+
+
+def arquivo_pronto(tarefa_id):
+    """``(nome, formato)`` da exportação concluída, ou ``None``."""
+    concluida = nome_concluida(tarefa_id)
+    if not default_storage.exists(concluida):
+        return None
+    try:
+        with default_storage.open(concluida) as arquivo:
+            dados = json.load(arquivo)
+    except ValueError:  # ainda sendo gravado
+        return None
+    return dados["arquivo"], dados["formato"]
@@ -0,0 +1,67 @@
+# escolinha/filtros.py
+"""Filtros da tela de pagamentos, compartilhados por listagem e exportação.
+
+Todas as condições de data são intervalos semiabertos sobre a coluna
+(``data_vencimento >= x AND data_vencimento < y``), sem funções como
+``__year``/``__month`` que impediriam o uso dos índices de ``Pagamento``.
+"""
+from django.utils import timezone
+
+from . import busca
+from .datas import parse_competencia, somar_meses
+from .models import Pagamento
+from .turmas import turma_selecionada
+
+
+STATUS_PAGAMENTO = ("pago", "pendente", "atrasado")
+
+# Ordenação da lista de pagamentos (índice pagamento_venc_aluno_idx)
+ORDEM_PAGAMENTOS = ("-data_vencimento", "aluno_id", "id")
+
+
+def filtros_pagamentos(params):
+    """Normaliza os filtros (``aluno``, ``status``, ``turma``, ``data``) de
+    um ``request.GET``/``POST`` ou dict; valores inválidos são ignorados."""
+    data = (params.get("data") or "").strip()  # YYYY-MM
+    try:
+        competencia = parse_competencia(data) if data else None
+    except ValueError:
+        competencia, data = None, ""
+    status = params.get("status") or ""
+    return {
+        "aluno": (params.get("aluno") or "").strip(),
+        "status": status if status in STATUS_PAGAMENTO else "",
+        "turma": turma_selecionada(params),
+        "data": data,
+        "competencia": competencia,
+    }
+
+
+def filtrar_pagamentos(filtros, hoje=None, queryset=None):
+    """Aplica os filtros de ``filtros_pagamentos`` ao queryset de Pagamento."""
+    hoje = hoje or timezone.now().date()
+    pagamentos = Pagamento.objects.all() if queryset is None else queryset
+
+    # Filtro por aluno
+    if filtros["aluno"]:
+        pagamentos = busca.filtrar(pagamentos, filtros["aluno"], campo="aluno__nome_busca")
+
+    # Filtro por status (aberto = índice parcial data_pagamento IS NULL)
+    if filtros["status"] == "pago":
+        pagamentos = pagamentos.filter(data_pagamento__isnull=False)
+    elif filtros["status"] == "pendente":
+        pagamentos = pagamentos.filter(data_pagamento__isnull=True, data_vencimento__gte=hoje)
+    elif filtros["status"] == "atrasado":
+        pagamentos = pagamentos.filter(data_pagamento__isnull=True, data_vencimento__lt=hoje)
+
+    # Filtro por turma
+    if filtros["turma"]:
+        pagamentos = pagamentos.filter(aluno__turma_id=filtros["turma"])
+
+    # Filtro por mês/ano: [primeiro dia, primeiro dia do mês seguinte)
+    if filtros["competencia"]:
+        pagamentos = pagamentos.filter(
+            data_vencimento__gte=filtros["competencia"],
+            data_vencimento__lt=somar_meses(filtros["competencia"], 1),
+        )
+    return pagamentos
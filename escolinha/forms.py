@@ -1,4 +1,7 @@
 from django import forms
+from django.db.models import Q
+from . import referencia
+from .acoes import ACOES, PAGAR, VENCIMENTO
 from .models import Aluno, Pagamento, Turma
 
 
@@ -53,17 +56,20 @@ class AlunoForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Filtra turmas ativas
-        turmas_ativas = Turma.objects.filter(status=True)
-        
-        # Se está editando um aluno e ele tem uma turma desativada, inclui ela também
-        if self.instance and self.instance.pk and self.instance.turma:
-            if not self.instance.turma.status:
-                # Combina turmas ativas com a turma atual (desativada)
-                turmas_ativas = turmas_ativas | Turma.objects.filter(pk=self.instance.turma.pk)
-        
-        self.fields["turma"].queryset = turmas_ativas.distinct()
-        self.fields["turma"].empty_label = None  # Remove a opção "-----"
+        # Turmas ativas e, na edição, a turma atual do aluno mesmo desativada.
+        # As opções vêm do cache de referência; o queryset só é consultado
+        # para validar o envio.
+        turma_atual = self.instance.turma_id if self.instance.pk else None
+        turma = self.fields["turma"]
+        turma.queryset = Turma.objects.filter(Q(status=True) | Q(pk=turma_atual))
+        turma.choices = referencia.opcoes_turma(incluir=turma_atual)
+
+
+class AlunoImportacaoForm(forms.ModelForm):
+    """Regras do AlunoForm para a importação; a turma é resolvida pelo nome."""
+    class Meta:
+        model = Aluno
+        fields = [campo for campo in AlunoForm.Meta.fields if campo != "turma"]
 
 
 class PagamentoForm(forms.ModelForm):
@@ -127,4 +133,61 @@ class TurmaForm(forms.ModelForm):
             "class": "checkbox checkbox-primary"
         })
         }
-        
\ No newline at end of file
+        
+
+class ImportacaoForm(forms.Form):
+    tipo = forms.ChoiceField(
+        choices=(("alunos", "Alunos"), ("pagamentos", "Histórico de pagamentos")),
+        widget=forms.Select(attrs={"class": "select select-bordered w-full"}),
+    )
+    arquivo = forms.FileField(
+        help_text="CSV separado por vírgula ou ponto e vírgula, com cabeçalho.",
+        widget=forms.ClearableFileInput(attrs={
+            "class": "file-input file-input-bordered w-full",
+            "accept": ".csv,text/csv",
+        }),
+    )
+
+
+class ConciliacaoForm(forms.Form):
+    arquivo = forms.FileField(
+        help_text="Extrato OFX ou CSV (data, valor, descrição). Só os créditos são considerados.",
+        widget=forms.ClearableFileInput(attrs={
+            "class": "file-input file-input-bordered w-full",
+            "accept": ".ofx,.csv,text/csv",
+        }),
+    )
+
+
+class IdsField(forms.Field):
+    """Lista de ids vinda de vários checkboxes com o mesmo nome."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        return [int(v) for v in value or [] if str(v).isdigit()]
+
+
+class AcaoPagamentosForm(forms.Form):
+    """Ação em massa da tela de pagamentos."""
+    acao = forms.ChoiceField(choices=ACOES, widget=forms.Select(attrs={"class": "select select-bordered select-sm"}))
+    selecionados = IdsField(required=False)
+    todos = forms.BooleanField(required=False)
+    # "data" já é o filtro de competência enviado junto
+    data_acao = forms.DateField(required=False, widget=forms.DateInput(
+        format="%Y-%m-%d",
+        attrs={"class": "input input-bordered input-sm", "type": "date", "title": "Data do pagamento ou novo vencimento"},
+    ))
+    forma_pagamento = forms.ChoiceField(
+        choices=Pagamento.FORMAS_PAGAMENTO, initial="PIX", required=False,
+        widget=forms.Select(attrs={"class": "select select-bordered select-sm"}),
+    )
+
+    def clean(self):
+        dados = super().clean()
+        if not dados.get("todos") and not dados.get("selecionados"):
+            raise forms.ValidationError("Selecione ao menos um pagamento.")
+        if dados.get("acao") in (PAGAR, VENCIMENTO) and not dados.get("data_acao"):
+            self.add_error("data_acao", "Informe a data.")
+        if dados.get("acao") == PAGAR and not dados.get("forma_pagamento"):
+            self.add_error("forma_pagamento", "Informe a forma de pagamento.")
+        return dados
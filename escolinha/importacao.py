@@ -0,0 +1,222 @@
+# escolinha/importacao.py
+"""Importação em massa de alunos e do histórico de pagamentos por CSV.
+
+O arquivo é lido como stream (``csv.DictReader`` sobre o arquivo aberto) e
+processado em lotes: cada linha passa pelas mesmas regras dos formulários
+(``AlunoImportacaoForm``/``PagamentoForm``), a turma e o aluno são
+resolvidos por mapas em memória carregados uma vez, e cada lote válido é
+gravado com ``bulk_create``. Linhas com erro não interrompem a importação:
+entram no relatório com o número da linha e as mensagens.
+
+Colunas de alunos: ``nome_completo``, ``data_nascimento``, ``turma`` (nome),
+``nome_responsavel``, ``contato_responsavel``, ``mensalidade``, ``is_active``.
+
+Colunas de pagamentos: ``aluno`` (nome completo), ``data_nascimento``
+(opcional, para distinguir homônimos), ``data_vencimento``,
+``data_pagamento``, ``forma_pagamento``, ``valor``.
+"""
+from dataclasses import asdict, dataclass, field
+import csv
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import rollup
+from .busca import normalizar
+from .forms import AlunoImportacaoForm, PagamentoForm
+from .models import Aluno, Pagamento, PagamentoArquivado, Turma
+
+
+TIPOS = ("alunos", "pagamentos")
+PASTA = "importacoes"
+
+# Máximo de erros guardados no relatório (os demais só são contados)
+MAX_ERROS = 1000
+
+_FALSOS = {"0", "n", "nao", "não", "false", "inativo"}
+
+
+@dataclass
+class ResultadoImportacao:
+    """Resumo de uma importação."""
+    linhas: int = 0
+    criados: int = 0
+    com_erro: int = 0
+    erros: list = field(default_factory=list)  # [{"linha": n, "erros": {campo: [mensagens]}}]
+    tempo: float = 0.0
+
+    def as_dict(self):
+        return asdict(self)
+
+    def erro(self, linha, erros):
+        self.com_erro += 1
+        if len(self.erros) < MAX_ERROS:
+            self.erros.append({"linha": linha, "erros": erros})
+
+
+def abrir_csv(arquivo):
+    """``DictReader`` sobre o arquivo texto, detectando ``,`` ou ``;``."""
+    amostra = arquivo.read(4096)
+    arquivo.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=",;")
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(arquivo, dialect=dialeto)
+    leitor.fieldnames = [normalizar(nome).replace(" ", "_") for nome in leitor.fieldnames or []]
+    return leitor
+
+
+def _decimal(valor):
+    """Aceita "1.234,50" e "1234.50"."""
+    valor = (valor or "").strip().replace("R$", "").strip()
+    if "," in valor:
+        valor = valor.replace(".", "").replace(",", ".")
+    return valor
+
+
+def _lotes(leitor, tamanho):
+    lote = []
+    # Linha 1 é o cabeçalho
+    for numero, linha in enumerate(leitor, start=2):
+        lote.append((numero, {chave: (valor or "").strip() for chave, valor in linha.items() if chave}))
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def importar_alunos(arquivo, batch_size=None):
+    inicio = time.monotonic()
+    resultado = ResultadoImportacao()
+    turmas = {normalizar(nome): pk for pk, nome in Turma.objects.values_list("id", "nome")}
+    existentes = set(Aluno.objects.values_list("nome_busca", "data_nascimento"))
+
+    for lote in _lotes(abrir_csv(arquivo), batch_size or settings.IMPORTACAO_BATCH_SIZE):
+        novos = []
+        for numero, linha in lote:
+            resultado.linhas += 1
+            dados = {**linha, "mensalidade": _decimal(linha.get("mensalidade")) or "40.00"}
+            ativo = dados.get("is_active", "")
+            dados["is_active"] = "false" if normalizar(ativo) in _FALSOS else "true"
+            form = AlunoImportacaoForm(dados)
+            erros = {} if form.is_valid() else form.errors.get_json_data()
+            turma_id = turmas.get(normalizar(linha.get("turma")))
+            if turma_id is None:
+                erros["turma"] = [{"message": f"Turma não encontrada: {linha.get('turma') or '(vazia)'}"}]
+            if erros:
+                resultado.erro(numero, {campo: [e["message"] for e in lista] for campo, lista in erros.items()})
+                continue
+
+            aluno = form.save(commit=False)
+            aluno.turma_id = turma_id
+            aluno.normalizar()
+            chave = (aluno.nome_busca, aluno.data_nascimento)
+            if chave in existentes:
+                resultado.erro(numero, {"nome_completo": ["Aluno já cadastrado com esta data de nascimento."]})
+                continue
+            existentes.add(chave)
+            novos.append(aluno)
+
+        Aluno.objects.bulk_create(novos)
+        resultado.criados += len(novos)
+
+    resultado.tempo = round(time.monotonic() - inicio, 3)
+    return resultado
+
+
+def _mapa_alunos():
+    """``nome_busca -> [(data_nascimento, id, turma_id)]`` de todos os alunos."""
+    mapa = {}
+    for pk, nome, nascimento, turma_id in Aluno.objects.values_list("id", "nome_busca", "data_nascimento", "turma_id"):
+        mapa.setdefault(nome, []).append((nascimento, pk, turma_id))
+    return mapa
+
+
+def _resolver_aluno(mapa, nome, nascimento):
+    """``(id, turma_id)`` ou a mensagem de erro."""
+    candidatos = mapa.get(normalizar(nome), [])
+    if nascimento:
+        candidatos = [c for c in candidatos if c[0] == nascimento]
+    if not candidatos:
+        return f"Aluno não encontrado: {nome or '(vazio)'}"
+    if len(candidatos) > 1:
+        return f"Mais de um aluno chamado {nome}; informe data_nascimento."
+    return candidatos[0][1:]
+
+
+def importar_pagamentos(arquivo, batch_size=None):
+    """Importa o histórico; um pagamento com mesmo aluno, vencimento e valor
+    de um já existente é recusado, então reimportar o arquivo não duplica."""
+    inicio = time.monotonic()
+    resultado = ResultadoImportacao()
+    alunos = _mapa_alunos()
+    nascimento_field = AlunoImportacaoForm.base_fields["data_nascimento"]
+
+    for lote in _lotes(abrir_csv(arquivo), batch_size or settings.IMPORTACAO_BATCH_SIZE):
+        candidatos = []
+        for numero, linha in lote:
+            resultado.linhas += 1
+            dados = {**linha, "valor": _decimal(linha.get("valor")),
+                     "forma_pagamento": (linha.get("forma_pagamento") or "PIX").upper()}
+            form = PagamentoForm(dados)
+            erros = {} if form.is_valid() else {
+                campo: [e["message"] for e in lista] for campo, lista in form.errors.get_json_data().items()
+            }
+            nascimento = None
+            if linha.get("data_nascimento"):
+                try:
+                    nascimento = nascimento_field.clean(linha["data_nascimento"])
+                except ValidationError as erro:
+                    erros["data_nascimento"] = erro.messages
+            aluno = _resolver_aluno(alunos, linha.get("aluno"), nascimento)
+            if isinstance(aluno, str):
+                erros["aluno"] = [aluno]
+            if erros:
+                resultado.erro(numero, erros)
+                continue
+            pagamento = form.save(commit=False)
+            pagamento.aluno_id, turma_id = aluno
+            candidatos.append((numero, pagamento, turma_id))
+
+        # Duplicados: uma query por lote (e uma no arquivo) para os alunos do lote
+        alunos_lote = {p.aluno_id for _, p, _ in candidatos}
+        existentes = {
+            chave
+            for modelo in (Pagamento, PagamentoArquivado)
+            for chave in modelo.objects.filter(aluno_id__in=alunos_lote)
+            .values_list("aluno_id", "data_vencimento", "valor")
+        }
+        novos, turmas = [], {}
+        for numero, pagamento, turma_id in candidatos:
+            chave = (pagamento.aluno_id, pagamento.data_vencimento, pagamento.valor)
+            if chave in existentes:
+                resultado.erro(numero, {"data_vencimento": ["Pagamento já cadastrado para este aluno."]})
+                continue
+            existentes.add(chave)
+            novos.append(pagamento)
+            turmas[pagamento.aluno_id] = turma_id
+
+        with transaction.atomic():
+            Pagamento.objects.bulk_create(novos)
+            rollup.registrar(novos, turmas=turmas)
+        resultado.criados += len(novos)
+
+    resultado.tempo = round(time.monotonic() - inicio, 3)
+    return resultado
+
+
+def nome_relatorio(tarefa_id):
+    """Relatório JSON da importação feita pela tarefa ``tarefa_id``."""
+    return f"{PASTA}/{tarefa_id}.json"
+
+
+def importar(tipo, arquivo, batch_size=None):
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de importação inválido: {tipo}")
+    if tipo == "alunos":
+        return importar_alunos(arquivo, batch_size)
+    return importar_pagamentos(arquivo, batch_size)
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from escolinha.arquivamento import arquivaveis, arquivar, limite_arquivamento
+
+
+class Command(BaseCommand):
+    help = "Move para o arquivo os pagamentos quitados com vencimento anterior ao horizonte (ARQUIVAMENTO_MESES)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meses", type=int, default=None, help="Meses mantidos na tabela principal")
+        parser.add_argument("--antes-de", default=None, help="Data limite AAAA-MM-DD (no lugar de --meses)")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--simular", action="store_true", help="Só conta o que seria arquivado")
+
+    def handle(self, *args, **options):
+        if options["antes_de"]:
+            try:
+                limite = date.fromisoformat(options["antes_de"])
+            except ValueError:
+                raise CommandError("--antes-de deve estar no formato AAAA-MM-DD.")
+        else:
+            limite = limite_arquivamento(meses=options["meses"])
+
+        if options["simular"]:
+            self.stdout.write(f"{arquivaveis(limite).count()} pagamentos com vencimento antes de {limite:%d/%m/%Y}.")
+            return
+
+        def progresso(arquivados):
+            self.stdout.write(f"{arquivados} arquivados")
+
+        resultado = arquivar(limite, batch_size=options["batch_size"], progresso=progresso)
+        anos = ", ".join(str(ano) for ano in resultado.anos) or "-"
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.pagamentos} pagamentos arquivados (anos: {anos}) em {resultado.tempo}s"
+        ))
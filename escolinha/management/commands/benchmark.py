@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from escolinha.benchmark import comparar, executar
+
+
+class Command(BaseCommand):
+    help = "Mede dashboard, telas de pagamentos/alunos e a geração mensal; grava JSON e compara com uma base."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--saida", default="benchmark.json", help="Arquivo JSON com os resultados")
+        parser.add_argument("--base", help="JSON de uma execução anterior para comparar")
+        parser.add_argument("--repeticoes", type=int, default=3)
+        parser.add_argument("--tolerancia", type=float, default=0.2, help="Piora aceita na mediana (0.2 = 20%%)")
+        parser.add_argument("--filtro", default="", help="Só os cenários cujo nome contém este texto")
+        parser.add_argument("--com-cache", action="store_true", help="Usa o cache configurado (padrão: sem cache)")
+
+    def handle(self, *args, **options):
+        base = None
+        if options["base"]:
+            try:
+                with open(options["base"], encoding="utf-8") as arquivo:
+                    base = json.load(arquivo)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Base inválida: {exc}")
+
+        def progresso(nome, medida):
+            self.stdout.write(f"{nome}: {medida['mediana_ms']} ms, {medida['consultas']} consultas")
+
+        try:
+            relatorio = executar(
+                repeticoes=options["repeticoes"], filtro=options["filtro"],
+                com_cache=options["com_cache"], progresso=progresso,
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        with open(options["saida"], "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        self.stdout.write(f"Resultados em {options['saida']}")
+
+        if base is None:
+            return
+        regressoes = comparar(relatorio, base, options["tolerancia"])
+        for nome, motivo in regressoes:
+            self.stdout.write(self.style.ERROR(f"{nome}: {motivo}"))
+        if regressoes:
+            raise CommandError(f"{len(regressoes)} regressões em relação a {options['base']}")
+        self.stdout.write(self.style.SUCCESS("Sem regressões em relação à base."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from escolinha import rollup
+
+
+class Command(BaseCommand):
+    help = "Verifica o rollup FaturamentoMensal contra os pagamentos e, com --corrigir, o reconstrói."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corrigir", action="store_true", help="Reconstrói o rollup se houver divergência")
+
+    def handle(self, *args, **options):
+        divergencias = rollup.verificar()
+        for (mes, turma_id, forma, pago), (obtido, esperado) in sorted(divergencias.items()):
+            self.stdout.write(
+                f"{mes:%m/%Y} turma={turma_id} forma={forma} pago={pago}: "
+                f"rollup={obtido} real={esperado}"
+            )
+
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS("Rollup consistente."))
+        elif options["corrigir"]:
+            linhas = rollup.reconstruir()
+            self.stdout.write(self.style.SUCCESS(f"Rollup reconstruído com {linhas} linhas."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{len(divergencias)} divergências. Execute com --corrigir para reconstruir."
+            ))
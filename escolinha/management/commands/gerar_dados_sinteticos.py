@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from escolinha.models import Aluno
+from escolinha.sintetico import gerar_dados
+
+
+class Command(BaseCommand):
+    help = "Gera turmas, alunos e histórico de pagamentos sintéticos em volume de produção (só para desenvolvimento)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--turmas", type=int, default=50)
+        parser.add_argument("--alunos", type=int, default=100_000)
+        parser.add_argument("--anos", type=int, default=5, help="Anos de mensalidades até o mês atual")
+        parser.add_argument("--semente", type=int, default=42, help="Mesma semente, mesmos dados")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--acrescentar", action="store_true", help="Permite gerar em um banco que já tem alunos")
+
+    def handle(self, *args, **options):
+        if Aluno.objects.exists() and not options["acrescentar"]:
+            raise CommandError("O banco já tem alunos; use --acrescentar para gerar mesmo assim.")
+
+        def progresso(gravados, total):
+            self.stdout.write(f"{gravados}/{total} alunos")
+
+        resultado = gerar_dados(
+            turmas=options["turmas"], alunos=options["alunos"], anos=options["anos"],
+            semente=options["semente"], batch_size=options["batch_size"], progresso=progresso,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.turmas} turmas, {resultado.alunos} alunos e "
+            f"{resultado.pagamentos} pagamentos em {resultado.tempo}s"
+        ))
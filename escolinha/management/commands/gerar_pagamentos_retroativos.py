@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from escolinha.datas import parse_competencia
+from escolinha.mensalidades import gerar_pagamentos_periodo
+
+
+class Command(BaseCommand):
+    help = "Gera os pagamentos faltantes de todos os meses entre duas competências (AAAA-MM)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("inicio", help="Competência inicial, ex.: 2024-01")
+        parser.add_argument("fim", nargs="?", help="Competência final (padrão: a inicial)")
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            inicio = parse_competencia(options["inicio"])
+            fim = parse_competencia(options["fim"] or options["inicio"])
+            resultado = gerar_pagamentos_periodo(inicio, fim, batch_size=options["batch_size"])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.criados} criados, {resultado.completados} completados, "
+            f"{resultado.ignorados} ignorados em {resultado.tempo}s"
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from escolinha.importacao import TIPOS, importar
+
+
+class Command(BaseCommand):
+    help = "Importa alunos ou o histórico de pagamentos de um CSV, relatando as linhas com erro."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tipo", choices=TIPOS)
+        parser.add_argument("arquivo", help="Caminho do CSV (UTF-8, separado por , ou ;)")
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["arquivo"], encoding="utf-8-sig", newline="") as arquivo:
+                resultado = importar(options["tipo"], arquivo, batch_size=options["batch_size"])
+        except OSError as exc:
+            raise CommandError(exc)
+
+        for erro in resultado.erros:
+            mensagens = "; ".join(f"{campo}: {' '.join(lista)}" for campo, lista in erro["erros"].items())
+            self.stdout.write(f"linha {erro['linha']}: {mensagens}")
+        if resultado.com_erro > len(resultado.erros):
+            self.stdout.write(f"... e mais {resultado.com_erro - len(resultado.erros)} linhas com erro")
+
+        estilo = self.style.SUCCESS if not resultado.com_erro else self.style.WARNING
+        self.stdout.write(estilo(
+            f"{resultado.linhas} linhas: {resultado.criados} importadas, "
+            f"{resultado.com_erro} com erro em {resultado.tempo}s"
+        ))
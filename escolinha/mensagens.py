@@ -0,0 +1,136 @@
+# escolinha/mensagens.py
+"""Modelos de mensagem de cobrança/aviso com campos por destinatário.
+
+O texto de ``ModeloMensagem`` usa campos entre chaves (``{aluno}``,
+``{valor}``...; ``{{``/``}}`` para chaves literais). Cada modelo é compilado
+uma vez em uma lista de ``(texto fixo, campo)`` e guardado em cache até ser
+editado, então renderizar uma página ou uma campanha inteira é só juntar
+strings, sem reinterpretar o modelo a cada linha.
+"""
+from string import Formatter
+import urllib.parse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+
+CAMPOS = {
+    "aluno": "Nome do aluno (ou dos irmãos)",
+    "responsavel": "Nome do responsável",
+    "valor": "Valor em aberto (40,00)",
+    "vencimento": "Data de vencimento (10/03/2025)",
+    "competencia": "Mês de referência (03/2025)",
+    "chave_pix": "Chave Pix (PIX_CHAVE)",
+    "nome_pix": "Titular do Pix (PIX_NOME)",
+}
+
+PADRAO = {
+    "cobranca": """Olá, {responsavel}! Tudo bem?
+
+Verificamos que a mensalidade de {aluno} da escolinha de futsal, no valor de R$ {valor} e com vencimento em {vencimento}, ainda não foi identificada em nosso sistema.
+Pedimos, por gentileza, que o pagamento seja realizado o quanto antes, para evitar qualquer interrupção nas atividades do aluno.
+
+Pagamento via Pix
+Chave Pix: {chave_pix}
+Nome: {nome_pix}
+
+Caso o pagamento já tenha sido efetuado, por favor, desconsidere esta mensagem. ✅
+
+Agradecemos sua compreensão e colaboração.
+
+Atenciosamente,
+Equipe AVCL – Associação Vila Costa Lagoão""",
+    "aviso": """Olá, {responsavel}! Tudo bem?
+
+A AVCL – Associação Vila Costa Lagoão lembra que a mensalidade de {aluno} da escolinha de futsal ({competencia}, R$ {valor}) já está disponível para pagamento, com vencimento em {vencimento}.
+Pedimos que o pagamento seja realizado o quanto antes, garantindo que o aluno continue participando normalmente das atividades.
+
+Forma de pagamento – Pix
+Chave Pix: {chave_pix}
+Nome: {nome_pix}
+
+Agradecemos pela atenção e pela parceria de sempre!
+
+Atenciosamente,
+Equipe AVCL – Associação Vila Costa Lagoão""",
+}
+
+CHAVE_CACHE = "mensagens:modelo:{}"
+
+
+def compilar(texto):
+    """Lista de ``(texto fixo, campo ou None)``; ValidationError se o
+    modelo usar um campo desconhecido ou chaves mal fechadas."""
+    try:
+        partes = [(literal, campo) for literal, campo, _, _ in Formatter().parse(texto)]
+    except ValueError as erro:
+        raise ValidationError(f"Modelo inválido: {erro}") from erro
+    desconhecidos = sorted({campo for _, campo in partes if campo is not None and campo not in CAMPOS})
+    if desconhecidos:
+        raise ValidationError(
+            "Campos desconhecidos: %(campos)s.", params={"campos": ", ".join(f"{{{c}}}" for c in desconhecidos)}
+        )
+    return partes
+
+
+def renderizar(partes, valores):
+    return "".join(literal + (valores[campo] if campo is not None else "") for literal, campo in partes)
+
+
+def modelos():
+    """``{tipo: partes}`` compilados, lidos do cache (uma ida ao cache)."""
+    from .models import ModeloMensagem
+
+    chaves = {tipo: CHAVE_CACHE.format(tipo) for tipo in PADRAO}
+    compilados = cache.get_many(chaves.values())
+    resultado = {tipo: compilados[chave] for tipo, chave in chaves.items() if chave in compilados}
+    faltando = [tipo for tipo in PADRAO if tipo not in resultado]
+    if faltando:
+        textos = dict(ModeloMensagem.objects.filter(tipo__in=faltando).values_list("tipo", "texto"))
+        novos = {tipo: compilar(textos.get(tipo, PADRAO[tipo])) for tipo in faltando}
+        cache.set_many({chaves[tipo]: partes for tipo, partes in novos.items()}, timeout=None)
+        resultado.update(novos)
+    return resultado
+
+
+def invalidar():
+    transaction.on_commit(lambda: cache.delete_many([CHAVE_CACHE.format(tipo) for tipo in PADRAO]))
+
+
+def _moeda(valor):
+    return f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def valores(aluno, responsavel, valor, vencimento):
+    """Campos de um destinatário (``aluno`` pode ser "Caio e Davi")."""
+    return {
+        "aluno": aluno,
+        "responsavel": responsavel or "responsável",
+        "valor": _moeda(valor),
+        "vencimento": f"{vencimento:%d/%m/%Y}",
+        "competencia": f"{vencimento:%m/%Y}",
+        "chave_pix": settings.PIX_CHAVE,
+        "nome_pix": settings.PIX_NOME,
+    }
+
+
+def tipo_do_pagamento(pagamento, hoje):
+    return "cobranca" if pagamento.data_vencimento < hoje else "aviso"
+
+
+def links_whatsapp(pagamentos, hoje=None):
+    """Preenche ``p.mensagem_whatsapp`` (texto já codificado para o link
+    ``wa.me``) em cada pagamento em aberto; os modelos são lidos uma vez."""
+    hoje = hoje or timezone.now().date()
+    compilados = modelos()
+    for p in pagamentos:
+        if p.data_pagamento is not None:
+            continue
+        texto = renderizar(compilados[tipo_do_pagamento(p, hoje)], valores(
+            p.aluno.nome_completo, p.aluno.nome_responsavel, p.valor, p.data_vencimento,
+        ))
+        p.mensagem_whatsapp = urllib.parse.quote(texto)
+    return pagamentos
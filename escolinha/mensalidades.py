@@ -0,0 +1,160 @@
+# escolinha/mensalidades.py
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import rollup
+from .datas import competencias, primeiro_dia, ultimo_dia
+from .models import Aluno, Pagamento, PagamentoArquivado
+
+
+VENCIMENTO_DIA = 10  # vencimento sempre dia 10
+
+
+@dataclass
+class ResultadoGeracao:
+    """Resumo de uma execução da geração de mensalidades."""
+    criados: int = 0      # mensalidades inteiras criadas
+    completados: int = 0  # diferenças criadas para quem pagou parcial/adiantado
+    ignorados: int = 0    # alunos que já tinham o mês coberto
+    tempo: float = 0.0    # segundos
+
+    def as_dict(self):
+        return asdict(self)
+
+    def somar(self, outro):
+        self.criados += outro.criados
+        self.completados += outro.completados
+        self.ignorados += outro.ignorados
+        self.tempo = round(self.tempo + outro.tempo, 3)
+        return self
+
+
+def calcular_faltante(mensalidade, total_mes):
+    """Valor a gerar para um aluno no mês, ou None se o mês já está coberto.
+
+    Mesma regra da geração original: sem nada no mês cria a mensalidade
+    inteira; com valor menor que a mensalidade cria só a diferença.
+    """
+    if total_mes == 0:
+        return mensalidade
+    if total_mes < mensalidade:
+        return mensalidade - total_mes
+    return None
+
+
+def dividir_em_shards(tamanho=None, por_turma=False):
+    """Divide os alunos ativos em shards para geração paralela.
+
+    Por padrão cada shard é uma faixa contígua de ids com até ``tamanho``
+    alunos; com ``por_turma`` cada turma vira um shard.
+    """
+    ativos = Aluno.objects.filter(is_active=True).order_by()
+    if por_turma:
+        turmas = ativos.values_list("turma_id", flat=True).distinct().order_by("turma_id")
+        return [{"turma": turma_id} for turma_id in turmas]
+
+    tamanho = tamanho or settings.MENSALIDADES_SHARD_SIZE
+    ids = list(ativos.order_by("id").values_list("id", flat=True))
+    return [
+        {"id_inicio": ids[i], "id_fim": ids[min(i + tamanho, len(ids)) - 1]}
+        for i in range(0, len(ids), tamanho)
+    ]
+
+
+def alunos_do_shard(shard):
+    """Queryset de alunos correspondente a um shard de ``dividir_em_shards``."""
+    if "turma" in shard:
+        return Aluno.objects.filter(turma_id=shard["turma"])
+    return Aluno.objects.filter(id__range=(shard["id_inicio"], shard["id_fim"]))
+
+
+def gerar_pagamentos(ano, mes, alunos=None, batch_size=None, progresso=None):
+    """Gera os pagamentos de um único mês (ver ``gerar_pagamentos_periodo``)."""
+    competencia = primeiro_dia(ano, mes)
+    return gerar_pagamentos_periodo(
+        competencia, competencia, alunos=alunos, batch_size=batch_size, progresso=progresso
+    )
+
+
+def gerar_pagamentos_periodo(inicio, fim, alunos=None, batch_size=None, progresso=None):
+    """Gera os pagamentos faltantes de todos os meses entre ``inicio`` e ``fim``.
+
+    Uma query traz a mensalidade dos alunos ativos e outra, agrupada por
+    aluno e mês, o total já lançado em todo o período; a diferença é
+    calculada em memória e gravada com ``bulk_create`` em lotes, em uma só
+    transação (o rollup é aplicado uma vez, no fim). Cada aluno só é cobrado
+    a partir do mês do cadastro (``created_at``). Como só cria o que falta,
+    pode ser executada de novo sem duplicar. ``progresso``, se informado, é
+    chamado com ``(gravados, total)`` após cada lote.
+    """
+    inicio_execucao = time.monotonic()
+    batch_size = batch_size or settings.MENSALIDADES_BATCH_SIZE
+    meses = competencias(inicio, fim)
+    if not meses:
+        raise ValueError("A competência inicial deve ser anterior ou igual à final.")
+
+    if alunos is None:
+        alunos = Aluno.objects.all()
+    ativos = alunos.filter(is_active=True).order_by()
+
+    # Já lançado no período, inclusive o que foi arquivado
+    totais = defaultdict(int)
+    for modelo in (Pagamento, PagamentoArquivado):
+        linhas = (
+            modelo.objects.filter(
+                aluno__in=ativos.values("id"),
+                data_vencimento__range=(meses[0], ultimo_dia(fim.year, fim.month)),
+            )
+            .annotate(mes=TruncMonth("data_vencimento"))
+            .order_by()
+            .values("aluno_id", "mes")
+            .annotate(total=Sum("valor"))
+            .values_list("aluno_id", "mes", "total")
+        )
+        for aluno_id, mes, total in linhas:
+            totais[(aluno_id, mes)] += total
+    alunos = []
+    for aluno_id, mensalidade, turma_id, criado in ativos.values_list("id", "mensalidade", "turma_id", "created_at"):
+        # Cobrado a partir do mês do cadastro, não antes de entrar na escolinha
+        cadastro = timezone.localdate(criado)
+        alunos.append((aluno_id, mensalidade, turma_id, primeiro_dia(cadastro.year, cadastro.month)))
+    turmas = {aluno_id: turma_id for aluno_id, _, turma_id, _ in alunos}
+
+    resultado = ResultadoGeracao()
+    novos = []
+    for mes in meses:
+        vencimento = mes.replace(day=VENCIMENTO_DIA)
+        for aluno_id, mensalidade, _, matricula in alunos:
+            if mes < matricula:
+                continue
+            total_mes = totais.get((aluno_id, mes)) or 0
+            valor = calcular_faltante(mensalidade, total_mes)
+            if valor is None:
+                resultado.ignorados += 1
+                continue
+            if total_mes == 0:
+                resultado.criados += 1
+            else:
+                resultado.completados += 1
+            novos.append(Pagamento(aluno_id=aluno_id, data_vencimento=vencimento, valor=valor))
+
+    deltas = rollup.novos_deltas()
+    with transaction.atomic():
+        for i in range(0, len(novos), batch_size):
+            lote = Pagamento.objects.bulk_create(novos[i:i + batch_size])
+            rollup.somar_pagamentos(deltas, lote, turmas)
+            if progresso:
+                progresso(min(i + batch_size, len(novos)), len(novos))
+        # Rollup uma vez, no fim: as linhas de FaturamentoMensal (disputadas
+        # pelos outros shards) ficam travadas só até o commit logo abaixo
+        rollup.aplicar(deltas)
+
+    resultado.tempo = round(time.monotonic() - inicio_execucao, 3)
+    return resultado
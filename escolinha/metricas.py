@@ -0,0 +1,162 @@
+# escolinha/metricas.py
+"""Indicadores do dashboard.
+
+As funções por mês leem ``FaturamentoMensal`` (custo proporcional ao número
+de meses); ``indicadores`` e ``formas_pagamento`` aceitam qualquer intervalo
+de datas e agregam direto em ``Pagamento`` e, se o período alcança o
+arquivo, também em ``PagamentoArquivado`` (só pagamentos quitados).
+"""
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .arquivamento import ultimo_ano_arquivado
+from .datas import primeiro_dia, somar_meses, ultimo_dia
+from .models import FaturamentoMensal, Pagamento, PagamentoArquivado
+
+
+def pagamentos_do_periodo(inicio, fim, turma=None, modelo=Pagamento):
+    """Pagamentos com vencimento entre ``inicio`` e ``fim`` (inclusive)."""
+    pagamentos = modelo.objects.filter(data_vencimento__range=(inicio, fim))
+    if turma:
+        pagamentos = pagamentos.filter(aluno__turma__id=turma)
+    return pagamentos
+
+
+def arquivados_do_periodo(inicio, fim, turma=None):
+    """Pagamentos arquivados do período, ou ``None`` se o arquivo não chega
+    até ``inicio``."""
+    if inicio.year > ultimo_ano_arquivado():
+        return None
+    return pagamentos_do_periodo(inicio, fim, turma, modelo=PagamentoArquivado)
+
+
+def _alunos_distintos(pagamentos, arquivados):
+    return (
+        pagamentos.order_by().values("aluno_id")
+        .union(arquivados.order_by().values("aluno_id"))
+        .count()
+    )
+
+
+def indicadores(inicio, fim, turma=None, hoje=None):
+    """Recebido, esperado, ativos e atrasado do período em uma única query
+    (mais duas se o período alcança o arquivo)."""
+    hoje = hoje or timezone.now().date()
+    pagamentos = pagamentos_do_periodo(inicio, fim, turma)
+    totais = pagamentos.aggregate(
+        esperado=Sum("valor"),
+        recebido=Sum("valor", filter=Q(data_pagamento__isnull=False)),
+        ativos=Count("aluno", distinct=True),
+        atrasado=Sum("valor", filter=Q(data_pagamento__isnull=True, data_vencimento__lt=hoje)),
+    )
+    esperado = totais["esperado"] or 0
+    recebido = totais["recebido"] or 0
+    ativos = totais["ativos"]
+    arquivados = arquivados_do_periodo(inicio, fim, turma)
+    if arquivados is not None:
+        # Arquivados estão todos pagos: entram no esperado e no recebido
+        antigos = arquivados.aggregate(total=Sum("valor"))["total"] or 0
+        esperado += antigos
+        recebido += antigos
+        ativos = _alunos_distintos(pagamentos, arquivados)
+    return {
+        "recebido": recebido,
+        "esperado": esperado,
+        "ativos": ativos,
+        "atrasado": totais["atrasado"] or 0,
+        "taxa": (float(recebido) / float(esperado) * 100) if esperado else None,
+    }
+
+
+def faturamento_do_periodo(inicio, fim, turma=None):
+    """Linhas de ``FaturamentoMensal`` dos meses entre ``inicio`` e ``fim``."""
+    linhas = FaturamentoMensal.objects.filter(mes__range=(inicio, fim))
+    if turma:
+        linhas = linhas.filter(turma_id=turma)
+    return linhas
+
+
+def indicadores_mes(ano, mes, turma=None, hoje=None):
+    """Mesmos indicadores de ``indicadores`` para um mês inteiro.
+
+    Esperado e recebido (e o atrasado de meses já encerrados) saem do
+    rollup; só a contagem de alunos distintos, e o atrasado do mês
+    corrente, consultam os pagamentos do mês.
+    """
+    hoje = hoje or timezone.now().date()
+    inicio, fim = primeiro_dia(ano, mes), ultimo_dia(ano, mes)
+    totais = faturamento_do_periodo(inicio, inicio, turma).aggregate(
+        esperado=Sum("total"),
+        recebido=Sum("total", filter=Q(pago=True)),
+        aberto=Sum("total", filter=Q(pago=False)),
+    )
+    brutos = {"ativos": Count("aluno", distinct=True)}
+    if inicio <= hoje <= fim:
+        brutos["atrasado"] = Sum("valor", filter=Q(data_pagamento__isnull=True, data_vencimento__lt=hoje))
+    pagamentos = pagamentos_do_periodo(inicio, fim, turma)
+    brutos = pagamentos.aggregate(**brutos)
+    arquivados = arquivados_do_periodo(inicio, fim, turma)
+    if arquivados is not None:
+        brutos["ativos"] = _alunos_distintos(pagamentos, arquivados)
+
+    if "atrasado" in brutos:
+        atrasado = brutos["atrasado"] or 0
+    else:
+        atrasado = (totais["aberto"] or 0) if fim < hoje else 0
+    esperado = totais["esperado"] or 0
+    recebido = totais["recebido"] or 0
+    return {
+        "recebido": recebido,
+        "esperado": esperado,
+        "ativos": brutos["ativos"],
+        "atrasado": atrasado,
+        "taxa": (float(recebido) / float(esperado) * 100) if esperado else None,
+    }
+
+
+def faturamento_mensal(ate, meses=6, turma=None):
+    """Recebido por mês de vencimento nos ``meses`` meses de calendário que
+    terminam no mês de ``ate``, lido do rollup."""
+    primeiro = somar_meses(ate, -(meses - 1))
+    totais = dict(
+        faturamento_do_periodo(primeiro, ate, turma)
+        .filter(pago=True)
+        .order_by()
+        .values("mes")
+        .annotate(soma=Sum("total"))
+        .values_list("mes", "soma")
+    )
+    serie = []
+    for i in range(meses):
+        mes = somar_meses(primeiro, i)
+        serie.append({
+            "mes": f"{mes.month:02d}/{mes.year}",
+            "valor": float(totais.get(mes) or 0),
+        })
+    return serie
+
+
+def formas_pagamento_mes(ano, mes, turma=None):
+    """Quantidade de pagamentos recebidos por forma no mês, lida do rollup."""
+    inicio = primeiro_dia(ano, mes)
+    return list(
+        faturamento_do_periodo(inicio, inicio, turma)
+        .filter(pago=True, quantidade__gt=0)
+        .order_by()
+        .values("forma_pagamento")
+        .annotate(total=Sum("quantidade"))
+    )
+
+
+def formas_pagamento(inicio, fim, turma=None):
+    """Quantidade de pagamentos recebidos por forma de pagamento."""
+    consultas = [pagamentos_do_periodo(inicio, fim, turma).filter(data_pagamento__isnull=False)]
+    arquivados = arquivados_do_periodo(inicio, fim, turma)
+    if arquivados is not None:
+        consultas.append(arquivados)
+    totais = {}
+    for pagamentos in consultas:
+        linhas = pagamentos.order_by().values("forma_pagamento").annotate(total=Count("id"))
+        for linha in linhas:
+            totais[linha["forma_pagamento"]] = totais.get(linha["forma_pagamento"], 0) + linha["total"]
+    return [{"forma_pagamento": forma, "total": total} for forma, total in totais.items()]
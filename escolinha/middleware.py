@@ -0,0 +1,222 @@
+# escolinha/middleware.py
+"""Middlewares da escolinha: medição de consultas e fixação no primário.
+
+``MedicaoConsultasMiddleware`` envolve cada conexão com um
+``execute_wrapper`` (funciona com ``DEBUG=False``) e mede a quantidade de
+consultas, o tempo de banco e o tempo total da requisição. Os números vão
+nos cabeçalhos ``Server-Timing`` e ``X-Query-Count``; requisições acima de
+``CONSULTAS_LIMITE``, ``CONSULTAS_LIMITE_MS`` ou ``REQUISICAO_LIMITE_MS``
+são registradas no logger ``escolinha.consultas`` com as consultas mais
+lentas e as repetidas (sinal típico de N+1). Em respostas em streaming (ex.:
+a exportação em CSV) as consultas rodam enquanto o corpo é gerado, depois
+dos cabeçalhos: a medição vai até o fim do stream e só vale para o log.
+
+``FixarPrimarioMiddleware`` marca com um cookie quem acabou de gravar, para
+as views ``@leitura_replica`` lerem do primário (ver ``escolinha.roteamento``).
+
+Os dois funcionam no WSGI e no ASGI: sob ASGI a cadeia continua assíncrona
+(``__acall__``) e as views ``async`` do dashboard não voltam para uma
+thread só por causa deles.
+"""
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .roteamento import COOKIE_PRIMARIO
+
+
+logger = logging.getLogger("escolinha.consultas")
+
+# Consultas mostradas no log, por critério
+MAX_CONSULTAS_LOG = 5
+
+
+# Medições ativas no contexto atual (herdadas pelas threads de ``concorrencia``)
+_medicoes = ContextVar("medicoes", default=())
+
+
+class Medicao:
+    """Consultas executadas enquanto o wrapper está ativo."""
+
+    def __init__(self):
+        self.quantidade = 0
+        self.tempo = 0.0
+        self.consultas = []  # [(duração, sql)]
+        self._trava = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._trava:
+                self.quantidade += 1
+                self.tempo += duracao
+                self.consultas.append((duracao, sql))
+
+    def mais_lentas(self):
+        return sorted(self.consultas, key=lambda c: c[0], reverse=True)[:MAX_CONSULTAS_LOG]
+
+    def repetidas(self):
+        """``[(vezes, sql)]`` das consultas executadas mais de uma vez."""
+        contagem = Counter(sql for _, sql in self.consultas)
+        return [(vezes, sql) for sql, vezes in contagem.most_common(MAX_CONSULTAS_LOG) if vezes > 1]
+
+
+def _envolver_conexoes(pilha, medicoes):
+    # As conexões são por thread: cada thread envolve as suas
+    for medicao in medicoes:
+        for conexao in connections.all():
+            pilha.enter_context(conexao.execute_wrapper(medicao))
+
+
+@contextmanager
+def medindo(medicao):
+    """Conta em ``medicao`` as consultas do bloco, inclusive as feitas em
+    threads que entram em ``acompanhar_medicoes``."""
+    token = _medicoes.set(_medicoes.get() + (medicao,))
+    try:
+        with ExitStack() as pilha:
+            _envolver_conexoes(pilha, (medicao,))
+            yield medicao
+    finally:
+        _medicoes.reset(token)
+
+
+@asynccontextmanager
+async def amedindo(medicao):
+    """``medindo`` para código assíncrono. As conexões são por thread e o ORM
+    de uma requisição ASGI roda na thread de ``sync_to_async``: os wrappers
+    são colocados e retirados lá."""
+    token = _medicoes.set(_medicoes.get() + (medicao,))
+    pilha = ExitStack()
+    try:
+        await sync_to_async(_envolver_conexoes)(pilha, (medicao,))
+        try:
+            yield medicao
+        finally:
+            await sync_to_async(pilha.close)()
+    finally:
+        _medicoes.reset(token)
+
+
+@contextmanager
+def acompanhar_medicoes():
+    """Em uma thread de trabalho: soma as consultas às medições ativas do
+    contexto que a disparou."""
+    with ExitStack() as pilha:
+        _envolver_conexoes(pilha, _medicoes.get())
+        yield
+
+
+class MedicaoConsultasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        with medindo(Medicao()) as medicao:
+            response = self.get_response(request)
+        return self.concluir(request, response, medicao, inicio)
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        async with amedindo(Medicao()) as medicao:
+            response = await self.get_response(request)
+        return self.concluir(request, response, medicao, inicio)
+
+    def concluir(self, request, response, medicao, inicio):
+        if response.streaming:
+            self.medir_stream(request, response, medicao, inicio)
+            return response
+        total = time.perf_counter() - inicio
+        response["X-Query-Count"] = str(medicao.quantidade)
+        if settings.CONSULTAS_SERVER_TIMING:
+            response["Server-Timing"] = (
+                f'db;dur={medicao.tempo * 1000:.1f};desc="{medicao.quantidade} consultas", '
+                f"total;dur={total * 1000:.1f}"
+            )
+        self.verificar(request, response, medicao, total)
+        return response
+
+    def medir_stream(self, request, response, medicao, inicio):
+        """Continua medindo em ``medicao`` enquanto o corpo é gerado (na
+        thread ou no loop que consome o stream) e verifica os limites no fim."""
+        conteudo = response.streaming_content
+        if response.is_async:
+            async def medido():
+                try:
+                    async with amedindo(medicao):
+                        async for parte in conteudo:
+                            yield parte
+                finally:
+                    self.verificar(request, response, medicao, time.perf_counter() - inicio)
+        else:
+            def medido():
+                try:
+                    with medindo(medicao):
+                        yield from conteudo
+                finally:
+                    self.verificar(request, response, medicao, time.perf_counter() - inicio)
+        response.streaming_content = medido()
+
+    def verificar(self, request, response, medicao, total):
+        if (
+            medicao.quantidade > settings.CONSULTAS_LIMITE
+            or medicao.tempo * 1000 > settings.CONSULTAS_LIMITE_MS
+            or total * 1000 > settings.REQUISICAO_LIMITE_MS
+        ):
+            self.registrar(request, response, medicao, total)
+
+    def registrar(self, request, response, medicao, total):
+        linhas = [
+            f"{request.method} {request.get_full_path()} -> {response.status_code}: "
+            f"{medicao.quantidade} consultas, banco {medicao.tempo * 1000:.1f} ms, total {total * 1000:.1f} ms",
+        ]
+        linhas += [f"  {duracao * 1000:.1f} ms: {sql}" for duracao, sql in medicao.mais_lentas()]
+        linhas += [f"  {vezes}x: {sql}" for vezes, sql in medicao.repetidas()]
+        logger.warning("\n".join(linhas))
+
+
+class FixarPrimarioMiddleware:
+    METODOS_SEGUROS = ("GET", "HEAD", "OPTIONS", "TRACE")
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.fixar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.fixar(request, await self.get_response(request))
+
+    def fixar(self, request, response):
+        if settings.DATABASE_REPLICA and request.method not in self.METODOS_SEGUROS:
+            response.set_cookie(
+                COOKIE_PRIMARIO, "1", max_age=settings.REPLICA_FIXAR_SEGUNDOS,
+                httponly=True, samesite="Lax", secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
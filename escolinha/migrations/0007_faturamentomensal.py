@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def popular_faturamento(apps, schema_editor):
+    Pagamento = apps.get_model('escolinha', 'Pagamento')
+    FaturamentoMensal = apps.get_model('escolinha', 'FaturamentoMensal')
+    linhas = (
+        Pagamento.objects
+        .annotate(
+            mes=TruncMonth('data_vencimento'),
+            pago=ExpressionWrapper(Q(data_pagamento__isnull=False), output_field=BooleanField()),
+        )
+        .order_by()
+        .values('mes', 'aluno__turma_id', 'forma_pagamento', 'pago')
+        .annotate(total=Sum('valor'), quantidade=Count('id'))
+    )
+    FaturamentoMensal.objects.bulk_create([
+        FaturamentoMensal(
+            mes=linha['mes'], turma_id=linha['aluno__turma_id'], forma_pagamento=linha['forma_pagamento'],
+            pago=bool(linha['pago']), total=linha['total'], quantidade=linha['quantidade'],
+        )
+        for linha in linhas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escolinha', '0006_alter_aluno_options_alter_turma_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaturamentoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('forma_pagamento', models.CharField(choices=[('PIX', 'Pix'), ('DINHEIRO', 'Dinheiro'), ('OUTRO', 'Outro')], max_length=20)),
+                ('pago', models.BooleanField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('turma', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='faturamentos', to='escolinha.turma')),
+            ],
+            options={
+                'verbose_name': 'Faturamento mensal',
+                'verbose_name_plural': 'Faturamentos mensais',
+                'ordering': ['-mes', 'turma'],
+                'constraints': [models.UniqueConstraint(fields=('mes', 'turma', 'forma_pagamento', 'pago'), name='faturamento_mensal_unico')],
+            },
+        ),
+        migrations.RunPython(popular_faturamento, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+from escolinha.busca import normalizar
+
+
+def popular_nome_busca(apps, schema_editor):
+    Aluno = apps.get_model('escolinha', 'Aluno')
+    alunos = list(Aluno.objects.only('id', 'nome_completo'))
+    for aluno in alunos:
+        aluno.nome_busca = normalizar(aluno.nome_completo)
+    Aluno.objects.bulk_update(alunos, ['nome_busca'], batch_size=1000)
+
+
+def criar_indice_trigram(apps, schema_editor):
+    # Índice GIN trigram só existe no PostgreSQL; atende os LIKE da busca
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS escolinha_aluno_nome_busca_trgm '
+        'ON escolinha_aluno USING gin (nome_busca gin_trgm_ops)'
+    )
+
+
+def remover_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS escolinha_aluno_nome_busca_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escolinha', '0007_faturamentomensal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aluno',
+            name='nome_busca',
+            field=models.CharField(blank=True, default='', editable=False, max_length=150),
+        ),
+        migrations.AddIndex(
+            model_name='aluno',
+            index=models.Index(fields=['is_active', 'nome_busca'], name='escolinha_a_is_acti_c51b57_idx'),
+        ),
+        migrations.RunPython(popular_nome_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice_trigram, remover_indice_trigram),
+    ]
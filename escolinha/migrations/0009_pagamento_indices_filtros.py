@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escolinha', '0008_aluno_nome_busca'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pagamento',
+            name='escolinha_p_data_ve_948cfe_idx',
+        ),
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(fields=['-data_vencimento', 'aluno', 'id'], name='pagamento_venc_aluno_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(condition=models.Q(('data_pagamento__isnull', True)), fields=['data_vencimento'], name='pagamento_aberto_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(fields=['aluno', '-data_vencimento'], name='pagamento_aluno_venc_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escolinha', '0009_pagamento_indices_filtros'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campanha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('cobranca', 'Cobrança'), ('aviso', 'Aviso')], default='cobranca', max_length=20)),
+                ('filtros', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('criada', 'Criada'), ('enviando', 'Enviando'), ('concluida', 'Concluída')], default='criada', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('concluida_em', models.DateTimeField(blank=True, null=True)),
+                ('criado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Campanha',
+                'verbose_name_plural': 'Campanhas',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MensagemCampanha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contato', models.CharField(max_length=50)),
+                ('texto', models.TextField()),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('enviando', 'Enviando'), ('enviada', 'Enviada'), ('falha', 'Falha')], default='pendente', max_length=20)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('id_externo', models.CharField(blank=True, default='', max_length=100)),
+                ('enviada_em', models.DateTimeField(blank=True, null=True)),
+                ('aluno', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mensagens', to='escolinha.aluno')),
+                ('campanha', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mensagens', to='escolinha.campanha')),
+            ],
+            options={
+                'verbose_name': 'Mensagem de campanha',
+                'verbose_name_plural': 'Mensagens de campanha',
+                'ordering': ['campanha', 'id'],
+                'indexes': [models.Index(fields=['campanha', 'status'], name='escolinha_m_campanh_8c5f41_idx')],
+                'constraints': [models.UniqueConstraint(fields=('campanha', 'contato'), name='mensagem_campanha_contato_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:23
+
+from django.db import migrations, models
+
+
+MODELOS = {
+    "cobranca": """Olá, {responsavel}! Tudo bem?
+
+Verificamos que a mensalidade de {aluno} da escolinha de futsal, no valor de R$ {valor} e com vencimento em {vencimento}, ainda não foi identificada em nosso sistema.
+Pedimos, por gentileza, que o pagamento seja realizado o quanto antes, para evitar qualquer interrupção nas atividades do aluno.
+
+Pagamento via Pix
+Chave Pix: {chave_pix}
+Nome: {nome_pix}
+
+Caso o pagamento já tenha sido efetuado, por favor, desconsidere esta mensagem. ✅
+
+Agradecemos sua compreensão e colaboração.
+
+Atenciosamente,
+Equipe AVCL – Associação Vila Costa Lagoão""",
+    "aviso": """Olá, {responsavel}! Tudo bem?
+
+A AVCL – Associação Vila Costa Lagoão lembra que a mensalidade de {aluno} da escolinha de futsal ({competencia}, R$ {valor}) já está disponível para pagamento, com vencimento em {vencimento}.
+Pedimos que o pagamento seja realizado o quanto antes, garantindo que o aluno continue participando normalmente das atividades.
+
+Forma de pagamento – Pix
+Chave Pix: {chave_pix}
+Nome: {nome_pix}
+
+Agradecemos pela atenção e pela parceria de sempre!
+
+Atenciosamente,
+Equipe AVCL – Associação Vila Costa Lagoão""",
+}
+
+
+def criar_modelos(apps, schema_editor):
+    ModeloMensagem = apps.get_model('escolinha', 'ModeloMensagem')
+    for tipo, texto in MODELOS.items():
+        ModeloMensagem.objects.get_or_create(tipo=tipo, defaults={'texto': texto})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escolinha', '0010_campanhas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModeloMensagem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('cobranca', 'Cobrança'), ('aviso', 'Aviso')], max_length=20, unique=True)),
+                ('texto', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Modelo de mensagem',
+                'verbose_name_plural': 'Modelos de mensagem',
+                'ordering': ['tipo'],
+            },
+        ),
+        migrations.RunPython(criar_modelos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escolinha', '0011_modelomensagem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conciliacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arquivo', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('criado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Conciliação',
+                'verbose_name_plural': 'Conciliações',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LancamentoExtrato',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identificador', models.CharField(max_length=100)),
+                ('data', models.DateField()),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('descricao', models.CharField(blank=True, default='', max_length=255)),
+                ('status', models.CharField(choices=[('conciliado', 'Conciliado'), ('revisao', 'Em revisão'), ('sem_correspondencia', 'Sem correspondência'), ('ignorado', 'Ignorado')], max_length=30)),
+                ('candidatos', models.JSONField(blank=True, default=list)),
+                ('conciliacao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos', to='escolinha.conciliacao')),
+                ('pagamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lancamentos', to='escolinha.pagamento')),
+            ],
+            options={
+                'verbose_name': 'Lançamento de extrato',
+                'verbose_name_plural': 'Lançamentos de extrato',
+                'ordering': ['data', 'id'],
+                'indexes': [models.Index(fields=['conciliacao', 'status'], name='escolinha_l_concili_3f70be_idx'), models.Index(fields=['identificador'], name='escolinha_l_identif_ae3c89_idx')],
+            },
+        ),
+    ]
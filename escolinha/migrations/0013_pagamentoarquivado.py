@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def particionar_por_ano(apps, schema_editor):
+    # No PostgreSQL o arquivo é uma tabela particionada por LIST (ano); as
+    # partições de cada ano são criadas pelo arquivamento e a DEFAULT só
+    # recebe o que chegar sem partição. A tabela acabou de ser criada vazia.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    tabela = 'escolinha_pagamentoarquivado'
+    schema_editor.execute(f'ALTER TABLE {tabela} RENAME TO {tabela}_modelo')
+    schema_editor.execute(
+        f'CREATE TABLE {tabela} (LIKE {tabela}_modelo INCLUDING DEFAULTS) PARTITION BY LIST (ano)'
+    )
+    schema_editor.execute(f'DROP TABLE {tabela}_modelo')
+    schema_editor.execute(f'ALTER TABLE {tabela} ADD PRIMARY KEY (ano, id)')
+    schema_editor.execute(
+        f'ALTER TABLE {tabela} ADD CONSTRAINT {tabela}_aluno_id_fk FOREIGN KEY (aluno_id) '
+        'REFERENCES escolinha_aluno (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    schema_editor.execute(f'CREATE INDEX arquivado_aluno_venc_idx ON {tabela} (aluno_id, data_vencimento DESC)')
+    schema_editor.execute(f'CREATE TABLE {tabela}_padrao PARTITION OF {tabela} DEFAULT')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escolinha', '0012_conciliacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PagamentoArquivado',
+            fields=[
+                ('pk', models.CompositePrimaryKey('ano', 'id', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('ano', models.PositiveSmallIntegerField()),
+                ('id', models.BigIntegerField()),
+                ('data_vencimento', models.DateField()),
+                ('data_pagamento', models.DateField()),
+                ('forma_pagamento', models.CharField(choices=[('PIX', 'Pix'), ('DINHEIRO', 'Dinheiro'), ('OUTRO', 'Outro')], max_length=20)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('created_at', models.DateTimeField()),
+                ('arquivado_em', models.DateTimeField(auto_now_add=True)),
+                ('aluno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pagamentos_arquivados', to='escolinha.aluno')),
+            ],
+            options={
+                'verbose_name': 'Pagamento arquivado',
+                'verbose_name_plural': 'Pagamentos arquivados',
+                'ordering': ['-data_vencimento'],
+                'indexes': [models.Index(fields=['aluno', '-data_vencimento'], name='arquivado_aluno_venc_idx')],
+            },
+        ),
+        migrations.RunPython(particionar_por_ano, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escolinha', '0013_pagamentoarquivado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mensagemcampanha',
+            name='reservada_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,11 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 import re
 
+from .busca import normalizar as normalizar_nome
+
 
 class Turma(models.Model):
     nome = models.CharField(max_length=100)
@@ -22,6 +26,7 @@ class Turma(models.Model):
 
 class Aluno(models.Model):
     nome_completo = models.CharField(max_length=150)
+    nome_busca = models.CharField(max_length=150, blank=True, default="", editable=False)
     data_nascimento = models.DateField()
     nome_responsavel = models.CharField(max_length=150, blank=True, null=True)
     contato_responsavel = models.CharField(max_length=50, blank=True, null=True)
@@ -41,11 +46,17 @@ class Aluno(models.Model):
         indexes = [
             models.Index(fields=["is_active", "nome_completo"]),
             models.Index(fields=["turma", "is_active"]),
+            models.Index(fields=["is_active", "nome_busca"]),
         ]
 
-    def save(self, *args, **kwargs):
+    def normalizar(self):
+        """Campos derivados, aplicados no save (e antes de bulk_create)."""
         if self.contato_responsavel:
-            self.contato_responsavel = re.sub(r"\D", "", self.contato_responsavel)    
+            self.contato_responsavel = re.sub(r"\D", "", self.contato_responsavel)
+        self.nome_busca = normalizar_nome(self.nome_completo)
+
+    def save(self, *args, **kwargs):
+        self.normalizar()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -72,7 +83,19 @@ class Pagamento(models.Model):
 
     class Meta:
         ordering = ["-data_vencimento", "aluno"]
-        indexes = [models.Index(fields=["data_vencimento"])]
+        indexes = [
+            # Listagem paginada por (vencimento desc, aluno, id) e filtros de mês
+            models.Index(fields=["-data_vencimento", "aluno", "id"], name="pagamento_venc_aluno_idx"),
+            # Em aberto por vencimento, sem a ordenação da lista (janela da
+            # conciliação, totais em aberto)
+            models.Index(
+                fields=["data_vencimento"],
+                condition=models.Q(data_pagamento__isnull=True),
+                name="pagamento_aberto_venc_idx",
+            ),
+            # Histórico de um aluno por vencimento
+            models.Index(fields=["aluno", "-data_vencimento"], name="pagamento_aluno_venc_idx"),
+        ]
 
 
     @property
@@ -86,4 +109,214 @@ class Pagamento(models.Model):
 
 
     def __str__(self):
-        return f"{self.aluno.nome_completo} - {self.data_vencimento}"
\ No newline at end of file
+        return f"{self.aluno.nome_completo} - {self.data_vencimento}"
+
+
+class PagamentoArquivado(models.Model):
+    """Pagamento quitado e antigo movido para o arquivo por
+    ``escolinha.arquivamento``; guarda o id original. O ano do vencimento
+    faz parte da chave: no PostgreSQL a tabela é particionada por ano."""
+    pk = models.CompositePrimaryKey("ano", "id")
+    ano = models.PositiveSmallIntegerField()
+    id = models.BigIntegerField()
+    aluno = models.ForeignKey(Aluno, on_delete=models.CASCADE, related_name="pagamentos_arquivados")
+    data_vencimento = models.DateField()
+    data_pagamento = models.DateField()
+    forma_pagamento = models.CharField(max_length=20, choices=Pagamento.FORMAS_PAGAMENTO)
+    valor = models.DecimalField(max_digits=8, decimal_places=2)
+    created_at = models.DateTimeField()
+    arquivado_em = models.DateTimeField(auto_now_add=True)
+
+    # Mesma interface de Pagamento nas telas de histórico
+    arquivado = True
+    esta_pago = True
+    atrasado = False
+
+    class Meta:
+        verbose_name = "Pagamento arquivado"
+        verbose_name_plural = "Pagamentos arquivados"
+        ordering = ["-data_vencimento"]
+        indexes = [
+            models.Index(fields=["aluno", "-data_vencimento"], name="arquivado_aluno_venc_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.aluno.nome_completo} - {self.data_vencimento} (arquivado)"
+
+
+class FaturamentoMensal(models.Model):
+    """Totais de Pagamento por mês de vencimento, turma, forma e situação.
+
+    Mantido incrementalmente por ``escolinha.rollup``; o comando
+    ``consolidar_faturamento`` verifica e corrige divergências.
+    """
+    mes = models.DateField()  # primeiro dia do mês de vencimento
+    turma = models.ForeignKey(Turma, on_delete=models.CASCADE, related_name="faturamentos")
+    forma_pagamento = models.CharField(max_length=20, choices=Pagamento.FORMAS_PAGAMENTO)
+    pago = models.BooleanField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Faturamento mensal"
+        verbose_name_plural = "Faturamentos mensais"
+        ordering = ["-mes", "turma"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["mes", "turma", "forma_pagamento", "pago"],
+                name="faturamento_mensal_unico",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:%m/%Y} - {self.turma_id} - {self.forma_pagamento}"
+
+
+class ModeloMensagem(models.Model):
+    """Texto das mensagens de WhatsApp, com campos por destinatário
+    (ver ``escolinha.mensagens.CAMPOS``)."""
+    TIPOS = (
+        ("cobranca", "Cobrança"),
+        ("aviso", "Aviso"),
+    )
+
+    tipo = models.CharField(max_length=20, choices=TIPOS, unique=True)
+    texto = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Modelo de mensagem"
+        verbose_name_plural = "Modelos de mensagem"
+        ordering = ["tipo"]
+
+    def clean(self):
+        from .mensagens import compilar
+
+        try:
+            compilar(self.texto)
+        except ValidationError as erro:
+            raise ValidationError({"texto": erro.messages})
+
+    def __str__(self):
+        return self.get_tipo_display()
+
+
+class Campanha(models.Model):
+    """Envio em massa de mensagens de WhatsApp para os responsáveis dos
+    pagamentos em aberto que atendem a um filtro da tela de pagamentos."""
+    TIPOS = ModeloMensagem.TIPOS
+    CRIADA = "criada"
+    ENVIANDO = "enviando"
+    CONCLUIDA = "concluida"
+    STATUS = (
+        (CRIADA, "Criada"),
+        (ENVIANDO, "Enviando"),
+        (CONCLUIDA, "Concluída"),
+    )
+
+    tipo = models.CharField(max_length=20, choices=TIPOS, default="cobranca")
+    filtros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS, default=CRIADA)
+    criado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    concluida_em = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Campanha"
+        verbose_name_plural = "Campanhas"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.created_at:%d/%m/%Y %H:%M}"
+
+
+class MensagemCampanha(models.Model):
+    """Uma mensagem por contato da campanha, com a situação do envio."""
+    PENDENTE = "pendente"
+    ENVIANDO = "enviando"
+    ENVIADA = "enviada"
+    FALHA = "falha"
+    STATUS = (
+        (PENDENTE, "Pendente"),
+        (ENVIANDO, "Enviando"),
+        (ENVIADA, "Enviada"),
+        (FALHA, "Falha"),
+    )
+
+    campanha = models.ForeignKey(Campanha, on_delete=models.CASCADE, related_name="mensagens")
+    aluno = models.ForeignKey(Aluno, on_delete=models.SET_NULL, null=True, blank=True, related_name="mensagens")
+    contato = models.CharField(max_length=50)
+    texto = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS, default=PENDENTE)
+    tentativas = models.PositiveIntegerField(default=0)
+    erro = models.TextField(blank=True, default="")
+    id_externo = models.CharField(max_length=100, blank=True, default="")
+    enviada_em = models.DateTimeField(blank=True, null=True)
+    reservada_em = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Mensagem de campanha"
+        verbose_name_plural = "Mensagens de campanha"
+        ordering = ["campanha", "id"]
+        constraints = [
+            # Um mesmo responsável recebe uma só mensagem por campanha
+            models.UniqueConstraint(fields=["campanha", "contato"], name="mensagem_campanha_contato_unico"),
+        ]
+        indexes = [
+            models.Index(fields=["campanha", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.contato} - {self.get_status_display()}"
+
+
+class Conciliacao(models.Model):
+    """Um extrato bancário/Pix enviado para baixar pagamentos."""
+    arquivo = models.CharField(max_length=255)
+    criado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Conciliação"
+        verbose_name_plural = "Conciliações"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.arquivo} - {self.created_at:%d/%m/%Y %H:%M}"
+
+
+class LancamentoExtrato(models.Model):
+    """Crédito do extrato e o resultado da conciliação dele."""
+    CONCILIADO = "conciliado"
+    REVISAO = "revisao"
+    SEM_CORRESPONDENCIA = "sem_correspondencia"
+    IGNORADO = "ignorado"
+    STATUS = (
+        (CONCILIADO, "Conciliado"),
+        (REVISAO, "Em revisão"),
+        (SEM_CORRESPONDENCIA, "Sem correspondência"),
+        (IGNORADO, "Ignorado"),
+    )
+
+    conciliacao = models.ForeignKey(Conciliacao, on_delete=models.CASCADE, related_name="lancamentos")
+    identificador = models.CharField(max_length=100)  # FITID do OFX ou hash da linha do CSV
+    data = models.DateField()
+    valor = models.DecimalField(max_digits=10, decimal_places=2)
+    descricao = models.CharField(max_length=255, blank=True, default="")
+    status = models.CharField(max_length=30, choices=STATUS)
+    pagamento = models.ForeignKey(
+        Pagamento, on_delete=models.SET_NULL, null=True, blank=True, related_name="lancamentos",
+    )
+    candidatos = models.JSONField(default=list, blank=True)  # ids de Pagamento para a revisão
+
+    class Meta:
+        verbose_name = "Lançamento de extrato"
+        verbose_name_plural = "Lançamentos de extrato"
+        ordering = ["data", "id"]
+        indexes = [
+            models.Index(fields=["conciliacao", "status"]),
+            models.Index(fields=["identificador"]),
+        ]
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y} R$ {self.valor} - {self.descricao}"
@@ -0,0 +1,215 @@
+# escolinha/paginacao.py
+"""Paginação por cursor (keyset).
+
+Em vez de ``OFFSET`` + ``COUNT(*)`` a cada página, o cursor guarda os
+valores da ordenação do último (ou primeiro) item exibido e a próxima
+página é um ``WHERE (colunas) > (valores)`` com ``LIMIT`` — custo constante
+em qualquer profundidade. O total exibido é uma contagem em cache.
+
+``links_paginacao`` monta os links do componente de paginação (tag
+``{% paginacao %}``) já com os filtros da tela: só a janela de páginas
+vizinhas é calculada, sem percorrer o ``page_range`` inteiro.
+"""
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def _serializar(valor):
+    if isinstance(valor, (date, datetime, Decimal)):
+        return str(valor)
+    return valor
+
+
+def codificar_cursor(valores, direcao):
+    dados = json.dumps({"v": [_serializar(v) for v in valores], "d": direcao}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """``(valores, direcao)`` ou ``None`` se o cursor for inválido."""
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if dados["d"] not in ("p", "a") or not isinstance(dados["v"], list):
+            return None
+        return dados["v"], dados["d"]
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def contagem_aproximada(queryset):
+    """``count()`` do queryset guardado em cache por alguns minutos."""
+    sql, params = queryset.query.sql_with_params()
+    chave = "paginacao:contagem:" + hashlib.md5(f"{sql}{params!r}".encode()).hexdigest()
+    total = cache.get(chave)
+    if total is None:
+        total = queryset.count()
+        cache.set(chave, total, timeout=settings.PAGINACAO_CONTAGEM_TIMEOUT)
+    return total
+
+
+class PaginaCursor:
+    """Página de ``CursorPaginator``; imita o necessário de ``Page``."""
+    is_cursor = True
+
+    def __init__(self, itens, next_cursor, previous_cursor, total_aproximado):
+        self.object_list = itens
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total_aproximado = total_aproximado
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Pagina ``queryset`` pela ordenação ``ordering`` (ex.:
+    ``("-data_vencimento", "aluno_id", "id")``), que deve terminar em um
+    campo único e não nulo."""
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+
+    @staticmethod
+    def _campo(ordem):
+        return ordem.lstrip("-")
+
+    def _converter(self, valores):
+        """Valores do cursor convertidos pelos campos da ordenação, ou
+        ``None`` se algum não for válido (cursor adulterado)."""
+        anotacoes = self.queryset.query.annotations
+        convertidos = []
+        for ordem, valor in zip(self.ordering, valores):
+            campo = self._campo(ordem)
+            if campo in anotacoes:
+                campo = anotacoes[campo].output_field
+            else:
+                campo = self.queryset.model._meta.get_field(campo)
+            try:
+                convertidos.append(campo.to_python(valor))
+            except (ValidationError, TypeError, ValueError):
+                return None
+        return convertidos
+
+    def _valores(self, obj):
+        return [getattr(obj, self._campo(ordem)) for ordem in self.ordering]
+
+    def _depois_de(self, valores, ordering):
+        """Itens que vêm depois de ``valores`` na ordenação ``ordering``."""
+        condicao = Q()
+        for i, ordem in enumerate(ordering):
+            campo = self._campo(ordem)
+            lookup = "lt" if ordem.startswith("-") else "gt"
+            passo = Q(**{f"{campo}__{lookup}": valores[i]})
+            for anterior, valor in zip(ordering[:i], valores[:i]):
+                passo &= Q(**{self._campo(anterior): valor})
+            condicao |= passo
+        return condicao
+
+    def get_page(self, cursor=None):
+        decodificado = decodificar_cursor(cursor) if cursor else None
+        if decodificado and len(decodificado[0]) != len(self.ordering):
+            decodificado = None
+        if decodificado:
+            valores = self._converter(decodificado[0])
+            decodificado = (valores, decodificado[1]) if valores is not None else None
+
+        if decodificado and decodificado[1] == "a":
+            # Página anterior: percorre a ordenação invertida e desvira
+            invertida = tuple(o[1:] if o.startswith("-") else f"-{o}" for o in self.ordering)
+            itens = list(
+                self.queryset.filter(self._depois_de(decodificado[0], invertida))
+                .order_by(*invertida)[:self.per_page + 1]
+            )
+            tem_anterior = len(itens) > self.per_page
+            itens = itens[:self.per_page][::-1]
+            tem_proxima = True
+        else:
+            queryset = self.queryset.order_by(*self.ordering)
+            if decodificado:
+                queryset = queryset.filter(self._depois_de(decodificado[0], self.ordering))
+            itens = list(queryset[:self.per_page + 1])
+            tem_proxima = len(itens) > self.per_page
+            itens = itens[:self.per_page]
+            tem_anterior = decodificado is not None
+
+        return PaginaCursor(
+            itens,
+            next_cursor=codificar_cursor(self._valores(itens[-1]), "p") if tem_proxima and itens else None,
+            previous_cursor=codificar_cursor(self._valores(itens[0]), "a") if tem_anterior and itens else None,
+            total_aproximado=contagem_aproximada(self.queryset),
+        )
+
+
+# Páginas mostradas de cada lado da atual na paginação numerada
+PAGINAS_VIZINHAS = 1
+
+
+def parametros_filtro(**valores):
+    """Só os filtros preenchidos, para ir na query string dos links."""
+    return {nome: valor for nome, valor in valores.items() if valor not in (None, "")}
+
+
+def _href(filtros, **pagina):
+    return "?" + urlencode({**pagina, **filtros})
+
+
+def href_filtros(filtros, **valores):
+    """Query string dos ``filtros`` com ``valores`` trocados (ex.: a
+    ordenação nos cabeçalhos da tabela); a paginação volta para o início."""
+    return _href(parametros_filtro(**{**filtros, **valores}))
+
+
+def janela_paginas(numero, total, vizinhas=PAGINAS_VIZINHAS):
+    """Números das páginas visíveis ao redor de ``numero`` (de 1 a ``total``)."""
+    return range(max(1, numero - vizinhas), min(total, numero + vizinhas) + 1)
+
+
+def links_paginacao(page_obj, filtros=None, vizinhas=PAGINAS_VIZINHAS):
+    """Links de navegação de ``page_obj`` (``Page`` ou ``PaginaCursor``)
+    mantendo ``filtros`` na query string. Itens ausentes ficam ``None``."""
+    filtros = parametros_filtro(**(filtros or {}))
+    links = {"primeira": None, "anterior": None, "proxima": None, "ultima": None, "paginas": []}
+    if getattr(page_obj, "is_cursor", False):
+        if page_obj.has_previous():
+            links["primeira"] = _href(filtros)
+            links["anterior"] = _href(filtros, cursor=page_obj.previous_cursor)
+        if page_obj.has_next():
+            links["proxima"] = _href(filtros, cursor=page_obj.next_cursor)
+        links["total_aproximado"] = page_obj.total_aproximado
+        return links
+
+    numero, total = page_obj.number, page_obj.paginator.num_pages
+    if page_obj.has_previous():
+        links["primeira"] = _href(filtros, page=1)
+        links["anterior"] = _href(filtros, page=numero - 1)
+    if page_obj.has_next():
+        links["proxima"] = _href(filtros, page=numero + 1)
+        links["ultima"] = _href(filtros, page=total)
+    links["paginas"] = [
+        {"numero": n, "atual": n == numero, "href": _href(filtros, page=n)}
+        for n in janela_paginas(numero, total, vizinhas)
+    ]
+    return links
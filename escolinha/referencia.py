@@ -0,0 +1,80 @@
+# escolinha/referencia.py
+"""Cache de dados de referência: turmas para selects e formulários.
+
+As turmas mudam raramente e aparecem em quase toda tela (filtros do
+dashboard, pagamentos e alunos, ``AlunoForm``). A lista fica no cache
+compartilhado sob uma chave de versão e, em cada processo, em memória
+para aquela versão: uma tela custa uma leitura pequena no cache (a versão)
+e nenhuma consulta ao banco. Salvar ou excluir uma ``Turma`` troca a versão
+(``escolinha.signals``); operações em massa chamam ``invalidar``.
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Turma
+
+
+CHAVE_VERSAO = "referencia:turmas:versao"
+
+# {"versao": ..., "turmas": [...]} da última versão lida neste processo
+_local = {}
+_trava = threading.Lock()
+
+
+def _versao():
+    # Versão aleatória, não contador: se a chave for despejada do cache, a
+    # nova versão nunca coincide com uma antiga guardada em algum processo.
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, uuid.uuid4().hex, timeout=None)
+        versao = cache.get(CHAVE_VERSAO)
+    return versao
+
+
+def _consultar():
+    return list(Turma.objects.order_by("nome").values("id", "nome", "status"))
+
+
+def turmas():
+    """``[{"id", "nome", "status"}]`` de todas as turmas, por nome."""
+    versao = _versao()
+    if versao is None:  # cache desligado (DummyCache)
+        return _consultar()
+    with _trava:
+        if _local.get("versao") == versao:
+            return _local["turmas"]
+    chave = f"referencia:turmas:{versao}"
+    lista = cache.get(chave)
+    if lista is None:
+        lista = _consultar()
+        cache.set(chave, lista, timeout=settings.REFERENCIA_CACHE_TIMEOUT)
+    with _trava:
+        _local.update(versao=versao, turmas=lista)
+    return lista
+
+
+def turmas_ativas():
+    """``[{"id", "nome"}]`` das turmas ativas, por nome."""
+    return [{"id": t["id"], "nome": t["nome"]} for t in turmas() if t["status"]]
+
+
+def opcoes_turma(incluir=None):
+    """Choices ``[(id, nome)]`` das turmas ativas e da turma ``incluir``
+    (ex.: a turma atual de um aluno, mesmo desativada)."""
+    return [(t["id"], t["nome"]) for t in turmas() if t["status"] or t["id"] == incluir]
+
+
+def invalidar():
+    """Troca a versão já (quem ler em seguida não vê a lista antiga) e de
+    novo no commit (quem leu antes do commit guardou a lista sem a mudança)."""
+    def trocar():
+        cache.set(CHAVE_VERSAO, uuid.uuid4().hex, timeout=None)
+        with _trava:
+            _local.clear()
+
+    trocar()
+    transaction.on_commit(trocar)
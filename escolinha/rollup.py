@@ -0,0 +1,171 @@
+# escolinha/rollup.py
+"""Manutenção incremental de ``FaturamentoMensal``.
+
+Cada alteração em ``Pagamento`` vira um conjunto de deltas por chave
+``(mes, turma_id, forma_pagamento, pago)`` que é somado à tabela. Os sinais
+em ``escolinha.signals`` cobrem ``save``/``delete`` de um objeto; operações em
+massa (``bulk_create``, ``update``) chamam ``registrar`` ou ``agregar`` +
+``aplicar`` diretamente. Pagamentos arquivados (``PagamentoArquivado``)
+continuam no rollup: arquivar não altera os totais.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+import threading
+
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from . import cache
+from .models import Aluno, FaturamentoMensal, Pagamento, PagamentoArquivado
+
+
+_estado = threading.local()
+
+
+@contextmanager
+def suspenso():
+    """Desliga os sinais do rollup no bloco; quem usa aplica os deltas."""
+    anterior = getattr(_estado, "suspenso", False)
+    _estado.suspenso = True
+    try:
+        yield
+    finally:
+        _estado.suspenso = anterior
+
+
+def esta_suspenso():
+    return getattr(_estado, "suspenso", False)
+
+
+def novos_deltas():
+    return defaultdict(lambda: [Decimal("0"), 0])
+
+
+def chave(data_vencimento, turma_id, forma_pagamento, data_pagamento):
+    return (data_vencimento.replace(day=1), turma_id, forma_pagamento, data_pagamento is not None)
+
+
+def somar(deltas, chave_, valor, quantidade=1, sinal=1):
+    deltas[chave_][0] += sinal * valor
+    deltas[chave_][1] += sinal * quantidade
+    return deltas
+
+
+def agregar(pagamentos):
+    """Deltas de um queryset de Pagamento, calculados em um único GROUP BY."""
+    linhas = (
+        pagamentos
+        .annotate(
+            mes=TruncMonth("data_vencimento"),
+            pago=ExpressionWrapper(Q(data_pagamento__isnull=False), output_field=BooleanField()),
+        )
+        .order_by()
+        .values("mes", "aluno__turma_id", "forma_pagamento", "pago")
+        .annotate(total=Sum("valor"), quantidade=Count("id"))
+    )
+    deltas = novos_deltas()
+    for linha in linhas:
+        chave_ = (linha["mes"], linha["aluno__turma_id"], linha["forma_pagamento"], bool(linha["pago"]))
+        somar(deltas, chave_, linha["total"], linha["quantidade"])
+    return deltas
+
+
+def agregar_historico(**filtros):
+    """``agregar`` de Pagamento e PagamentoArquivado juntos, com os mesmos ``filtros``."""
+    deltas = agregar(Pagamento.objects.filter(**filtros))
+    for chave_, (total, quantidade) in agregar(PagamentoArquivado.objects.filter(**filtros)).items():
+        somar(deltas, chave_, total, quantidade)
+    return deltas
+
+
+def diferenca(antes, depois):
+    """Deltas que levam o rollup do estado ``antes`` ao ``depois``."""
+    deltas = novos_deltas()
+    for chave_, (total, quantidade) in depois.items():
+        somar(deltas, chave_, total, quantidade)
+    for chave_, (total, quantidade) in antes.items():
+        somar(deltas, chave_, total, quantidade, sinal=-1)
+    return deltas
+
+
+def _ordem(item):
+    (mes, turma_id, forma, pago), _ = item
+    return mes, turma_id or 0, forma, pago
+
+
+def aplicar(deltas):
+    """Soma os deltas à tabela ``FaturamentoMensal`` e invalida o cache do
+    dashboard dos meses/turmas afetados."""
+    with transaction.atomic():
+        # Sempre na mesma ordem de chave: transações concorrentes (shards da
+        # geração) travam as linhas na mesma sequência e não entram em deadlock
+        for (mes, turma_id, forma, pago), (total, quantidade) in sorted(deltas.items(), key=_ordem):
+            if not total and not quantidade:
+                continue
+            linha, criada = FaturamentoMensal.objects.get_or_create(
+                mes=mes, turma_id=turma_id, forma_pagamento=forma, pago=pago,
+                defaults={"total": total, "quantidade": quantidade},
+            )
+            if not criada:
+                FaturamentoMensal.objects.filter(pk=linha.pk).update(
+                    total=F("total") + total, quantidade=F("quantidade") + quantidade,
+                )
+        # Dentro do atomic: a versão só muda depois do commit das linhas acima
+        cache.invalidar({(mes, turma_id) for mes, turma_id, _, _ in deltas})
+
+
+def somar_pagamentos(deltas, pagamentos, turmas, sinal=1):
+    """Soma aos ``deltas`` uma lista de Pagamento (``turmas``: aluno_id -> turma_id)."""
+    for p in pagamentos:
+        somar(deltas, chave(p.data_vencimento, turmas[p.aluno_id], p.forma_pagamento, p.data_pagamento),
+              p.valor, sinal=sinal)
+    return deltas
+
+
+def registrar(pagamentos, turmas=None, sinal=1):
+    """Aplica ao rollup uma lista de Pagamento criada/removida em massa.
+
+    ``turmas`` mapeia ``aluno_id -> turma_id``; se omitido é buscado em uma
+    única query.
+    """
+    if not pagamentos:
+        return
+    if turmas is None:
+        turmas = dict(
+            Aluno.objects.filter(pk__in={p.aluno_id for p in pagamentos}).values_list("id", "turma_id")
+        )
+    aplicar(somar_pagamentos(novos_deltas(), pagamentos, turmas, sinal))
+
+
+def verificar():
+    """Compara o rollup com os dados brutos; devolve as chaves divergentes
+    como ``{chave: (rollup, real)}``."""
+    real = agregar_historico()
+    atual = {
+        (linha.mes, linha.turma_id, linha.forma_pagamento, linha.pago): [linha.total, linha.quantidade]
+        for linha in FaturamentoMensal.objects.all()
+    }
+    divergencias = {}
+    for chave_ in set(real) | set(atual):
+        esperado = tuple(real.get(chave_, (0, 0)))
+        obtido = tuple(atual.get(chave_, (0, 0)))
+        if esperado != obtido:
+            divergencias[chave_] = (obtido, esperado)
+    return divergencias
+
+
+def reconstruir():
+    """Recria o rollup inteiro a partir de Pagamento e do arquivo."""
+    deltas = agregar_historico()
+    with transaction.atomic():
+        afetados = set(FaturamentoMensal.objects.values_list("mes", "turma_id").distinct())
+        cache.invalidar(afetados | {(mes, turma_id) for mes, turma_id, _, _ in deltas})
+        FaturamentoMensal.objects.all().delete()
+        FaturamentoMensal.objects.bulk_create([
+            FaturamentoMensal(mes=mes, turma_id=turma_id, forma_pagamento=forma, pago=pago,
+                              total=total, quantidade=quantidade)
+            for (mes, turma_id, forma, pago), (total, quantidade) in deltas.items()
+        ], batch_size=1000)
+    return len(deltas)
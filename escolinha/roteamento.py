@@ -0,0 +1,74 @@
+# escolinha/roteamento.py
+"""Leituras pesadas na réplica do banco.
+
+Só o que roda dentro de ``usar_replica`` (views marcadas com
+``@leitura_replica`` e tarefas de relatório) lê do alias
+``DATABASE_REPLICA``; todo o resto, e toda escrita, vai para o
+``default``. Quem acabou de gravar algo (requisição POST/PUT/PATCH/DELETE)
+fica preso ao primário por ``REPLICA_FIXAR_SEGUNDOS`` através de um
+cookie, para não ler dados da réplica ainda sem a própria alteração.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+
+COOKIE_PRIMARIO = "usar_primario"
+
+_replica = ContextVar("usar_replica", default=False)
+
+
+@contextmanager
+def usar_replica(ativo=True):
+    """Leituras do bloco vão para a réplica (se houver uma configurada)."""
+    token = _replica.set(ativo)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def alias_leitura():
+    """Alias para leituras no contexto atual."""
+    if _replica.get() and settings.DATABASE_REPLICA:
+        return settings.DATABASE_REPLICA
+    return "default"
+
+
+def fixado_no_primario(request):
+    return COOKIE_PRIMARIO in request.COOKIES
+
+
+def leitura_replica(view):
+    """Decorator de views só de leitura: as consultas vão para a réplica,
+    exceto para quem gravou algo há pouco. Aceita views assíncronas."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def _view_async(request, *args, **kwargs):
+            with usar_replica(not fixado_no_primario(request)):
+                return await view(request, *args, **kwargs)
+        return _view_async
+
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        with usar_replica(not fixado_no_primario(request)):
+            return view(request, *args, **kwargs)
+    return _view
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return alias_leitura()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e primário têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
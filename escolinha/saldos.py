@@ -0,0 +1,71 @@
+# escolinha/saldos.py
+"""Saldo em aberto, atraso e último pagamento de cada aluno.
+
+``anotar_saldos`` acrescenta as colunas ao queryset de Aluno com agregação
+condicional sobre um único ``JOIN`` com os pagamentos (``GROUP BY`` aluno,
+servido pelo índice ``pagamento_aluno_venc_idx``), então a lista inteira
+sai em uma query, inclusive ordenada ou filtrada por essas colunas. O
+último pagamento vem de uma subconsulta em cada tabela (``Pagamento`` e o
+arquivo, ``PagamentoArquivado``): arquivar não muda a coluna.
+"""
+from datetime import date
+
+from django.db.models import Count, DateField, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, NullIf
+from django.utils import timezone
+
+from .models import Pagamento, PagamentoArquivado
+
+
+# Ordenações da lista de alunos; todas terminam em campos únicos para o cursor
+ORDENS = {
+    "nome": ("nome_completo", "id"),
+    "saldo": ("-saldo", "nome_completo", "id"),
+    "atrasado": ("-atrasado", "nome_completo", "id"),
+    "parcelas": ("-parcelas_atrasadas", "nome_completo", "id"),
+    # Quem está há mais tempo sem pagar (ou nunca pagou) primeiro
+    "ultimo_pagamento": ("ultimo_pagamento_ordem", "nome_completo", "id"),
+}
+
+SITUACOES = {
+    "devendo": Q(saldo__gt=0),
+    "atrasado": Q(atrasado__gt=0),
+    "em_dia": Q(atrasado=0),
+}
+
+# Quem nunca pagou ordena antes de qualquer data real
+NUNCA_PAGOU = date(1900, 1, 1)
+
+_ZERO = Value(0, output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _ultimo_pagamento(modelo):
+    # NUNCA_PAGOU no lugar de NULL: no SQLite GREATEST com um NULL dá NULL
+    ultimo = (
+        modelo.objects.filter(aluno=OuterRef("pk"), data_pagamento__isnull=False)
+        .order_by("-data_pagamento").values("data_pagamento")[:1]
+    )
+    return Coalesce(Subquery(ultimo), Value(NUNCA_PAGOU), output_field=DateField())
+
+
+def anotar_saldos(alunos, hoje=None):
+    """Anota ``saldo`` (em aberto), ``atrasado`` (em aberto e vencido),
+    ``parcelas_atrasadas`` e ``ultimo_pagamento`` em cada aluno."""
+    hoje = hoje or timezone.now().date()
+    aberto = Q(pagamentos__data_pagamento__isnull=True)
+    vencido = aberto & Q(pagamentos__data_vencimento__lt=hoje)
+    return alunos.annotate(
+        saldo=Coalesce(Sum("pagamentos__valor", filter=aberto), _ZERO),
+        atrasado=Coalesce(Sum("pagamentos__valor", filter=vencido), _ZERO),
+        parcelas_atrasadas=Count("pagamentos", filter=vencido),
+        ultimo_pagamento_ordem=Greatest(_ultimo_pagamento(Pagamento), _ultimo_pagamento(PagamentoArquivado)),
+    ).annotate(
+        ultimo_pagamento=NullIf(F("ultimo_pagamento_ordem"), Value(NUNCA_PAGOU, output_field=DateField())),
+    )
+
+
+def filtrar_situacao(alunos, situacao):
+    """Filtra alunos anotados por ``anotar_saldos`` (``HAVING``)."""
+    if situacao in SITUACOES:
+        return alunos.filter(SITUACOES[situacao])
+    return alunos
@@ -0,0 +1,85 @@
+# escolinha/signals.py
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import mensagens, referencia, rollup
+from .models import Aluno, ModeloMensagem, Pagamento, PagamentoArquivado, Turma
+
+
+def _turma_do_aluno(pagamento):
+    if type(pagamento).aluno.is_cached(pagamento):
+        return pagamento.aluno.turma_id
+    return Aluno.objects.values_list("turma_id", flat=True).get(pk=pagamento.aluno_id)
+
+
+@receiver(pre_save, sender=Pagamento)
+def guardar_pagamento_anterior(sender, instance, raw=False, **kwargs):
+    instance._rollup_anterior = None
+    if raw or rollup.esta_suspenso() or instance._state.adding or not instance.pk:
+        return
+    anterior = (
+        Pagamento.objects.filter(pk=instance.pk)
+        .values_list("data_vencimento", "aluno__turma_id", "forma_pagamento", "data_pagamento", "valor")
+        .first()
+    )
+    if anterior:
+        instance._rollup_anterior = (rollup.chave(*anterior[:4]), anterior[4])
+
+
+@receiver(post_save, sender=Pagamento)
+def atualizar_rollup_pagamento(sender, instance, raw=False, **kwargs):
+    if raw or rollup.esta_suspenso():
+        return
+    deltas = rollup.novos_deltas()
+    anterior = getattr(instance, "_rollup_anterior", None)
+    if anterior:
+        rollup.somar(deltas, anterior[0], anterior[1], sinal=-1)
+    atual = rollup.chave(
+        instance.data_vencimento, _turma_do_aluno(instance),
+        instance.forma_pagamento, instance.data_pagamento,
+    )
+    rollup.somar(deltas, atual, instance.valor)
+    rollup.aplicar(deltas)
+
+
+@receiver(pre_delete, sender=Pagamento)
+@receiver(pre_delete, sender=PagamentoArquivado)
+def remover_pagamento_do_rollup(sender, instance, **kwargs):
+    # Roda antes da exclusão: no cascade de Aluno o aluno ainda existe.
+    if rollup.esta_suspenso():
+        return
+    rollup.registrar([instance], turmas={instance.aluno_id: _turma_do_aluno(instance)}, sinal=-1)
+
+
+@receiver(pre_save, sender=Aluno)
+def guardar_turma_anterior(sender, instance, raw=False, **kwargs):
+    instance._turma_anterior = None
+    if raw or instance._state.adding or not instance.pk:
+        return
+    instance._turma_anterior = (
+        Aluno.objects.filter(pk=instance.pk).values_list("turma_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Aluno)
+def mover_rollup_de_turma(sender, instance, raw=False, **kwargs):
+    anterior = getattr(instance, "_turma_anterior", None)
+    if raw or rollup.esta_suspenso() or anterior is None or anterior == instance.turma_id:
+        return
+    depois = rollup.agregar_historico(aluno=instance)
+    antes = rollup.novos_deltas()
+    for (mes, _turma, forma, pago), (total, quantidade) in depois.items():
+        rollup.somar(antes, (mes, anterior, forma, pago), total, quantidade)
+    rollup.aplicar(rollup.diferenca(antes, depois))
+
+
+@receiver(post_save, sender=ModeloMensagem)
+@receiver(post_delete, sender=ModeloMensagem)
+def invalidar_modelos_mensagem(sender, **kwargs):
+    mensagens.invalidar()
+
+
+@receiver(post_save, sender=Turma)
+@receiver(post_delete, sender=Turma)
+def invalidar_turmas(sender, **kwargs):
+    referencia.invalidar()
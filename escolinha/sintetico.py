@@ -0,0 +1,154 @@
+# escolinha/sintetico.py
+"""Dados sintéticos em volume de produção para testes de carga locais.
+
+``gerar_dados`` cria turmas, alunos e o histórico mensal de pagamentos com
+distribuições próximas das reais: turmas de tamanhos diferentes, irmãos
+com o mesmo responsável, alunos que entram e saem ao longo do período,
+maioria pagando por Pix perto do vencimento e uma parte em atraso. Com a
+mesma ``semente`` o resultado é sempre o mesmo. Tudo é gravado com
+``bulk_create`` em lotes e o rollup é reconstruído no fim.
+"""
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+import random
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import referencia, rollup
+from .datas import competencias, primeiro_dia, somar_meses
+from .mensalidades import VENCIMENTO_DIA
+from .models import Aluno, Pagamento, Turma
+
+
+CATEGORIAS = [f"Sub {idade}" for idade in range(7, 18)]
+TURNOS = ("Manhã", "Tarde", "Noite", "Sábado")
+NOMES = (
+    "Miguel", "Arthur", "Heitor", "Theo", "Davi", "Gabriel", "Bernardo", "Samuel", "João", "Pedro",
+    "Lucas", "Enzo", "Rafael", "Gustavo", "Matheus", "Lorenzo", "Benício", "Nicolas", "Guilherme", "Felipe",
+    "Helena", "Alice", "Laura", "Maria", "Valentina", "Sophia", "Isabella", "Manuela", "Júlia", "Luísa",
+)
+SOBRENOMES = (
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+    "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa",
+    "Rocha", "Dias", "Nascimento", "Andrade", "Moreira", "Nunes", "Marques", "Machado", "Mendes", "Freitas",
+)
+RESPONSAVEIS = ("Ana", "Carla", "Fernanda", "Juliana", "Patrícia", "Roberto", "Marcos", "Paulo", "Cristina", "Sandra")
+MENSALIDADES = ((Decimal("40.00"), 50), (Decimal("50.00"), 25), (Decimal("60.00"), 15), (Decimal("80.00"), 10))
+FORMAS = (("PIX", 75), ("DINHEIRO", 20), ("OUTRO", 5))
+
+# Probabilidades por mês vencido / do mês corrente
+PAGO_VENCIDO = 0.93
+PAGO_MES_ATUAL = 0.45
+INATIVOS = 0.12
+IRMAOS = 0.15
+
+
+@dataclass
+class ResultadoSintetico:
+    turmas: int = 0
+    alunos: int = 0
+    pagamentos: int = 0
+    tempo: float = 0.0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _escolher(aleatorio, pesos):
+    valores, pesos_ = zip(*pesos)
+    return aleatorio.choices(valores, weights=pesos_)[0]
+
+
+def _turmas(aleatorio, quantidade):
+    nomes = [f"{categoria} {turno}" for turno in TURNOS for categoria in CATEGORIAS]
+    turmas = Turma.objects.bulk_create([
+        Turma(nome=nomes[i % len(nomes)] + (f" {i // len(nomes) + 1}" if i >= len(nomes) else ""),
+              status=aleatorio.random() > 0.05)
+        for i in range(quantidade)
+    ])
+    referencia.invalidar()
+    # Turmas cheias e vazias: peso de cada turma para sortear os alunos
+    return [t.pk for t in turmas], [aleatorio.paretovariate(1.5) for _ in turmas]
+
+
+def _aluno(aleatorio, turma_id, hoje, responsavel=None):
+    sobrenome = responsavel[1] if responsavel else aleatorio.choice(SOBRENOMES)
+    responsavel = responsavel or (
+        f"{aleatorio.choice(RESPONSAVEIS)} {sobrenome}", sobrenome,
+        f"51{aleatorio.randint(980000000, 999999999)}",
+    )
+    idade = aleatorio.randint(6, 17)
+    aluno = Aluno(
+        nome_completo=f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {sobrenome}",
+        data_nascimento=date(hoje.year - idade, aleatorio.randint(1, 12), aleatorio.randint(1, 28)),
+        nome_responsavel=responsavel[0],
+        contato_responsavel=responsavel[2],
+        mensalidade=_escolher(aleatorio, MENSALIDADES),
+        is_active=aleatorio.random() > INATIVOS,
+        turma_id=turma_id,
+    )
+    aluno.normalizar()
+    return aluno, responsavel
+
+
+def _pagamentos(aleatorio, aluno, meses, hoje):
+    # Entra em algum mês do período; inativos saem antes do fim
+    entrada = aleatorio.randrange(len(meses))
+    saida = len(meses) if aluno.is_active else aleatorio.randint(entrada + 1, len(meses))
+    for mes in meses[entrada:saida]:
+        vencimento = mes.replace(day=VENCIMENTO_DIA)
+        corrente = (mes.year, mes.month) == (hoje.year, hoje.month)
+        pago = aleatorio.random() < (PAGO_MES_ATUAL if corrente else PAGO_VENCIDO)
+        data_pagamento = None
+        if pago:
+            data_pagamento = min(vencimento + timedelta(days=int(aleatorio.gauss(0, 6))), hoje)
+        yield Pagamento(
+            aluno_id=aluno.pk,
+            data_vencimento=vencimento,
+            data_pagamento=data_pagamento,
+            forma_pagamento=_escolher(aleatorio, FORMAS),
+            valor=aluno.mensalidade,
+        )
+
+
+def gerar_dados(turmas=50, alunos=100_000, anos=5, semente=42, batch_size=None, hoje=None, progresso=None):
+    """Cria ``turmas`` turmas, ``alunos`` alunos e ``anos`` anos de mensalidades
+    até o mês de ``hoje``. ``progresso(alunos_gravados, total)`` é chamado a
+    cada lote."""
+    inicio_execucao = time.monotonic()
+    aleatorio = random.Random(semente)
+    batch_size = batch_size or settings.MENSALIDADES_BATCH_SIZE
+    hoje = hoje or timezone.now().date()
+    meses = competencias(somar_meses(primeiro_dia(hoje.year, hoje.month), -(12 * anos - 1)), hoje)
+    resultado = ResultadoSintetico(turmas=turmas)
+
+    turma_ids, pesos = _turmas(aleatorio, turmas)
+    responsavel = None
+    while resultado.alunos < alunos:
+        lote = []
+        for _ in range(min(batch_size, alunos - resultado.alunos)):
+            # Irmão: mesmo responsável do aluno anterior
+            irmao = responsavel if aleatorio.random() < IRMAOS else None
+            aluno, responsavel = _aluno(aleatorio, aleatorio.choices(turma_ids, weights=pesos)[0], hoje, irmao)
+            lote.append(aluno)
+        Aluno.objects.bulk_create(lote)
+        resultado.alunos += len(lote)
+
+        pagamentos = []
+        for aluno in lote:
+            pagamentos.extend(_pagamentos(aleatorio, aluno, meses, hoje))
+            if len(pagamentos) >= batch_size:
+                Pagamento.objects.bulk_create(pagamentos)
+                resultado.pagamentos += len(pagamentos)
+                pagamentos = []
+        Pagamento.objects.bulk_create(pagamentos)
+        resultado.pagamentos += len(pagamentos)
+        if progresso:
+            progresso(resultado.alunos, alunos)
+
+    rollup.reconstruir()
+    resultado.tempo = round(time.monotonic() - inicio_execucao, 3)
+    return resultado
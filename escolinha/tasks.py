@@ -1,48 +1,178 @@
 # escolinha/tasks.py
-from celery import shared_task
+import io
+import json
+import logging
+
+from celery import chord, shared_task
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.utils import timezone
-from datetime import date
-from .models import Aluno, Pagamento
-from django.db.models import Sum
+from . import arquivamento, campanhas
+from .datas import parse_competencia
+from .exportacao import exportar_para_arquivo
+from .filtros import filtros_pagamentos
+from .importacao import importar, nome_relatorio
+from .models import Campanha
+from .roteamento import usar_replica
+from .mensalidades import (
+    ResultadoGeracao, alunos_do_shard, dividir_em_shards, gerar_pagamentos,
+    gerar_pagamentos_periodo,
+)
+
+logger = logging.getLogger(__name__)
+
 
 @shared_task
-def gerar_pagamentos_mes():
+def gerar_pagamentos_mes(batch_size=None):
     """Gera pagamentos para todos os alunos ativos no início do mês,
     considerando adiantamentos/parciais."""
     hoje = timezone.now().date()
-    primeiro_dia = date(hoje.year, hoje.month, 1)
-    vencimento = date(hoje.year, hoje.month, 10)  # vencimento sempre dia 10
+    resultado = gerar_pagamentos(hoje.year, hoje.month, batch_size=batch_size)
+    return {"ano": hoje.year, "mes": hoje.month, **resultado.as_dict()}
+
+
+@shared_task
+def gerar_pagamentos_retroativos(inicio, fim, batch_size=None):
+    """Gera os pagamentos faltantes de todos os meses entre duas
+    competências ``"AAAA-MM"``. Pode ser reexecutada sem duplicar."""
+    resultado = gerar_pagamentos_periodo(
+        parse_competencia(inicio), parse_competencia(fim), batch_size=batch_size
+    )
+    return {"inicio": inicio, "fim": fim, **resultado.as_dict()}
+
+
+@shared_task
+def arquivar_pagamentos(batch_size=None):
+    """Move para o arquivo os pagamentos quitados além de ``ARQUIVAMENTO_MESES``.
+    Para agendar no beat (ex.: uma vez por mês, de madrugada)."""
+    return arquivamento.arquivar(batch_size=batch_size).as_dict()
 
-    alunos = Aluno.objects.filter(is_active=True)
 
-    for aluno in alunos:
-        mensalidade = aluno.mensalidade
+@shared_task(bind=True)
+def gerar_pagamentos_shard(self, ano, mes, shard, batch_size=None):
+    """Gera os pagamentos de um shard de alunos, publicando o progresso
+    no result backend (estado ``PROGRESS``)."""
+    def progresso(gravados, total):
+        self.update_state(state="PROGRESS", meta={"shard": shard, "gravados": gravados, "total": total})
 
-        # Pagamentos já existentes no mês
-        pagamentos_mes = Pagamento.objects.filter(
-            aluno=aluno,
-            data_vencimento__year=hoje.year,
-            data_vencimento__month=hoje.month
+    try:
+        resultado = gerar_pagamentos(
+            ano, mes, alunos=alunos_do_shard(shard), batch_size=batch_size, progresso=progresso
         )
+    except Exception as exc:
+        # Não derruba o chord: a falha volta para o callback, que lista os
+        # shards a reprocessar.
+        logger.exception("Falha ao gerar pagamentos do shard %s (%02d/%d)", shard, mes, ano)
+        return {"shard": shard, "erro": str(exc)}
+    return {"shard": shard, **resultado.as_dict()}
+
+
+@shared_task
+def consolidar_pagamentos_mes(resultados, ano, mes):
+    """Callback do chord: soma as contagens dos shards e lista os que falharam."""
+    total = ResultadoGeracao()
+    falhas = []
+    for item in resultados:
+        if "erro" in item:
+            falhas.append(item["shard"])
+            continue
+        total.somar(ResultadoGeracao(
+            criados=item["criados"],
+            completados=item["completados"],
+            ignorados=item["ignorados"],
+            tempo=item["tempo"],
+        ))
+    return {"ano": ano, "mes": mes, "shards": len(resultados), "falhas": falhas, **total.as_dict()}
+
+
+@shared_task
+def gerar_pagamentos_mes_paralelo(ano=None, mes=None, tamanho_shard=None, por_turma=False,
+                                  shards=None, batch_size=None):
+    """Distribui a geração do mês em uma subtarefa por shard de alunos.
+
+    Para reprocessar apenas os shards que falharam, passe em ``shards`` a
+    lista ``falhas`` devolvida por ``consolidar_pagamentos_mes``.
+    """
+    if ano is None or mes is None:
+        hoje = timezone.now().date()
+        ano, mes = hoje.year, hoje.month
+    if shards is None:
+        shards = dividir_em_shards(tamanho=tamanho_shard, por_turma=por_turma)
+    if not shards:
+        return {"ano": ano, "mes": mes, "callback_id": None, "shards": []}
+
+    subtarefas = [gerar_pagamentos_shard.s(ano, mes, shard, batch_size) for shard in shards]
+    # Os ids são fixados antes do envio para o operador acompanhar cada shard
+    acompanhamento = [
+        {"shard": shard, "task_id": subtarefa.freeze().id}
+        for shard, subtarefa in zip(shards, subtarefas)
+    ]
+    callback = chord(subtarefas)(consolidar_pagamentos_mes.s(ano, mes))
+    return {"ano": ano, "mes": mes, "callback_id": callback.id, "shards": acompanhamento}
+
+
+@shared_task(bind=True)
+def exportar_pagamentos(self, parametros, formato="csv"):
+    """Grava em arquivo a exportação dos pagamentos filtrados por
+    ``parametros`` (os mesmos da tela de pagamentos)."""
+    with usar_replica():
+        arquivo = exportar_para_arquivo(filtros_pagamentos(parametros), formato, self.request.id)
+    logger.info("Exportação %s gravada em %s", self.request.id, arquivo)
+    return {"arquivo": arquivo, "formato": formato}
+
+
+@shared_task
+def disparar_campanha(campanha_id):
+    """Agenda um ``enviar_lote_campanha`` por lote de mensagens pendentes,
+    espaçados por ``countdown`` para respeitar o limite de mensagens por
+    minuto do gateway (em todos os workers, não só por processo)."""
+    campanha = Campanha.objects.get(pk=campanha_id)
+    lotes = campanhas.lotes_pendentes(campanha)
+    Campanha.objects.filter(pk=campanha_id).update(status=Campanha.ENVIANDO)
+    intervalo = campanhas.intervalo_entre_lotes()
+    for i, ids in enumerate(lotes):
+        enviar_lote_campanha.apply_async((campanha_id, ids), countdown=round(i * intervalo))
+    if not lotes:
+        campanhas.atualizar_status(campanha_id)
+    return {"campanha": campanha_id, "lotes": len(lotes)}
+
+
+@shared_task(bind=True, max_retries=3)
+def enviar_lote_campanha(self, campanha_id, ids):
+    """Envia um lote; as falhas temporárias voltam para a fila com espera
+    crescente e, na última tentativa, ficam como ``falha``."""
+    ultima = self.request.retries >= self.max_retries
+    repetir, contadores = campanhas.enviar_lote(ids, ultima_tentativa=ultima)
+    if repetir:
+        logger.warning("Campanha %s: %d mensagens para nova tentativa", campanha_id, len(repetir))
+        raise self.retry(args=(campanha_id, repetir), countdown=60 * 2 ** self.request.retries)
+    campanhas.atualizar_status(campanha_id)
+    return {"campanha": campanha_id, **contadores}
+
+
+@shared_task
+def verificar_campanhas():
+    """Expira as reservas abandonadas e conclui as campanhas em envio que
+    não têm mais nada a enviar (ex.: o worker do último lote morreu). Para
+    agendar no beat, a cada poucos minutos."""
+    ids = list(Campanha.objects.filter(status=Campanha.ENVIANDO).values_list("id", flat=True))
+    for campanha_id in ids:
+        campanhas.atualizar_status(campanha_id)
+    return {"campanhas": len(ids)}
 
-        total_mes = pagamentos_mes.aggregate(total=Sum("valor"))["total"] or 0
-
-        # Se não existe nada ainda ou se o valor é menor que a mensalidade, cria/completa
-        if total_mes == 0:
-            # Cria a mensalidade inteira
-            Pagamento.objects.create(
-                aluno=aluno,
-                data_vencimento=vencimento,
-                valor=mensalidade
-            )
-        elif total_mes < mensalidade:
-            # Se já tem pago/adiantado mas é menor que a mensalidade, cria a diferença
-            faltante = mensalidade - total_mes
-            Pagamento.objects.create(
-                aluno=aluno,
-                data_vencimento=vencimento,
-                valor=faltante
-            )
-
-    return f"{alunos.count()} pagamentos processados para {hoje.month}/{hoje.year}"
 
+@shared_task(bind=True)
+def importar_csv(self, tipo, arquivo):
+    """Importa o CSV enviado (nome em ``default_storage``) e grava o
+    relatório ao lado dele; o arquivo enviado é removido no fim."""
+    with default_storage.open(arquivo, "rb") as bruto, \
+            io.TextIOWrapper(bruto, encoding="utf-8-sig", newline="") as texto:
+        resultado = importar(tipo, texto)
+    relatorio = {"tipo": tipo, **resultado.as_dict()}
+    default_storage.save(
+        nome_relatorio(self.request.id),
+        ContentFile(json.dumps(relatorio, ensure_ascii=False, default=str).encode()),
+    )
+    default_storage.delete(arquivo)
+    logger.info("Importação %s: %d criados, %d com erro", self.request.id, resultado.criados, resultado.com_erro)
+    return {chave: relatorio[chave] for chave in ("tipo", "linhas", "criados", "com_erro")}
@@ -0,0 +1,24 @@
+# escolinha/templatetags/paginacao_tags.py
+"""``{% paginacao page_obj filtros %}``: componente de paginação das listas.
+
+``{% href_filtros filtros ordem="saldo" %}``: link para a mesma lista com
+os filtros atuais e um valor trocado.
+"""
+from django import template
+
+from ..paginacao import href_filtros, links_paginacao
+
+
+register = template.Library()
+
+
+@register.inclusion_tag("partials/pagination.html")
+def paginacao(page_obj, filtros=None):
+    return {
+        "mostrar": page_obj.has_other_pages(),
+        "is_cursor": getattr(page_obj, "is_cursor", False),
+        **links_paginacao(page_obj, filtros),
+    }
+
+
+register.simple_tag(href_filtros)
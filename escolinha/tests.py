@@ -1,3 +1,1484 @@
-from django.test import TestCase
+import base64
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import io
+import itertools
+import json
+import re
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock
+import urllib.parse
 
-# Create your tests here.
+from app.celery import app as celery_app
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import openpyxl
+
+from . import (
+    acoes, arquivamento, benchmark, busca, cache as cache_dashboard, conciliacao, mensagens, metricas, referencia,
+    rollup, saldos, whatsapp,
+)
+from .campanhas import criar_campanha, enviar_lote, resumo
+from .concorrencia import em_paralelo
+from .exportacao import arquivo_pronto, csv_em_partes, gravar_xlsx, linhas_pagamentos
+from .forms import AlunoForm
+from .filtros import ORDEM_PAGAMENTOS, STATUS_PAGAMENTO, filtrar_pagamentos, filtros_pagamentos
+from .importacao import importar_alunos, importar_pagamentos
+from .urls import urlpatterns
+from .mensalidades import alunos_do_shard, dividir_em_shards, gerar_pagamentos, gerar_pagamentos_periodo
+from .middleware import FixarPrimarioMiddleware, MedicaoConsultasMiddleware
+from .models import (
+    Aluno, Campanha, Conciliacao, FaturamentoMensal, LancamentoExtrato, MensagemCampanha, ModeloMensagem, Pagamento,
+    PagamentoArquivado, Turma,
+)
+from .paginacao import CursorPaginator, janela_paginas, links_paginacao
+from .roteamento import COOKIE_PRIMARIO, usar_replica
+from .sintetico import gerar_dados
+from .tasks import (
+    consolidar_pagamentos_mes, disparar_campanha, exportar_pagamentos, gerar_pagamentos_mes_paralelo,
+    gerar_pagamentos_shard, verificar_campanhas,
+)
+from .turmas import resumo_turmas, turma_selecionada, turmas_ativas
+
+# Cadastro anterior a todos os meses gerados nos testes: a geração só cobra
+# a partir do mês em que o aluno foi cadastrado
+CADASTRO_ANTIGO = datetime(2019, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class GerarPagamentosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = Turma.objects.create(nome="Sub 11")
+
+    def criar_aluno(self, nome, mensalidade="40.00", **kwargs):
+        aluno = Aluno.objects.create(
+            nome_completo=nome,
+            data_nascimento=date(2015, 1, 1),
+            mensalidade=Decimal(mensalidade),
+            turma=self.turma,
+            **kwargs,
+        )
+        Aluno.objects.filter(pk=aluno.pk).update(created_at=CADASTRO_ANTIGO)
+        return aluno
+
+    def valores_do_mes(self, aluno, ano=2025, mes=3):
+        return sorted(
+            Pagamento.objects.filter(
+                aluno=aluno, data_vencimento__year=ano, data_vencimento__month=mes
+            ).values_list("valor", flat=True)
+        )
+
+    def test_mesma_regra_da_geracao_por_aluno(self):
+        sem_nada = self.criar_aluno("Sem nada")
+        parcial = self.criar_aluno("Parcial")
+        Pagamento.objects.create(aluno=parcial, data_vencimento=date(2025, 3, 5), valor=Decimal("15.00"))
+        quitado = self.criar_aluno("Quitado")
+        Pagamento.objects.create(aluno=quitado, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"))
+        adiantado = self.criar_aluno("Adiantado")
+        Pagamento.objects.create(aluno=adiantado, data_vencimento=date(2025, 3, 1), valor=Decimal("50.00"))
+        outro_mes = self.criar_aluno("Outro mês")
+        Pagamento.objects.create(aluno=outro_mes, data_vencimento=date(2025, 2, 10), valor=Decimal("40.00"))
+        inativo = self.criar_aluno("Inativo", is_active=False)
+
+        resultado = gerar_pagamentos(2025, 3, batch_size=2)
+
+        self.assertEqual((resultado.criados, resultado.completados, resultado.ignorados), (2, 1, 2))
+        self.assertEqual(self.valores_do_mes(sem_nada), [Decimal("40.00")])
+        self.assertEqual(self.valores_do_mes(parcial), [Decimal("15.00"), Decimal("25.00")])
+        self.assertEqual(self.valores_do_mes(quitado), [Decimal("40.00")])
+        self.assertEqual(self.valores_do_mes(adiantado), [Decimal("50.00")])
+        self.assertEqual(self.valores_do_mes(outro_mes), [Decimal("40.00")])
+        self.assertEqual(self.valores_do_mes(inativo), [])
+        self.assertTrue(
+            Pagamento.objects.filter(aluno=sem_nada, data_vencimento=date(2025, 3, 10)).exists()
+        )
+
+    def test_segunda_execucao_nao_duplica(self):
+        self.criar_aluno("Aluno")
+        gerar_pagamentos(2025, 3)
+        resultado = gerar_pagamentos(2025, 3)
+        self.assertEqual((resultado.criados, resultado.completados, resultado.ignorados), (0, 0, 1))
+        self.assertEqual(Pagamento.objects.count(), 1)
+
+    def test_periodo_gera_meses_faltantes(self):
+        aluno = self.criar_aluno("Aluno")
+        Pagamento.objects.create(aluno=aluno, data_vencimento=date(2025, 2, 10), valor=Decimal("10.00"))
+        Pagamento.objects.create(aluno=aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"))
+
+        resultado = gerar_pagamentos_periodo(date(2024, 12, 1), date(2025, 3, 1))
+
+        self.assertEqual((resultado.criados, resultado.completados, resultado.ignorados), (2, 1, 1))
+        self.assertEqual(self.valores_do_mes(aluno, 2024, 12), [Decimal("40.00")])
+        self.assertEqual(self.valores_do_mes(aluno, 2025, 1), [Decimal("40.00")])
+        self.assertEqual(self.valores_do_mes(aluno, 2025, 2), [Decimal("10.00"), Decimal("30.00")])
+        self.assertEqual(gerar_pagamentos_periodo(date(2024, 12, 1), date(2025, 3, 1)).ignorados, 4)
+
+    def test_periodo_cobra_a_partir_do_mes_do_cadastro(self):
+        antigo = self.criar_aluno("Antigo")
+        novo = self.criar_aluno("Novo")
+        # Cadastrado em 31/01 às 23h em São Paulo (já 01/02 em UTC): cobra de janeiro
+        Aluno.objects.filter(pk=novo.pk).update(created_at=datetime(2025, 2, 1, 2, tzinfo=dt_timezone.utc))
+
+        resultado = gerar_pagamentos_periodo(date(2024, 11, 1), date(2025, 2, 1))
+
+        self.assertEqual(resultado.criados, 4 + 2)
+        self.assertEqual(Pagamento.objects.filter(aluno=antigo).count(), 4)
+        self.assertEqual(
+            list(Pagamento.objects.filter(aluno=novo).order_by("data_vencimento").values_list("data_vencimento", flat=True)),
+            [date(2025, 1, 10), date(2025, 2, 10)],
+        )
+
+
+class GeracaoParalelaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        turmas = [Turma.objects.create(nome="Sub 9"), Turma.objects.create(nome="Sub 11")]
+        for i in range(5):
+            Aluno.objects.create(nome_completo=f"Aluno {i}", data_nascimento=date(2015, 1, 1), turma=turmas[i % 2])
+        Aluno.objects.create(nome_completo="Inativo", data_nascimento=date(2015, 1, 1), turma=turmas[0],
+                             is_active=False)
+        Aluno.objects.update(created_at=CADASTRO_ANTIGO)
+        cls.ativos = set(Aluno.objects.filter(is_active=True).values_list("id", flat=True))
+
+    def setUp(self):
+        # Sem result backend nos testes: o progresso dos shards não é publicado
+        patcher = mock.patch.object(gerar_pagamentos_shard, "update_state")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def gerar(self, **kwargs):
+        """Roda o chord em modo eager e devolve o retorno do callback."""
+        consolidados = []
+        original = consolidar_pagamentos_mes.run
+
+        def consolidar(*args, **kw):
+            consolidados.append(original(*args, **kw))
+            return consolidados[-1]
+
+        celery_app.conf.task_always_eager = True
+        try:
+            with mock.patch.object(consolidar_pagamentos_mes, "run", side_effect=consolidar):
+                gerar_pagamentos_mes_paralelo.delay(2025, 3, **kwargs)
+        finally:
+            celery_app.conf.task_always_eager = False
+        self.assertEqual(len(consolidados), 1)
+        return consolidados[0]
+
+    def test_shards_cobrem_todos_os_ativos_sem_repetir(self):
+        for kwargs in ({"tamanho": 2}, {"tamanho": 10}, {"por_turma": True}):
+            with self.subTest(**kwargs):
+                ids = [
+                    aluno_id for shard in dividir_em_shards(**kwargs)
+                    for aluno_id in alunos_do_shard(shard).filter(is_active=True).values_list("id", flat=True)
+                ]
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(set(ids), self.ativos)
+        self.assertEqual(len(dividir_em_shards(tamanho=2)), 3)
+        self.assertEqual(len(dividir_em_shards(por_turma=True)), 2)
+
+    def test_callback_soma_os_shards(self):
+        resultado = self.gerar(tamanho_shard=2)
+        self.assertEqual((resultado["shards"], resultado["falhas"]), (3, []))
+        self.assertEqual((resultado["criados"], resultado["ignorados"]), (5, 0))
+        self.assertEqual(set(Pagamento.objects.values_list("aluno_id", flat=True)), self.ativos)
+        self.assertEqual(rollup.verificar(), {})
+
+    def test_reprocessa_so_o_shard_que_falhou_sem_duplicar(self):
+        shards = dividir_em_shards(tamanho=2)
+        original = gerar_pagamentos
+
+        def falhar_no_segundo(ano, mes, alunos=None, **kwargs):
+            if set(alunos.values_list("id", flat=True)) == set(alunos_do_shard(shards[1]).values_list("id", flat=True)):
+                raise RuntimeError("banco fora")
+            return original(ano, mes, alunos=alunos, **kwargs)
+
+        with mock.patch("escolinha.tasks.gerar_pagamentos", side_effect=falhar_no_segundo), \
+                self.assertLogs("escolinha.tasks", "ERROR"):
+            resultado = self.gerar(tamanho_shard=2)
+        self.assertEqual((resultado["falhas"], resultado["criados"]), ([shards[1]], 3))
+        self.assertEqual(Pagamento.objects.count(), 3)
+
+        resultado = self.gerar(shards=resultado["falhas"])
+        self.assertEqual((resultado["shards"], resultado["falhas"], resultado["criados"]), (1, [], 2))
+        self.assertEqual(Pagamento.objects.count(), 5)
+        self.assertEqual(set(Pagamento.objects.values_list("aluno_id", flat=True)), self.ativos)
+
+        # Tudo de novo: nada a criar
+        resultado = self.gerar(tamanho_shard=2)
+        self.assertEqual((resultado["criados"], resultado["ignorados"]), (0, 5))
+        self.assertEqual(Pagamento.objects.count(), 5)
+        self.assertEqual(rollup.verificar(), {})
+
+
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        turma = Turma.objects.create(nome="Sub 11")
+        cls.aluno = Aluno.objects.create(
+            nome_completo="Aluno", data_nascimento=date(2015, 1, 1), turma=turma
+        )
+
+    def setUp(self):
+        django_cache.clear()
+
+    def pagar(self, vencimento, valor, pago_em=None, forma="PIX"):
+        Pagamento.objects.create(
+            aluno=self.aluno, data_vencimento=vencimento, data_pagamento=pago_em,
+            valor=Decimal(valor), forma_pagamento=forma,
+        )
+
+    def test_indicadores_em_uma_query(self):
+        self.pagar(date(2025, 3, 10), "40.00", pago_em=date(2025, 3, 9))
+        self.pagar(date(2025, 3, 10), "25.00")
+        self.pagar(date(2025, 3, 28), "10.00")
+
+        arquivamento.ultimo_ano_arquivado()  # arquivo vazio, fica em cache
+        with self.assertNumQueries(1):
+            kpis = metricas.indicadores(date(2025, 3, 1), date(2025, 3, 31), hoje=date(2025, 3, 20))
+
+        self.assertEqual(kpis["esperado"], Decimal("75.00"))
+        self.assertEqual(kpis["recebido"], Decimal("40.00"))
+        self.assertEqual(kpis["atrasado"], Decimal("25.00"))
+        self.assertEqual(kpis["ativos"], 1)
+
+    def test_faturamento_usa_meses_de_calendario(self):
+        # Com 30 dias por mês, 01/03 - 30 dias cai em 30/01 e fevereiro some da série.
+        self.pagar(date(2025, 2, 10), "40.00", pago_em=date(2025, 2, 10))
+        self.pagar(date(2025, 3, 10), "15.00", pago_em=date(2025, 3, 10))
+
+        with self.assertNumQueries(1):
+            serie = metricas.faturamento_mensal(date(2025, 3, 31), meses=6)
+
+        self.assertEqual([item["mes"] for item in serie],
+                         ["10/2024", "11/2024", "12/2024", "01/2025", "02/2025", "03/2025"])
+        self.assertEqual(serie[-2]["valor"], 40.0)
+        self.assertEqual(serie[-1]["valor"], 15.0)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = Turma.objects.create(nome="Sub 11")
+        cls.outra_turma = Turma.objects.create(nome="Sub 13")
+        cls.aluno = Aluno.objects.create(
+            nome_completo="Aluno", data_nascimento=date(2015, 1, 1), turma=cls.turma
+        )
+        Aluno.objects.update(created_at=CADASTRO_ANTIGO)
+
+    def test_acompanha_alteracoes_de_pagamento_e_turma(self):
+        pagamento = Pagamento.objects.create(aluno=self.aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"))
+        Pagamento.objects.create(aluno=self.aluno, data_vencimento=date(2025, 4, 10), valor=Decimal("40.00"))
+        gerar_pagamentos(2025, 5)
+
+        pagamento.data_pagamento = date(2025, 3, 12)
+        pagamento.forma_pagamento = "DINHEIRO"
+        pagamento.save()
+        self.aluno.turma = self.outra_turma
+        self.aluno.save()
+        Pagamento.objects.get(data_vencimento=date(2025, 4, 10)).delete()
+
+        self.assertEqual(rollup.verificar(), {})
+        kpis = metricas.indicadores_mes(2025, 3, turma=self.outra_turma.id, hoje=date(2025, 6, 1))
+        self.assertEqual((kpis["recebido"], kpis["esperado"], kpis["ativos"]), (Decimal("40.00"), Decimal("40.00"), 1))
+
+    def test_geracao_aplica_o_rollup_uma_vez_em_ordem_de_chave(self):
+        Aluno.objects.create(nome_completo="Outro", data_nascimento=date(2015, 1, 1), turma=self.outra_turma)
+        Aluno.objects.update(created_at=CADASTRO_ANTIGO)
+        with mock.patch("escolinha.rollup.aplicar", wraps=rollup.aplicar) as aplicar, \
+                mock.patch.object(FaturamentoMensal.objects, "get_or_create",
+                                  wraps=FaturamentoMensal.objects.get_or_create) as get_or_create:
+            gerar_pagamentos_periodo(date(2025, 3, 1), date(2025, 4, 1), batch_size=1)
+
+        aplicar.assert_called_once()
+        chaves = [(c.kwargs["mes"], c.kwargs["turma_id"]) for c in get_or_create.call_args_list]
+        self.assertEqual(len(chaves), 4)
+        self.assertEqual(chaves, sorted(chaves))
+        self.assertEqual(rollup.verificar(), {})
+
+    def test_reconstruir_corrige_divergencia(self):
+        Pagamento.objects.create(aluno=self.aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"))
+        FaturamentoMensal.objects.update(total=Decimal("1.00"))
+
+        self.assertEqual(len(rollup.verificar()), 1)
+        rollup.reconstruir()
+        self.assertEqual(rollup.verificar(), {})
+
+
+class CacheDashboardTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        cache_dashboard._pendentes.clear()
+        self.turma = Turma.objects.create(nome="Sub 11")
+        self.aluno = Aluno.objects.create(
+            nome_completo="Aluno", data_nascimento=date(2015, 1, 1), turma=self.turma
+        )
+
+    def test_alteracao_no_mes_invalida_so_o_necessario(self):
+        calculos = []
+        mes = date(2025, 3, 1)
+
+        def calcular():
+            calculos.append(1)
+            return len(calculos)
+
+        def obter():
+            return cache_dashboard.obter_ou_calcular("teste", (2025, 3), [mes], self.turma.id, calcular)
+
+        self.assertEqual(obter(), 1)
+        self.assertEqual(obter(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pagamento.objects.create(aluno=self.aluno, data_vencimento=date(2025, 4, 10), valor=Decimal("40.00"))
+        self.assertEqual(obter(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pagamento.objects.create(aluno=self.aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"))
+        self.assertEqual(obter(), 2)
+        self.assertEqual(cache_dashboard.estatisticas(), {"hits": 2, "misses": 2, "taxa_acerto": 50.0})
+
+        # Versão despejada do cache: a nova não reaproveita entradas antigas
+        django_cache.delete_many([f"dashboard:versao:2025-03:{self.turma.id}"])
+        self.assertEqual(obter(), 3)
+
+    def test_falha_do_cache_na_invalidacao_nao_derruba_a_gravacao(self):
+        calcular = mock.Mock(side_effect=[1, 2, 3, 4])
+
+        def obter():
+            return cache_dashboard.obter_ou_calcular("teste", (2025, 3), [date(2025, 3, 1)], None, calcular)
+
+        self.assertEqual(obter(), 1)
+        with mock.patch.object(django_cache, "set_many", side_effect=ConnectionError("redis fora")):
+            with self.assertLogs("escolinha.cache", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+                Pagamento.objects.create(aluno=self.aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"))
+            self.assertEqual(Pagamento.objects.count(), 1)
+            # Versões não trocadas: o cache não é lido enquanto não der certo
+            self.assertEqual(obter(), 2)
+        # Cache de volta: a troca pendente é feita e o cache volta a valer
+        self.assertEqual(obter(), 3)
+        self.assertEqual(obter(), 3)
+
+    def test_leitura_com_cache_fora_calcula_direto(self):
+        with (
+            mock.patch.object(django_cache, "get_many", side_effect=ConnectionError("redis fora")),
+            self.assertLogs("escolinha.cache", "ERROR"),
+        ):
+            valor = cache_dashboard.obter_ou_calcular("teste", (2025, 3), [date(2025, 3, 1)], None, lambda: 7)
+        self.assertEqual(valor, 7)
+
+
+@override_settings(DASHBOARD_CONCORRENCIA=1)
+class MetricasEndpointsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        turma = Turma.objects.create(nome="Sub 11")
+        cls.aluno = Aluno.objects.create(nome_completo="Aluno", data_nascimento=date(2015, 1, 1), turma=turma)
+        Pagamento.objects.create(aluno=cls.aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"),
+                                 data_pagamento=date(2025, 3, 5), forma_pagamento="PIX")
+        Pagamento.objects.create(aluno=cls.aluno, data_vencimento=date(2025, 2, 10), valor=Decimal("50.00"))
+
+    def setUp(self):
+        django_cache.clear()
+        self.client.force_login(User.objects.create_user("secretaria"))
+
+    def test_cada_widget_no_seu_endpoint(self):
+        indicadores = self.client.get(reverse("metricas_indicadores"), {"year": 2025, "month": 3}).json()
+        self.assertEqual(
+            (Decimal(indicadores["recebido"]), Decimal(indicadores["esperado"]), indicadores["ativos"]),
+            (Decimal("40.00"), Decimal("40.00"), 1),
+        )
+        faturamento = self.client.get(reverse("metricas_faturamento"), {"inicio": "2025-01-01", "fim": "2025-03-31"})
+        self.assertEqual(faturamento.json()["labels"], ["01/2025", "02/2025", "03/2025"])
+        self.assertEqual(faturamento.json()["values"], [0.0, 0.0, 40.0])
+        formas = self.client.get(reverse("metricas_formas"), {"year": 2025, "month": 3}).json()
+        self.assertEqual((formas["labels"], formas["values"]), (["PIX"], [1]))
+
+    def test_dashboard_busca_cada_widget_no_seu_endpoint(self):
+        resposta = self.client.get(reverse("dashboard"))
+        for nome in ("metricas_indicadores", "metricas_faturamento", "metricas_formas"):
+            self.assertContains(resposta, reverse(nome))
+        self.assertContains(resposta, ".catch(")
+
+    def test_cache_por_widget(self):
+        params = {"year": 2025, "month": 3}
+        self.client.get(reverse("metricas_indicadores"), params)
+        self.client.get(reverse("metricas_indicadores"), params)
+        self.assertEqual(cache_dashboard.estatisticas()["hits"], 1)
+        # Outro widget não reaproveita o cache do primeiro
+        self.client.get(reverse("metricas_formas"), params)
+        self.assertEqual(cache_dashboard.estatisticas()["misses"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pagamento.objects.create(aluno=self.aluno, data_vencimento=date(2025, 3, 20), valor=Decimal("10.00"))
+        indicadores = self.client.get(reverse("metricas_indicadores"), params).json()
+        self.assertEqual(Decimal(indicadores["esperado"]), Decimal("50.00"))
+        self.assertEqual(cache_dashboard.estatisticas()["misses"], 3)
+
+    def test_intervalo_invalido_ou_longo_demais(self):
+        url = reverse("metricas_faturamento")
+        with self.settings(METRICAS_MAX_MESES=36):
+            self.assertEqual(self.client.get(url, {"inicio": "2023-01-01", "fim": "2025-12-31"}).status_code, 200)
+            for params in (
+                {"inicio": "2023-01-01", "fim": "2026-01-01"},
+                {"inicio": "0001-01-01", "fim": "9999-12-31"},
+                {"inicio": "2025-03-01", "fim": "2025-02-01"},
+                {"inicio": "2025-03-01"},
+                {"inicio": "ontem", "fim": "2025-02-01"},
+                {"year": "2025", "month": "13"},
+            ):
+                with self.subTest(**params):
+                    resposta = self.client.get(url, params)
+                    self.assertEqual(resposta.status_code, 400)
+                    self.assertIn("erro", resposta.json())
+
+
+class BuscaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        turma = Turma.objects.create(nome="Sub 11")
+        for nome in ["João da Conceição", "Joana Araújo", "Pedro Joaquim"]:
+            Aluno.objects.create(nome_completo=nome, data_nascimento=date(2015, 1, 1), turma=turma)
+
+    def nomes(self, termo):
+        return sorted(busca.filtrar(Aluno.objects.all(), termo).values_list("nome_completo", flat=True))
+
+    def test_ignora_acentos_e_maiusculas(self):
+        self.assertEqual(Aluno.objects.get(nome_completo="João da Conceição").nome_busca, "joao da conceicao")
+        self.assertEqual(self.nomes("JOAO conceicao"), ["João da Conceição"])
+        self.assertEqual(self.nomes("araujo"), ["Joana Araújo"])
+
+    def test_casa_inicio_de_palavra(self):
+        self.assertEqual(self.nomes("jo"), ["Joana Araújo", "João da Conceição", "Pedro Joaquim"])
+        self.assertEqual(self.nomes("oao"), [])
+        self.assertEqual(self.nomes("joaq"), ["Pedro Joaquim"])
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        turma = Turma.objects.create(nome="Sub 11")
+        alunos = [
+            Aluno.objects.create(nome_completo=f"Aluno {i}", data_nascimento=date(2015, 1, 1), turma=turma)
+            for i in range(3)
+        ]
+        for mes in range(1, 5):
+            for aluno in alunos:
+                Pagamento.objects.create(aluno=aluno, data_vencimento=date(2025, mes, 10), valor=Decimal("40.00"))
+
+    def test_percorre_paginas_nos_dois_sentidos(self):
+        ordering = ("-data_vencimento", "aluno_id", "id")
+        esperado = list(Pagamento.objects.order_by(*ordering))
+        paginator = CursorPaginator(Pagamento.objects.all(), 5, ordering=ordering)
+
+        paginas = [paginator.get_page()]
+        while paginas[-1].has_next():
+            paginas.append(paginator.get_page(paginas[-1].next_cursor))
+
+        self.assertEqual([p for pagina in paginas for p in pagina], esperado)
+        self.assertEqual([len(pagina) for pagina in paginas], [5, 5, 2])
+        self.assertFalse(paginas[0].has_previous())
+        self.assertEqual(paginas[-1].total_aproximado, 12)
+
+        anterior = paginator.get_page(paginas[2].previous_cursor)
+        self.assertEqual(list(anterior), list(paginas[1]))
+        primeira = paginator.get_page(anterior.previous_cursor)
+        self.assertEqual(list(primeira), list(paginas[0]))
+        self.assertFalse(primeira.has_previous())
+
+    def test_cursor_invalido_volta_para_primeira_pagina(self):
+        paginator = CursorPaginator(Pagamento.objects.all(), 5, ordering=("-data_vencimento", "aluno_id", "id"))
+        self.assertEqual(list(paginator.get_page("lixo")), list(paginator.get_page()))
+
+    def test_cursor_com_valores_de_tipo_errado_volta_para_primeira_pagina(self):
+        self.client.force_login(User.objects.create_user("secretaria"))
+        primeira = self.client.get("/pagamentos/")
+        for valores in (["x", 1, 2], ["2025-03-10", "y", 2], [[1], 1, 2], ["2025-03-10", 1, {"a": 1}]):
+            with self.subTest(valores=valores):
+                cursor = base64.urlsafe_b64encode(json.dumps({"v": valores, "d": "p"}).encode()).decode()
+                resposta = self.client.get("/pagamentos/", {"cursor": cursor})
+                self.assertEqual(resposta.status_code, 200)
+                self.assertEqual(list(resposta.context["page_obj"]), list(primeira.context["page_obj"]))
+        # Ordenação por coluna anotada (saldo) na lista de alunos
+        cursor = base64.urlsafe_b64encode(json.dumps({"v": ["x", "A", 1], "d": "p"}).encode()).decode()
+        self.assertEqual(self.client.get("/", {"ordem": "saldo", "cursor": cursor}).status_code, 200)
+
+
+class ArquivamentoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = Turma.objects.create(nome="Sub 11")
+        cls.aluno = Aluno.objects.create(nome_completo="Ana", data_nascimento=date(2015, 1, 1), turma=cls.turma)
+        Aluno.objects.update(created_at=CADASTRO_ANTIGO)
+        pago = {"aluno": cls.aluno, "valor": Decimal("40.00"), "forma_pagamento": "PIX"}
+        cls.antigos = [
+            Pagamento.objects.create(data_vencimento=date(2020, 3, 10), data_pagamento=date(2020, 3, 8), **pago),
+            Pagamento.objects.create(data_vencimento=date(2021, 5, 10), data_pagamento=date(2021, 5, 9), **pago),
+        ]
+        cls.aberto = Pagamento.objects.create(aluno=cls.aluno, data_vencimento=date(2021, 6, 10), valor=Decimal("40"))
+        cls.conciliado = Pagamento.objects.create(
+            data_vencimento=date(2021, 7, 10), data_pagamento=date(2021, 7, 10), **pago,
+        )
+        LancamentoExtrato.objects.create(
+            conciliacao=Conciliacao.objects.create(arquivo="extrato.csv"), identificador="x", data=date(2021, 7, 10),
+            valor=Decimal("40.00"), status=LancamentoExtrato.CONCILIADO, pagamento=cls.conciliado,
+        )
+        cls.recente = Pagamento.objects.create(
+            data_vencimento=date(2025, 3, 10), data_pagamento=date(2025, 3, 1), **pago,
+        )
+
+    def test_move_so_quitados_antigos_sem_mexer_no_rollup(self):
+        rollup_atual = FaturamentoMensal.objects.order_by("mes", "forma_pagamento", "pago").values_list("total", "quantidade")
+        totais = list(rollup_atual)
+        resultado = arquivamento.arquivar(limite=date(2023, 1, 1), batch_size=1)
+
+        self.assertEqual((resultado.pagamentos, resultado.anos), (2, [2020, 2021]))
+        self.assertEqual(
+            set(Pagamento.objects.values_list("pk", flat=True)), {self.aberto.pk, self.conciliado.pk, self.recente.pk},
+        )
+        self.assertEqual(sorted(PagamentoArquivado.objects.values_list("ano", "id")),
+                         [(2020, self.antigos[0].pk), (2021, self.antigos[1].pk)])
+        self.assertEqual(list(rollup_atual.all()), totais)
+        self.assertEqual(rollup.verificar(), {})
+        self.assertEqual(arquivamento.arquivar(limite=date(2023, 1, 1)).pagamentos, 0)
+
+        # Trocar de turma ou excluir o aluno mantém o rollup certo com o arquivo
+        self.aluno.turma = Turma.objects.create(nome="Sub 13")
+        self.aluno.save()
+        self.assertEqual(rollup.verificar(), {})
+        self.aluno.delete()
+        self.assertEqual(rollup.verificar(), {})
+        self.assertFalse(PagamentoArquivado.objects.exists())
+
+    def test_numeros_do_dashboard_iguais_depois_de_arquivar(self):
+        def numeros():
+            inicio, fim = date(2020, 1, 1), date(2021, 12, 31)
+            return [
+                metricas.indicadores(inicio, fim),
+                metricas.indicadores(inicio, fim, turma=self.turma.id),
+                metricas.indicadores_mes(2020, 3),
+                metricas.indicadores_mes(2021, 5, turma=self.turma.id),
+                sorted(metricas.formas_pagamento(inicio, fim), key=lambda f: f["forma_pagamento"]),
+                metricas.formas_pagamento_mes(2021, 5),
+                metricas.faturamento_mensal(date(2021, 7, 1), meses=24),
+            ]
+
+        antes = numeros()
+        arquivamento.arquivar(limite=date(2023, 1, 1))
+        self.assertEqual(numeros(), antes)
+        self.assertEqual(antes[2]["ativos"], 1)
+
+    def test_geracao_e_importacao_nao_duplicam_o_arquivado(self):
+        arquivamento.arquivar(limite=date(2023, 1, 1))
+        resultado = gerar_pagamentos_periodo(date(2020, 3, 1), date(2020, 3, 1))
+        self.assertEqual((resultado.criados, resultado.ignorados), (0, 1))
+
+        conteudo = "aluno,data_vencimento,data_pagamento,forma_pagamento,valor\nAna,10/05/2021,09/05/2021,pix,40.00\n"
+        importado = importar_pagamentos(io.StringIO(conteudo))
+        self.assertEqual((importado.criados, importado.com_erro), (0, 1))
+        self.assertEqual(rollup.verificar(), {})
+
+    def test_historico_arquivado_so_quando_pedido(self):
+        call_command("arquivar_pagamentos", antes_de="2023-01-01", stdout=io.StringIO())
+        self.client.force_login(User.objects.create_user("secretaria"))
+        url = reverse("pagamentos_list", args=[self.aluno.id])
+
+        resposta = self.client.get(url)
+        self.assertEqual(len(resposta.context["pagamentos"]), 3)
+        resposta = self.client.get(url, {"arquivados": "1"})
+        self.assertEqual(
+            [p.data_vencimento.year for p in resposta.context["pagamentos"]], [2025, 2021, 2021, 2021, 2020],
+        )
+        self.assertContains(resposta, "Pago (arquivado)", count=2)
+
+
+class ComponentePaginacaoTests(TestCase):
+    def test_janela_sem_percorrer_todas_as_paginas(self):
+        pagina = Paginator(range(10**6), 1).get_page(5000)
+        with mock.patch.object(Paginator, "page_range", new_callable=mock.PropertyMock) as page_range:
+            links = links_paginacao(pagina, {"aluno": "Ana & Bia", "turma": None})
+        page_range.assert_not_called()
+        self.assertEqual([p["numero"] for p in links["paginas"]], [4999, 5000, 5001])
+        self.assertEqual(links["ultima"], "?page=1000000&aluno=Ana+%26+Bia")
+        self.assertEqual(list(janela_paginas(1, 2, vizinhas=3)), [1, 2])
+
+    def test_filtros_escapados_nos_links_da_lista(self):
+        turma = Turma.objects.create(nome="Sub 11")
+        aluno = Aluno.objects.create(nome_completo="Ana Bia&Cia", data_nascimento=date(2015, 1, 1), turma=turma)
+        for mes in range(1, 13):
+            Pagamento.objects.create(aluno=aluno, data_vencimento=date(2024, mes, 10), valor=Decimal("40"))
+            Pagamento.objects.create(aluno=aluno, data_vencimento=date(2025, mes, 10), valor=Decimal("40"))
+        self.client.force_login(User.objects.create_user("secretaria"))
+
+        resposta = self.client.get("/pagamentos/", {"aluno": "bia&cia", "status": "atrasado"})
+        proxima = resposta.context["page_obj"].next_cursor
+        self.assertContains(resposta, f'href="?cursor={proxima}&amp;aluno=bia%26cia&amp;status=atrasado"')
+
+    def test_filtros_escapados_nos_cabecalhos_de_ordenacao(self):
+        turma = Turma.objects.create(nome="Sub 11")
+        self.client.force_login(User.objects.create_user("secretaria"))
+        resposta = self.client.get("/", {"q": "bia&cia", "situacao": "devendo", "turma": turma.id, "ordem": "saldo"})
+        self.assertContains(
+            resposta, f'href="?q=bia%26cia&amp;situacao=devendo&amp;turma={turma.id}&amp;ordem=parcelas"',
+        )
+        self.assertContains(resposta, f'href="?q=bia%26cia&amp;situacao=devendo&amp;turma={turma.id}&amp;ordem=nome"')
+
+
+class PlanoFiltroPagamentosTests(TestCase):
+    """Cada combinação de filtros da tela de pagamentos precisa chegar em
+    ``escolinha_pagamento`` por índice, nunca por varredura da tabela."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = Turma.objects.create(nome="Sub 11")
+        aluno = Aluno.objects.create(nome_completo="João", data_nascimento=date(2015, 1, 1), turma=cls.turma)
+        Pagamento.objects.create(aluno=aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"))
+
+    def plano(self, queryset):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                # Com tabelas pequenas o planner sempre prefere seq scan;
+                # desligado, o plano mostra se algum índice atende a consulta.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def test_filtros_usam_indices(self):
+        combinacoes = itertools.product(
+            ["", "jo"], ["", *STATUS_PAGAMENTO], ["", str(self.turma.id)], ["", "2025-03"],
+        )
+        for aluno, status, turma, data in combinacoes:
+            with self.subTest(aluno=aluno, status=status, turma=turma, data=data):
+                filtros = filtros_pagamentos({"aluno": aluno, "status": status, "turma": turma, "data": data})
+                queryset = filtrar_pagamentos(filtros, hoje=date(2025, 3, 15),
+                                              queryset=Pagamento.objects.select_related("aluno"))
+                plano = self.plano(queryset.order_by(*ORDEM_PAGAMENTOS)[:21])
+
+                if connection.vendor == "postgresql":
+                    self.assertNotIn("Seq Scan on escolinha_pagamento", plano)
+                else:
+                    # Com turma, os alunos da turma por (aluno, vencimento);
+                    # senão, a ordem da tela direto de (vencimento, aluno, id)
+                    indice = "pagamento_aluno_venc_idx" if turma else "pagamento_venc_aluno_idx"
+                    # Sem nenhum filtro em coluna do índice, a varredura segue
+                    # a ordem do índice e para no LIMIT
+                    busca = "SEARCH" if turma or data or status in ("pendente", "atrasado") else "SCAN"
+                    linhas = [linha for linha in plano.splitlines() if "escolinha_pagamento" in linha]
+                    self.assertEqual(len(linhas), 1, plano)
+                    self.assertIn(f"{busca} escolinha_pagamento USING INDEX {indice}", linhas[0])
+                if data:
+                    # Intervalo semiaberto na coluna, sem strftime/EXTRACT
+                    self.assertNotIn("strftime", str(queryset.query))
+                    self.assertNotIn("EXTRACT", str(queryset.query))
+
+    def test_abertos_por_vencimento_usam_o_indice_parcial(self):
+        # A janela de vencimentos em aberto da conciliação: só as linhas sem
+        # data_pagamento, por vencimento, sem a ordenação da tela
+        creditos = [conciliacao.Credito("1", date(2025, 3, 12), Decimal("40.00"), "PIX")]
+        with CaptureQueriesContext(connection) as consultas:
+            conciliacao.carregar_indices(creditos)
+        sql = consultas.captured_queries[-1]["sql"]
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+            else:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plano = "\n".join(" ".join(map(str, linha)) for linha in cursor.fetchall())
+        self.assertIn("pagamento_aberto_venc_idx", plano)
+
+
+class ExportacaoPagamentosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("secretaria", password="x")
+        turma = Turma.objects.create(nome="Sub 9")
+        ana = Aluno.objects.create(nome_completo="Ana", data_nascimento=date(2016, 1, 1), turma=turma)
+        bia = Aluno.objects.create(nome_completo="Bia", data_nascimento=date(2016, 1, 1), turma=turma)
+        Pagamento.objects.create(aluno=ana, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"),
+                                 data_pagamento=date(2025, 3, 8))
+        Pagamento.objects.create(aluno=bia, data_vencimento=date(2025, 3, 10), valor=Decimal("45.00"))
+        Pagamento.objects.create(aluno=ana, data_vencimento=date(2025, 4, 10), valor=Decimal("40.00"))
+
+    def setUp(self):
+        django_cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_linhas_sao_tuplas_na_ordem_da_listagem(self):
+        linhas = list(linhas_pagamentos(filtros_pagamentos({"data": "2025-03"}), hoje=date(2025, 3, 20)))
+        self.assertEqual(linhas, [
+            ("Ana", "Sub 9", date(2025, 3, 10), date(2025, 3, 8), "PIX", Decimal("40.00"), "Pago"),
+            ("Bia", "Sub 9", date(2025, 3, 10), "", "PIX", Decimal("45.00"), "Atrasado"),
+        ])
+
+    def test_csv_em_streaming_com_os_filtros(self):
+        resposta = self.client.get("/pagamentos/exportar/", {"aluno": "ana"}, secure=True)
+        self.assertTrue(resposta.streaming)
+        conteudo = b"".join(resposta.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(conteudo[0], "Aluno,Turma,Vencimento,Pagamento,Forma,Valor,Status")
+        self.assertEqual([linha.split(",")[2] for linha in conteudo[1:]], ["2025-04-10", "2025-03-10"])
+
+    def test_exportacao_grande_vira_tarefa(self):
+        with self.settings(EXPORTACAO_LIMITE_STREAMING=0), \
+                mock.patch("escolinha.views.exportar_pagamentos.delay") as delay:
+            delay.return_value.id = "0f5a6f1e-8d3c-4c1b-9a51-0d7d3b1c2e4f"
+            resposta = self.client.get("/pagamentos/exportar/", {"status": "pago"}, secure=True)
+        delay.assert_called_once_with({"aluno": "", "status": "pago", "turma": "", "data": ""}, "csv")
+        self.assertRedirects(resposta, "/exportacoes/0f5a6f1e-8d3c-4c1b-9a51-0d7d3b1c2e4f/",
+                             fetch_redirect_response=False)
+
+    def test_tarefa_grava_arquivo_para_download(self):
+        tarefa_id = "3b8e1c2d-5f6a-4b7c-8d9e-0a1b2c3d4e5f"
+        with tempfile.TemporaryDirectory() as pasta, self.settings(MEDIA_ROOT=pasta):
+            resultado = exportar_pagamentos.apply(args=[{"data": "2025-03"}, "xlsx"], task_id=tarefa_id).get()
+            self.assertEqual(resultado["arquivo"], f"exportacoes/{tarefa_id}.xlsx")
+
+            planilha = openpyxl.load_workbook(f"{pasta}/{resultado['arquivo']}", read_only=True)
+            linhas = list(planilha.active.values)
+            planilha.close()
+            self.assertEqual(linhas[0][0], "Aluno")
+            self.assertEqual(len(linhas), 3)
+
+            resposta = self.client.get(f"/exportacoes/{tarefa_id}/download/", secure=True)
+            self.assertEqual(resposta.status_code, 200)
+            resposta.close()
+
+    def test_arquivo_so_fica_pronto_com_o_marcador_e_usa_o_nome_salvo(self):
+        tarefa_id = "7c1d2e3f-4a5b-4c6d-8e9f-0a1b2c3d4e5f"
+        with tempfile.TemporaryDirectory() as pasta, self.settings(MEDIA_ROOT=pasta):
+            # Um arquivo com o mesmo nome (sobra de outra execução, ou ainda
+            # sendo gravado) não conta como exportação pronta
+            default_storage.save(f"exportacoes/{tarefa_id}.csv", ContentFile(b"parcial"))
+            self.assertIsNone(arquivo_pronto(tarefa_id))
+
+            resultado = exportar_pagamentos.apply(args=[{"data": "2025-03"}, "csv"], task_id=tarefa_id).get()
+            self.assertNotEqual(resultado["arquivo"], f"exportacoes/{tarefa_id}.csv")  # renomeado pelo storage
+            self.assertEqual(arquivo_pronto(tarefa_id), (resultado["arquivo"], "csv"))
+            resposta = self.client.get(f"/exportacoes/{tarefa_id}/download/", secure=True)
+            self.assertIn(b"Ana", b"".join(resposta.streaming_content))
+            resposta.close()
+
+    def test_celulas_com_cara_de_formula_saem_escapadas(self):
+        Aluno.objects.filter(nome_completo="Bia").update(nome_completo='=HYPERLINK("http://x")')
+        filtros = filtros_pagamentos({"data": "2025-03"})
+        conteudo = "".join(csv_em_partes(linhas_pagamentos(filtros, hoje=date(2025, 3, 20))))
+        self.assertIn("\"'=HYPERLINK(\"\"http://x\"\")\"", conteudo)
+
+        arquivo = io.BytesIO()
+        gravar_xlsx(linhas_pagamentos(filtros, hoje=date(2025, 3, 20)), arquivo)
+        planilha = openpyxl.load_workbook(arquivo)
+        nomes = [linha[0].value for linha in planilha.active.iter_rows(min_row=2)]
+        self.assertIn("'=HYPERLINK(\"http://x\")", nomes)
+        self.assertTrue(all(linha[0].data_type == "s" for linha in planilha.active.iter_rows(min_row=2)))
+
+
+class FalhaTemporariaBackend(whatsapp.BaseBackend):
+    def enviar(self, contato, texto):
+        if contato == "51900000002":
+            raise whatsapp.ErroEnvio("timeout")
+        return whatsapp.MemoriaBackend().enviar(contato, texto)
+
+
+@override_settings(WHATSAPP_BACKEND="escolinha.whatsapp.MemoriaBackend")
+class CampanhaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        turma = Turma.objects.create(nome="Sub 13")
+        irmaos = [
+            Aluno.objects.create(nome_completo=nome, data_nascimento=date(2013, 1, 1), turma=turma,
+                                 contato_responsavel="(51) 90000-0001")
+            for nome in ("Caio", "Davi")
+        ]
+        outro = Aluno.objects.create(nome_completo="Eva", data_nascimento=date(2013, 1, 1), turma=turma,
+                                     contato_responsavel="51900000002")
+        sem_contato = Aluno.objects.create(nome_completo="Fábio", data_nascimento=date(2013, 1, 1), turma=turma)
+        for aluno in [*irmaos, outro, sem_contato]:
+            Pagamento.objects.create(aluno=aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"))
+        # Pago não entra na campanha
+        Pagamento.objects.create(aluno=outro, data_vencimento=date(2025, 2, 10), valor=Decimal("40.00"),
+                                 data_pagamento=date(2025, 2, 10))
+
+    def setUp(self):
+        whatsapp.caixa_saida.clear()
+
+    def test_uma_mensagem_por_contato_dos_pagamentos_em_aberto(self):
+        campanha = criar_campanha("cobranca", {"status": "atrasado"}, hoje=date(2025, 3, 20))
+        self.assertEqual(
+            sorted(campanha.mensagens.values_list("contato", flat=True)), ["51900000001", "51900000002"]
+        )
+        irmaos = campanha.mensagens.get(contato="51900000001").texto
+        self.assertIn("mensalidade de Caio e Davi da escolinha", irmaos)
+        self.assertIn("R$ 80,00", irmaos)
+
+    def test_envio_repete_falhas_temporarias_e_conclui(self):
+        campanha = criar_campanha("aviso", {}, hoje=date(2025, 3, 1))
+        celery_app.conf.task_always_eager = True
+        try:
+            with override_settings(WHATSAPP_BACKEND="escolinha.tests.FalhaTemporariaBackend"), \
+                    self.assertLogs("escolinha.tasks", "WARNING") as logs:
+                disparar_campanha.delay(campanha.id)
+        finally:
+            celery_app.conf.task_always_eager = False
+        self.assertEqual(len(logs.records), 3)
+
+        campanha.refresh_from_db()
+        self.assertEqual(campanha.status, Campanha.CONCLUIDA)
+        self.assertEqual(resumo(campanha), {"pendente": 0, "enviando": 0, "enviada": 1, "falha": 1})
+        falha = campanha.mensagens.get(status=MensagemCampanha.FALHA)
+        self.assertEqual((falha.contato, falha.tentativas, falha.erro), ("51900000002", 4, "timeout"))
+        self.assertEqual([m["contato"] for m in whatsapp.caixa_saida], ["51900000001"])
+
+    def test_lote_nao_reenvia_mensagem_ja_enviada(self):
+        campanha = criar_campanha("aviso", {}, hoje=date(2025, 3, 1))
+        ids = list(campanha.mensagens.values_list("id", flat=True))
+        enviar_lote(ids)
+        enviar_lote(ids)
+        self.assertEqual(len(whatsapp.caixa_saida), 2)
+
+    def test_reserva_abandonada_vira_falha_e_a_campanha_conclui(self):
+        campanha = criar_campanha("aviso", {}, hoje=date(2025, 3, 1))
+        Campanha.objects.filter(pk=campanha.pk).update(status=Campanha.ENVIANDO)
+        primeira, segunda = campanha.mensagens.order_by("id")
+        enviar_lote([segunda.pk])
+        # O worker morreu depois de reservar a primeira
+        agora = timezone.now()
+        MensagemCampanha.objects.filter(pk=primeira.pk).update(
+            status=MensagemCampanha.ENVIANDO, reservada_em=agora - timedelta(minutes=5),
+        )
+        with self.settings(WHATSAPP_RESERVA_EXPIRA_SEGUNDOS=600):
+            verificar_campanhas()
+            campanha.refresh_from_db()
+            self.assertEqual(campanha.status, Campanha.ENVIANDO)  # reserva ainda recente
+
+            MensagemCampanha.objects.filter(pk=primeira.pk).update(reservada_em=agora - timedelta(minutes=11))
+            self.assertEqual(verificar_campanhas(), {"campanhas": 1})
+        campanha.refresh_from_db()
+        self.assertEqual(campanha.status, Campanha.CONCLUIDA)
+        self.assertEqual(resumo(campanha), {"pendente": 0, "enviando": 0, "enviada": 1, "falha": 1})
+        self.assertEqual(len(whatsapp.caixa_saida), 1)  # não reenvia
+
+
+class ModeloMensagemTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        turma = Turma.objects.create(nome="Sub 15")
+        cls.aluno = Aluno.objects.create(nome_completo="Gil", data_nascimento=date(2011, 1, 1), turma=turma,
+                                         nome_responsavel="Helena", contato_responsavel="51900000003")
+        cls.pagamento = Pagamento.objects.create(aluno=cls.aluno, data_vencimento=date(2025, 3, 10),
+                                                 valor=Decimal("1234.50"))
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_mensagem_personalizada_por_pagamento(self):
+        pagamento = Pagamento.objects.select_related("aluno").get()
+        mensagens.links_whatsapp([pagamento], hoje=date(2025, 3, 20))
+        texto = urllib.parse.unquote(pagamento.mensagem_whatsapp)
+        self.assertTrue(texto.startswith("Olá, Helena!"))
+        self.assertIn("mensalidade de Gil da escolinha de futsal, no valor de R$ 1.234,50 e com vencimento "
+                      "em 10/03/2025", texto)
+
+    def test_modelo_compilado_uma_vez_e_invalidado_ao_editar(self):
+        with mock.patch("escolinha.mensagens.compilar", wraps=mensagens.compilar) as compilar:
+            mensagens.modelos()
+            mensagens.modelos()
+            self.assertEqual(compilar.call_count, 2)  # cobrança e aviso, só na primeira leitura
+
+            with self.captureOnCommitCallbacks(execute=True):
+                modelo = ModeloMensagem.objects.get(tipo="aviso")
+                modelo.texto = "Oi {responsavel}, {aluno} vence em {vencimento}."
+                modelo.save()
+            self.assertEqual(
+                mensagens.renderizar(mensagens.modelos()["aviso"], mensagens.valores("Gil", "Helena", 40, date(2025, 3, 10))),
+                "Oi Helena, Gil vence em 10/03/2025.",
+            )
+            self.assertEqual(compilar.call_count, 4)
+
+    def test_campo_desconhecido_invalida_o_modelo(self):
+        with self.assertRaises(ValidationError):
+            ModeloMensagem(tipo="aviso", texto="Olá {nome}").full_clean(validate_unique=False)
+
+    def test_benchmark_10k_mensagens(self):
+        pagamentos = [
+            Pagamento(aluno=self.aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00"))
+            for _ in range(10_000)
+        ]
+        mensagens.links_whatsapp(pagamentos[:1], hoje=date(2025, 3, 1))  # aquece o cache dos modelos
+        with self.assertNumQueries(0):
+            inicio = time.perf_counter()
+            mensagens.links_whatsapp(pagamentos, hoje=date(2025, 3, 1))
+            duracao = time.perf_counter() - inicio
+        self.assertTrue(all(p.mensagem_whatsapp for p in pagamentos))
+        self.assertLess(duracao, 2.0, f"10k mensagens em {duracao:.3f}s")
+
+
+class SaldosAlunosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        turma = Turma.objects.create(nome="Sub 17")
+        cls.alunos = {}
+        # nome: [(vencimento, pago em, valor)]
+        dados = {
+            "Ana": [(date(2025, 1, 10), None, "40.00"), (date(2025, 2, 10), None, "40.00")],
+            "Bia": [(date(2025, 1, 10), date(2025, 1, 9), "40.00"), (date(2025, 4, 10), None, "50.00")],
+            "Caio": [(date(2025, 2, 10), None, "90.00")],
+            "Davi": [],
+        }
+        for nome, pagamentos in dados.items():
+            aluno = Aluno.objects.create(nome_completo=nome, data_nascimento=date(2014, 1, 1), turma=turma)
+            for vencimento, pago_em, valor in pagamentos:
+                Pagamento.objects.create(aluno=aluno, data_vencimento=vencimento, data_pagamento=pago_em,
+                                         valor=Decimal(valor))
+            cls.alunos[nome] = aluno
+
+    def lista(self, ordem, situacao="", por_pagina=2):
+        alunos = saldos.filtrar_situacao(saldos.anotar_saldos(Aluno.objects.all(), hoje=date(2025, 3, 15)), situacao)
+        paginator = CursorPaginator(alunos, por_pagina, ordering=saldos.ORDENS[ordem])
+        pagina = paginator.get_page()
+        itens = list(pagina)
+        while pagina.has_next():
+            pagina = paginator.get_page(pagina.next_cursor)
+            itens += list(pagina)
+        return itens
+
+    def test_colunas_anotadas(self):
+        with self.assertNumQueries(1):
+            alunos = {a.nome_completo: a for a in saldos.anotar_saldos(Aluno.objects.all(), hoje=date(2025, 3, 15))}
+        bia = alunos["Bia"]
+        self.assertEqual((bia.saldo, bia.atrasado, bia.parcelas_atrasadas, bia.ultimo_pagamento),
+                         (Decimal("50.00"), 0, 0, date(2025, 1, 9)))
+        ana = alunos["Ana"]
+        self.assertEqual((ana.saldo, ana.atrasado, ana.parcelas_atrasadas, ana.ultimo_pagamento),
+                         (Decimal("80.00"), Decimal("80.00"), 2, None))
+
+    def test_ordenacao_paginada_por_cursor(self):
+        self.assertEqual([a.nome_completo for a in self.lista("saldo")], ["Caio", "Ana", "Bia", "Davi"])
+        self.assertEqual([a.nome_completo for a in self.lista("parcelas")], ["Ana", "Caio", "Bia", "Davi"])
+        self.assertEqual([a.nome_completo for a in self.lista("ultimo_pagamento")], ["Ana", "Caio", "Davi", "Bia"])
+
+    def test_ultimo_pagamento_inclui_o_arquivo(self):
+        # O único pagamento quitado da Bia vai para o arquivo
+        self.assertEqual(arquivamento.arquivar(limite=date(2025, 2, 1)).pagamentos, 1)
+        self.assertFalse(self.alunos["Bia"].pagamentos.filter(data_pagamento__isnull=False).exists())
+
+        alunos = {a.nome_completo: a for a in saldos.anotar_saldos(Aluno.objects.all(), hoje=date(2025, 3, 15))}
+        self.assertEqual(alunos["Bia"].ultimo_pagamento, date(2025, 1, 9))
+        self.assertEqual([a.nome_completo for a in self.lista("ultimo_pagamento")], ["Ana", "Caio", "Davi", "Bia"])
+
+    def test_filtro_por_situacao(self):
+        self.assertEqual([a.nome_completo for a in self.lista("atrasado", "atrasado")], ["Caio", "Ana"])
+        self.assertEqual([a.nome_completo for a in self.lista("nome", "em_dia")], ["Bia", "Davi"])
+
+
+class ResumoTurmasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = Turma.objects.create(nome="Sub 7")
+        Turma.objects.create(nome="Inativa", status=False)
+        vazia = Turma.objects.create(nome="Sub 5")
+        ana = Aluno.objects.create(nome_completo="Ana", data_nascimento=date(2018, 1, 1), turma=cls.turma)
+        bia = Aluno.objects.create(nome_completo="Bia", data_nascimento=date(2018, 1, 1), turma=cls.turma)
+        Aluno.objects.create(nome_completo="Caio", data_nascimento=date(2018, 1, 1), turma=vazia, is_active=False)
+        # Ana: dois meses atrasados e o mês corrente em aberto
+        for mes in (1, 2, 3):
+            Pagamento.objects.create(aluno=ana, data_vencimento=date(2025, mes, 10), valor=Decimal("40.00"))
+        Pagamento.objects.create(aluno=bia, data_vencimento=date(2025, 3, 10), valor=Decimal("50.00"),
+                                 data_pagamento=date(2025, 3, 5))
+        # Fora do mês e já pago: não entra em nada
+        Pagamento.objects.create(aluno=bia, data_vencimento=date(2025, 2, 10), valor=Decimal("50.00"),
+                                 data_pagamento=date(2025, 2, 5))
+
+    def test_numeros_por_turma_em_uma_query(self):
+        with self.assertNumQueries(1):
+            resumo = resumo_turmas(2025, 3, hoje=date(2025, 3, 1))
+        self.assertEqual([t["nome"] for t in resumo], ["Sub 5", "Sub 7"])
+        sub7 = resumo[1]
+        self.assertEqual(sub7["alunos_ativos"], 2)
+        self.assertEqual(sub7["esperado"], Decimal("90.00"))
+        self.assertEqual(sub7["recebido"], Decimal("50.00"))
+        self.assertEqual((sub7["parcelas_atrasadas"], sub7["alunos_atrasados"]), (2, 1))
+        self.assertEqual(resumo[0]["alunos_ativos"], 0)
+
+    def test_filtro_de_turma_compartilhado(self):
+        self.assertEqual(turma_selecionada({"turma": f" {self.turma.id} "}), str(self.turma.id))
+        self.assertEqual(turma_selecionada({"turma": "1 OR 1=1"}), "")
+        self.assertEqual(filtros_pagamentos({"turma": "x"})["turma"], "")
+
+
+class ReferenciaTurmasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ativa = Turma.objects.create(nome="Sub 9")
+        cls.inativa = Turma.objects.create(nome="Antiga", status=False)
+        cls.aluno = Aluno.objects.create(nome_completo="Ana", data_nascimento=date(2016, 1, 1), turma=cls.inativa)
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_selects_e_formulario_sem_consultar_o_banco(self):
+        referencia.turmas()
+        with self.assertNumQueries(0):
+            self.assertEqual(turmas_ativas(), [{"id": self.ativa.id, "nome": "Sub 9"}])
+            AlunoForm().as_p()
+            edicao = AlunoForm(instance=self.aluno)
+            edicao.as_p()
+        self.assertEqual(list(edicao.fields["turma"].choices), [(self.inativa.id, "Antiga"), (self.ativa.id, "Sub 9")])
+
+    def test_salvar_turma_troca_a_versao(self):
+        referencia.turmas()
+        self.ativa.nome = "Sub 10"
+        self.ativa.save()
+        self.assertEqual(turmas_ativas(), [{"id": self.ativa.id, "nome": "Sub 10"}])
+        # Outro processo (cache local vazio) lê a lista do cache compartilhado
+        referencia._local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(turmas_ativas()[0]["nome"], "Sub 10")
+
+    def test_validacao_aceita_so_turmas_ativas_ou_a_atual(self):
+        dados = {"nome_completo": "Bia", "data_nascimento": "2016-01-01", "mensalidade": "40", "is_active": "on"}
+        self.assertTrue(AlunoForm({**dados, "turma": self.ativa.id}).is_valid())
+        self.assertFalse(AlunoForm({**dados, "turma": self.inativa.id}).is_valid())
+        self.assertTrue(AlunoForm({**dados, "turma": self.inativa.id}, instance=self.aluno).is_valid())
+
+
+class ImportacaoCsvTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = Turma.objects.create(nome="Sub 9 Manhã")
+        Aluno.objects.create(nome_completo="Já Existe", data_nascimento=date(2015, 5, 5), turma=cls.turma)
+
+    def test_alunos_em_lotes_com_relatorio_por_linha(self):
+        arquivo = io.StringIO(
+            "Nome completo;Data nascimento;Turma;Nome responsavel;Contato responsavel;Mensalidade;Is active\n"
+            "João Silva;01/02/2015;sub 9 manha;Maria;(51) 99999-0001;45,00;sim\n"
+            "Sem Data;;Sub 9 Manhã;;;;\n"
+            "Turma Errada;01/02/2015;Sub 99;;;;\n"
+            "Já Existe;05/05/2015;Sub 9 Manhã;;;;\n"
+            "Ana Lima;2016-03-04;Sub 9 Manhã;;;;0\n"
+        )
+        resultado = importar_alunos(arquivo, batch_size=2)
+
+        self.assertEqual((resultado.linhas, resultado.criados, resultado.com_erro), (5, 2, 3))
+        self.assertEqual([(e["linha"], sorted(e["erros"])) for e in resultado.erros], [
+            (3, ["data_nascimento"]), (4, ["turma"]), (5, ["nome_completo"]),
+        ])
+        joao = Aluno.objects.get(nome_completo="João Silva")
+        self.assertEqual((joao.contato_responsavel, joao.mensalidade, joao.nome_busca, joao.turma_id),
+                         ("51999990001", Decimal("45.00"), "joao silva", self.turma.id))
+        self.assertFalse(Aluno.objects.get(nome_completo="Ana Lima").is_active)
+
+    def test_pagamentos_atualizam_rollup_e_nao_duplicam(self):
+        conteudo = (
+            "aluno,data_vencimento,data_pagamento,forma_pagamento,valor\n"
+            "ja existe,10/01/2025,08/01/2025,pix,40.00\n"
+            "Já Existe,10/02/2025,,,40.00\n"
+            "Ninguém,10/02/2025,,,40.00\n"
+            "Já Existe,10/03/2025,,CHEQUE,40.00\n"
+        )
+        resultado = importar_pagamentos(io.StringIO(conteudo))
+        self.assertEqual((resultado.criados, resultado.com_erro), (2, 2))
+        self.assertEqual([sorted(e["erros"]) for e in resultado.erros], [["aluno"], ["forma_pagamento"]])
+        self.assertEqual(rollup.verificar(), {})
+
+        repetido = importar_pagamentos(io.StringIO(conteudo))
+        self.assertEqual((repetido.criados, repetido.com_erro), (0, 4))
+        self.assertEqual(Pagamento.objects.count(), 2)
+
+
+class ConciliacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = Turma.objects.create(nome="Sub 13")
+
+    def criar(self, nome, responsavel, contato="", vencimento=date(2025, 3, 10), valor="40.00"):
+        aluno = Aluno.objects.create(
+            nome_completo=nome, data_nascimento=date(2013, 1, 1), turma=self.turma,
+            nome_responsavel=responsavel, contato_responsavel=contato,
+        )
+        return Pagamento.objects.create(aluno=aluno, data_vencimento=vencimento, valor=Decimal(valor))
+
+    def test_baixa_os_seguros_e_manda_ambiguos_para_revisao(self):
+        maria = self.criar("Pedro Souza", "Maria Souza")
+        telefone = self.criar("Lucas Lima", "Ana Lima", contato="51988887777")
+        irmao_a = self.criar("Caio Rocha", "Beatriz Rocha")
+        irmao_b = self.criar("Davi Rocha", "Beatriz Rocha")
+        extrato = (
+            "Data;Valor;Descrição\n"
+            "08/03/2025;40,00;PIX RECEBIDO MARIA SOUZA\n"
+            "09/03/2025;40,00;PIX 51 98888-7777\n"
+            "11/03/2025;40,00;PIX BEATRIZ ROCHA\n"
+            "11/03/2025;-15,00;TARIFA\n"
+            "12/03/2025;99,00;PIX FULANO\n"
+        )
+        registro = conciliacao.conciliar("extrato.csv", extrato.encode())
+        status = dict(registro.lancamentos.values_list("descricao", "status"))
+        self.assertEqual(status, {
+            "PIX RECEBIDO MARIA SOUZA": LancamentoExtrato.CONCILIADO,
+            "PIX 51 98888-7777": LancamentoExtrato.CONCILIADO,
+            "PIX BEATRIZ ROCHA": LancamentoExtrato.REVISAO,
+            "PIX FULANO": LancamentoExtrato.SEM_CORRESPONDENCIA,
+        })
+        maria.refresh_from_db()
+        telefone.refresh_from_db()
+        self.assertEqual((maria.data_pagamento, maria.forma_pagamento), (date(2025, 3, 8), "PIX"))
+        self.assertEqual(telefone.data_pagamento, date(2025, 3, 9))
+        self.assertEqual(rollup.verificar(), {})
+
+        revisao = registro.lancamentos.get(status=LancamentoExtrato.REVISAO)
+        self.assertEqual(sorted(revisao.candidatos), sorted([irmao_a.pk, irmao_b.pk]))
+        self.assertTrue(conciliacao.confirmar(revisao, irmao_b.pk))
+        self.assertIsNotNone(Pagamento.objects.get(pk=irmao_b.pk).data_pagamento)
+        self.assertEqual(rollup.verificar(), {})
+
+        # Reenviar o mesmo extrato não baixa nada de novo
+        de_novo = conciliacao.conciliar("extrato.csv", extrato.encode())
+        self.assertEqual(de_novo.lancamentos.filter(status=LancamentoExtrato.IGNORADO).count(), 3)
+        self.assertIsNone(Pagamento.objects.get(pk=irmao_a.pk).data_pagamento)
+
+    def test_ofx(self):
+        pagamento = self.criar("Pedro Souza", "Maria Souza")
+        extrato = (
+            "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+            "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250307120000<TRNAMT>40.00<FITID>abc1<MEMO>Pix Maria Souza\n"
+            "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250307<TRNAMT>-40.00<FITID>abc2<MEMO>Pix enviado\n"
+            "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>"
+        )
+        registro = conciliacao.conciliar("extrato.ofx", extrato.encode())
+        lancamento = registro.lancamentos.get()
+        self.assertEqual((lancamento.identificador, lancamento.pagamento_id), ("abc1", pagamento.pk))
+
+    def test_queries_nao_crescem_com_o_extrato(self):
+        alunos = Aluno.objects.bulk_create([
+            Aluno(nome_completo=f"Aluno {i}", nome_busca=f"aluno {i}", data_nascimento=date(2013, 1, 1),
+                  turma=self.turma, nome_responsavel=f"Responsavel Numero{i}")
+            for i in range(600)
+        ])
+        pagamentos = Pagamento.objects.bulk_create([
+            Pagamento(aluno=aluno, data_vencimento=date(2025, 3, 10), valor=Decimal("40.00")) for aluno in alunos
+        ])
+        rollup.reconstruir()
+
+        def extrato(quantidade):
+            return ("data,valor,descricao\n" + "".join(
+                f"2025-03-09,40.00,PIX RESPONSAVEL NUMERO{i}\n" for i in range(quantidade)
+            )).encode()
+
+        with CaptureQueriesContext(connection) as pequeno:
+            conciliacao.conciliar("a.csv", extrato(20))
+        with CaptureQueriesContext(connection) as grande:
+            conciliacao.conciliar("b.csv", extrato(600))
+        # Só os lotes de UPDATE/INSERT crescem (limite de parâmetros do SQLite), não uma query por crédito
+        self.assertLess(len(grande), len(pequeno) + 10)
+        self.assertEqual(Pagamento.objects.filter(data_pagamento__isnull=False).count(), len(pagamentos))
+        self.assertEqual(rollup.verificar(), {})
+
+    def test_tela_de_revisao(self):
+        self.criar("Caio Rocha", "Beatriz Rocha")
+        self.criar("Davi Rocha", "Beatriz Rocha")
+        self.client.force_login(User.objects.create_user("secretaria"))
+        resposta = self.client.post("/conciliacoes/", {
+            "arquivo": io.BytesIO(b"data,valor,descricao\n2025-03-09,40.00,PIX BEATRIZ ROCHA\n"),
+        })
+        self.assertEqual(resposta.status_code, 302)
+        lancamento = LancamentoExtrato.objects.get()
+        self.assertContains(self.client.get(resposta.url), "Davi Rocha")
+        self.client.post(f"/lancamentos/{lancamento.pk}/revisar/", {"acao": "ignorar"})
+        lancamento.refresh_from_db()
+        self.assertEqual(lancamento.status, LancamentoExtrato.IGNORADO)
+
+
+class AcoesPagamentosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        turma = Turma.objects.create(nome="Sub 15")
+        cls.alunos = [
+            Aluno.objects.create(nome_completo=nome, data_nascimento=date(2011, 1, 1), turma=turma)
+            for nome in ("Ana Prado", "Bruno Prado", "Carla Dias")
+        ]
+        for aluno in cls.alunos:
+            for mes in (1, 2):
+                Pagamento.objects.create(aluno=aluno, data_vencimento=date(2025, mes, 10), valor=Decimal("40.00"))
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("secretaria"))
+
+    def test_marcar_pagos_selecionados_em_uma_query(self):
+        ids = list(Pagamento.objects.filter(data_vencimento__month=1).values_list("id", flat=True)[:2])
+        with CaptureQueriesContext(connection) as queries:
+            quantidade = acoes.marcar_pagos(acoes.selecionar({}, ids), date(2025, 1, 8), "DINHEIRO")
+        self.assertEqual(quantidade, 2)
+        self.assertEqual(sum(q["sql"].startswith("UPDATE \"escolinha_pagamento\"") for q in queries.captured_queries), 1)
+        self.assertEqual(
+            set(Pagamento.objects.filter(pk__in=ids).values_list("data_pagamento", "forma_pagamento")),
+            {(date(2025, 1, 8), "DINHEIRO")},
+        )
+        self.assertEqual(rollup.verificar(), {})
+
+    def test_todo_o_filtro_pela_tela(self):
+        resposta = self.client.post("/pagamentos/acao/", {
+            "acao": acoes.VENCIMENTO, "todos": "on", "data_acao": "2025-03-15", "aluno": "prado", "data": "2025-02",
+        })
+        self.assertRedirects(resposta, "/pagamentos/?aluno=prado&data=2025-02", fetch_redirect_response=False)
+        self.assertEqual(Pagamento.objects.filter(data_vencimento=date(2025, 3, 15)).count(), 2)
+        self.assertEqual(rollup.verificar(), {})
+
+        self.client.post("/pagamentos/acao/", {"acao": acoes.EXCLUIR, "todos": "on", "aluno": "carla"})
+        self.assertEqual(Pagamento.objects.count(), 4)
+        self.assertEqual(rollup.verificar(), {})
+
+    def test_sem_selecao_nao_faz_nada(self):
+        resposta = self.client.post("/pagamentos/acao/", {"acao": acoes.EXCLUIR}, follow=True)
+        self.assertContains(resposta, "Selecione ao menos um pagamento.")
+        self.assertEqual(Pagamento.objects.count(), 6)
+
+
+class OrcamentoConsultasMixin:
+    """``assertOrcamento(url, limite)``: GET em ``url`` com no máximo
+    ``limite`` consultas, contadas pelo ``MedicaoConsultasMiddleware``. Em
+    streaming não há cabeçalho: conta o que roda até o corpo terminar."""
+
+    def assertOrcamento(self, url, limite):
+        with CaptureQueriesContext(connection) as capturadas:
+            resposta = self.client.get(url)
+            if resposta.streaming:
+                b"".join(resposta.streaming_content)
+        self.assertLess(resposta.status_code, 500, url)
+        consultas = len(capturadas) if resposta.streaming else int(resposta["X-Query-Count"])
+        self.assertLessEqual(consultas, limite, f"{url}: {consultas} consultas (orçamento {limite})")
+        return resposta
+
+
+# Concorrência desligada: as threads extras não enxergam a transação do TestCase
+@override_settings(DASHBOARD_CONCORRENCIA=1)
+class OrcamentoConsultasTests(OrcamentoConsultasMixin, TestCase):
+    # Nome da rota -> consultas permitidas (inclui as 2 de sessão/usuário).
+    # Toda rota nova de escolinha/urls.py precisa entrar aqui.
+    ORCAMENTOS = {
+        "alunos_list": 5,
+        "dashboard": 4,
+        "dashboard_cache_stats": 2,
+        "metricas_indicadores": 6,
+        "metricas_faturamento": 4,
+        "metricas_formas": 4,
+        "metricas_dashboard": 8,
+        "aluno_create": 4,
+        "aluno_update": 5,
+        "pagamentos_list": 5,
+        "pagamento_create": 3,
+        "pagamento_update": 3,
+        "pagamento_delete": 3,
+        "pagamentos_filter": 5,
+        "pagamentos_acao": 2,
+        "pagamentos_exportar": 4,
+        "exportacao_status": 2,
+        "exportacao_download": 2,
+        "importacao_create": 2,
+        "importacao_status": 2,
+        "conciliacao_create": 2,
+        "conciliacao_detail": 5,
+        "lancamento_revisar": 2,
+        "campanha_create": 2,
+        "campanha_detail": 5,
+        "turmas_list": 4,
+        "turma_create": 2,
+        "turma_update": 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        # Volume suficiente para um N+1 estourar qualquer orçamento
+        cls.turma = Turma.objects.create(nome="Sub 17")
+        alunos = Aluno.objects.bulk_create([
+            Aluno(nome_completo=f"Aluno {i:02d}", nome_busca=f"aluno {i:02d}", data_nascimento=date(2010, 1, 1),
+                  turma=cls.turma, nome_responsavel=f"Responsável {i}", contato_responsavel=f"5199999{i:04d}")
+            for i in range(25)
+        ])
+        Pagamento.objects.bulk_create([
+            Pagamento(aluno=aluno, data_vencimento=date(2025, mes, 10), valor=Decimal("40.00"),
+                      data_pagamento=date(2025, mes, 5) if mes % 2 else None)
+            for aluno in alunos for mes in range(1, 4)
+        ])
+        rollup.reconstruir()
+        cls.aluno = alunos[0]
+        cls.pagamento = cls.aluno.pagamentos.first()
+        cls.campanha = criar_campanha("cobranca", {})
+        cls.conciliacao = conciliacao.conciliar("extrato.csv", b"data,valor,descricao\n2025-02-11,40.00,PIX\n")
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("secretaria"))
+
+    def argumentos(self, nome):
+        tarefa = uuid.uuid4()
+        return {
+            "aluno_update": {"pk": self.aluno.pk},
+            "pagamentos_list": {"aluno_id": self.aluno.pk},
+            "pagamento_create": {"aluno_id": self.aluno.pk},
+            "pagamento_update": {"pk": self.pagamento.pk},
+            "pagamento_delete": {"pk": self.pagamento.pk},
+            "exportacao_status": {"tarefa": tarefa},
+            "exportacao_download": {"tarefa": tarefa},
+            "importacao_status": {"tarefa": tarefa},
+            "conciliacao_detail": {"pk": self.conciliacao.pk},
+            "lancamento_revisar": {"pk": self.conciliacao.lancamentos.first().pk},
+            "campanha_detail": {"pk": self.campanha.pk},
+            "turma_update": {"pk": self.turma.pk},
+        }.get(nome, {})
+
+    def test_toda_rota_tem_orcamento(self):
+        self.assertEqual({p.name for p in urlpatterns}, set(self.ORCAMENTOS))
+
+    @mock.patch("celery.result.AsyncResult.state", new_callable=mock.PropertyMock, return_value="PENDING")
+    def test_orcamento_por_rota(self, _estado):
+        for nome, limite in self.ORCAMENTOS.items():
+            with self.subTest(nome):
+                self.assertOrcamento(reverse(nome, kwargs=self.argumentos(nome)), limite)
+
+    def test_cabecalhos_e_log_acima_do_limite(self):
+        with self.settings(CONSULTAS_LIMITE=1), self.assertLogs("escolinha.consultas", "WARNING") as log:
+            resposta = self.client.get(reverse("alunos_list"))
+        self.assertIn("db;dur=", resposta["Server-Timing"])
+        self.assertIn(f"{resposta['X-Query-Count']} consultas", log.output[0])
+        self.assertIn("SELECT", log.output[0])
+
+    def test_streaming_mede_ate_o_fim_do_corpo(self):
+        with self.settings(CONSULTAS_LIMITE=0), self.assertLogs("escolinha.consultas", "WARNING") as log:
+            resposta = self.client.get(reverse("pagamentos_exportar"), secure=True)
+            self.assertTrue(resposta.streaming)
+            self.assertNotIn("X-Query-Count", resposta)
+            self.assertNotIn("Server-Timing", resposta)
+            with CaptureQueriesContext(connection) as corpo:
+                b"".join(resposta.streaming_content)
+        self.assertGreater(len(corpo), 0)
+        self.assertEqual(len(log.output), 1)
+        medidas = int(re.search(r"(\d+) consultas", log.output[0]).group(1))
+        self.assertGreaterEqual(medidas, len(corpo))
+        self.assertIn("SELECT", log.output[0])
+
+    def test_middlewares_assincronos_no_asgi(self):
+        async def view(request):
+            return HttpResponse()
+
+        for classe in (MedicaoConsultasMiddleware, FixarPrimarioMiddleware):
+            self.assertTrue(iscoroutinefunction(classe(view)))
+        with self.settings(DATABASE_REPLICA="replica"):
+            resposta = async_to_sync(FixarPrimarioMiddleware(view))(RequestFactory().post("/"))
+        self.assertIn(COOKIE_PRIMARIO, resposta.cookies)
+
+        async_client = AsyncClient()
+        async_to_sync(async_client.aforce_login)(User.objects.get(username="secretaria"))
+        resposta = async_to_sync(async_client.get)(reverse("metricas_dashboard"))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertGreater(int(resposta["X-Query-Count"]), 0)
+        self.assertIn("db;dur=", resposta["Server-Timing"])
+
+
+@override_settings(DASHBOARD_CONCORRENCIA=1)
+class DadosSinteticosTests(TestCase):
+    def test_gera_volumes_pedidos_com_rollup_consistente(self):
+        resultado = gerar_dados(turmas=4, alunos=60, anos=1, semente=7, batch_size=25, hoje=date(2025, 6, 15))
+        self.assertEqual((Turma.objects.count(), Aluno.objects.count()), (4, 60))
+        self.assertEqual(Pagamento.objects.count(), resultado.pagamentos)
+        self.assertGreater(resultado.pagamentos, 60)
+        self.assertFalse(Pagamento.objects.filter(data_vencimento__gt=date(2025, 6, 10)).exists())
+        self.assertTrue(Pagamento.objects.filter(data_pagamento__isnull=True, data_vencimento__lt=date(2025, 6, 1)).exists())
+        self.assertEqual(rollup.verificar(), {})
+
+    def test_benchmark_mede_e_compara_com_a_base(self):
+        gerar_dados(turmas=3, alunos=30, anos=1, semente=1)
+        User.objects.create_superuser("admin")
+        relatorio = benchmark.executar(repeticoes=1)
+        self.assertEqual(relatorio["volumes"]["alunos"], 30)
+        self.assertEqual(len([n for n in relatorio["resultados"] if n.startswith("pagamentos_filter[")]), 32)
+        self.assertIn("gerar_pagamentos_mes", relatorio["resultados"])
+        for cenario in ("dashboard_widgets", "dashboard_dados"):
+            # Mesmos endpoints pelos dois handlers: mesmas consultas
+            wsgi, asgi = (relatorio["resultados"][f"{cenario}[{handler}]"] for handler in ("wsgi", "asgi"))
+            self.assertEqual(wsgi["consultas"], asgi["consultas"])
+        self.assertEqual(Pagamento.objects.count(), relatorio["volumes"]["pagamentos"])  # geração desfeita
+
+        base = {"resultados": {"dashboard": {"mediana_ms": 0.001, "consultas": 0}}}
+        self.assertEqual([nome for nome, _ in benchmark.comparar(relatorio, base)], ["dashboard", "dashboard"])
+        self.assertEqual(benchmark.comparar(relatorio, relatorio), [])
+
+
+class DashboardConcorrenteTests(TransactionTestCase):
+    # Cada thread do pool abre a própria conexão: os dados precisam estar commitados
+    serialized_rollback = True
+
+    def setUp(self):
+        turma = Turma.objects.create(nome="Sub 9")
+        aluno = Aluno.objects.create(nome_completo="Ana", data_nascimento=date(2016, 1, 1), turma=turma)
+        hoje = date.today()
+        Pagamento.objects.create(aluno=aluno, data_vencimento=hoje.replace(day=10), valor=Decimal("40"),
+                                 data_pagamento=hoje, forma_pagamento="PIX")
+        Pagamento.objects.create(aluno=aluno, data_vencimento=hoje.replace(day=1), valor=Decimal("50"))
+        self.client.force_login(User.objects.create_user("secretaria"))
+
+    def test_agregacoes_em_paralelo_iguais_aos_endpoints_separados(self):
+        with override_settings(DASHBOARD_CONCORRENCIA=3):
+            resposta = self.client.get("/api/metricas/dashboard/")
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        for nome in ("indicadores", "faturamento", "formas"):
+            separado = self.client.get(reverse(f"metricas_{nome}")).json()
+            filtros = {chave: separado.pop(chave) for chave in ("inicio", "fim", "turma")}
+            self.assertEqual(dados[nome], separado)
+            self.assertEqual({chave: dados[chave] for chave in filtros}, filtros)
+        # As consultas das threads entram na medição da requisição
+        self.assertGreaterEqual(int(resposta["X-Query-Count"]), 3)
+
+    def test_em_paralelo_mantem_a_ordem_e_usa_o_pool(self):
+        threads = lambda atraso: lambda: (time.sleep(atraso), threading.current_thread().name)[1]
+        with override_settings(DASHBOARD_CONCORRENCIA=2):
+            nomes = async_to_sync(em_paralelo)(threads(0.05), threads(0))
+        self.assertEqual(len(nomes), 2)
+        self.assertTrue(all(nome.startswith("dashboard") for nome in nomes))
+
+
+@override_settings(DATABASE_REPLICA="replica")
+class ReplicaTests(TransactionTestCase):
+    # Nos testes "replica" espelha o default (TEST MIRROR): são duas conexões,
+    # então os dados precisam estar commitados para a réplica enxergar.
+    databases = {"default", "replica"}
+    serialized_rollback = True
+
+    def setUp(self):
+        turma = Turma.objects.create(nome="Sub 9")
+        aluno = Aluno.objects.create(nome_completo="Ana", data_nascimento=date(2016, 1, 1), turma=turma)
+        self.pagamento = Pagamento.objects.create(aluno=aluno, data_vencimento=date(2025, 1, 10), valor=Decimal("40"))
+        self.client.force_login(User.objects.create_user("secretaria"))
+
+    def test_roteamento(self):
+        self.assertEqual(Pagamento.objects.all().db, "default")
+        with usar_replica():
+            self.assertEqual(Pagamento.objects.all().db, "replica")
+            self.assertEqual(Pagamento.objects.get().pk, self.pagamento.pk)
+            self.pagamento.valor = Decimal("45")
+            self.pagamento.save()  # escrita sempre no primário
+        with override_settings(DATABASE_REPLICA=None), usar_replica():
+            self.assertEqual(Pagamento.objects.all().db, "default")
+
+    def test_view_de_leitura_usa_replica_ate_o_usuario_gravar(self):
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            self.client.get("/pagamentos/")
+        self.assertTrue(replica.captured_queries)
+
+        resposta = self.client.post("/pagamentos/acao/", {"acao": acoes.VENCIMENTO, "data_acao": "2025-02-10",
+                                                           "selecionados": [self.pagamento.pk]})
+        self.assertIn(COOKIE_PRIMARIO, resposta.cookies)
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            resposta = self.client.get("/pagamentos/")
+        self.assertEqual(replica.captured_queries, [])
+        self.assertContains(resposta, "10 de Fevereiro de 2025")
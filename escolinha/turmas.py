@@ -0,0 +1,83 @@
+# escolinha/turmas.py
+"""Filtro de turma compartilhado e resumo por turma.
+
+``filtro_turma`` monta as opções e a turma selecionada para os formulários
+de filtro (dashboard, pagamentos, alunos) a partir do cache de referência
+(``escolinha.referencia``), sem consultar o banco.
+``resumo_turmas`` calcula os números de todas as turmas em um único
+``GROUP BY``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, FilteredRelation, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .datas import primeiro_dia, somar_meses
+from .models import Turma
+from .referencia import turmas_ativas
+
+
+def turma_selecionada(params):
+    """Id da turma em ``params["turma"]`` como texto, ou "" se ausente/inválido."""
+    turma = (params.get("turma") or "").strip()
+    return turma if turma.isdigit() else ""
+
+
+def filtro_turma(params):
+    """Contexto do select de turma: ``turmas`` e ``filtro_turma``."""
+    return {"turmas": turmas_ativas(), "filtro_turma": turma_selecionada(params)}
+
+
+_ZERO = Value(0, output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _calcular_resumo(inicio, fim, hoje):
+    # Um só JOIN com os pagamentos que interessam (do mês ou atrasados);
+    # dois JOINs separados multiplicariam as linhas e inflariam as somas.
+    do_mes = Q(pagamentos_resumo__data_vencimento__gte=inicio, pagamentos_resumo__data_vencimento__lt=fim)
+    atrasado = Q(pagamentos_resumo__data_pagamento__isnull=True, pagamentos_resumo__data_vencimento__lt=hoje)
+    return list(
+        Turma.objects.filter(status=True)
+        .annotate(pagamentos_resumo=FilteredRelation(
+            "alunos__pagamentos",
+            condition=(
+                Q(alunos__pagamentos__data_vencimento__gte=inicio, alunos__pagamentos__data_vencimento__lt=fim)
+                | Q(alunos__pagamentos__data_pagamento__isnull=True, alunos__pagamentos__data_vencimento__lt=hoje)
+            ),
+        ))
+        .annotate(
+            alunos_ativos=Count("alunos", filter=Q(alunos__is_active=True), distinct=True),
+            esperado=Coalesce(Sum("pagamentos_resumo__valor", filter=do_mes), _ZERO),
+            recebido=Coalesce(
+                Sum("pagamentos_resumo__valor", filter=do_mes & Q(pagamentos_resumo__data_pagamento__isnull=False)),
+                _ZERO,
+            ),
+            parcelas_atrasadas=Count("pagamentos_resumo", filter=atrasado),
+            alunos_atrasados=Count("alunos", filter=atrasado, distinct=True),
+        )
+        .order_by("nome")
+        .values(
+            "id", "nome", "descricao", "alunos_ativos", "esperado", "recebido",
+            "parcelas_atrasadas", "alunos_atrasados",
+        )
+    )
+
+
+def resumo_turmas(ano=None, mes=None, hoje=None):
+    """Alunos ativos, esperado/recebido do mês e atrasos de cada turma ativa.
+
+    Com ``TURMAS_RESUMO_CACHE_TIMEOUT`` > 0 o resultado fica em cache por
+    esse tempo (os números podem atrasar até lá).
+    """
+    hoje = hoje or timezone.now().date()
+    inicio = primeiro_dia(ano or hoje.year, mes or hoje.month)
+    fim = somar_meses(inicio, 1)
+    timeout = settings.TURMAS_RESUMO_CACHE_TIMEOUT
+    if not timeout:
+        return _calcular_resumo(inicio, fim, hoje)
+    return cache.get_or_set(
+        f"turmas:resumo:{inicio:%Y-%m}:{hoje:%Y-%m-%d}",
+        lambda: _calcular_resumo(inicio, fim, hoje),
+        timeout=timeout,
+    )
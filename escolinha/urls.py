@@ -6,6 +6,11 @@ urlpatterns = [
     path('', views.alunos_list, name='alunos_list'),
 
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/cache/', views.dashboard_cache_stats, name='dashboard_cache_stats'),
+    path('api/metricas/indicadores/', views.metricas_indicadores, name='metricas_indicadores'),
+    path('api/metricas/faturamento/', views.metricas_faturamento, name='metricas_faturamento'),
+    path('api/metricas/formas/', views.metricas_formas, name='metricas_formas'),
+    path('api/metricas/dashboard/', views.metricas_dashboard, name='metricas_dashboard'),
 
     path('alunos/create/', views.aluno_create, name='aluno_create'),
     path('alunos/<int:pk>/edit/', views.aluno_update, name='aluno_update'),
@@ -15,6 +20,20 @@ urlpatterns = [
     path('pagamentos/<int:pk>/edit/', views.pagamento_update, name='pagamento_update'),
     path('pagamentos/<int:pk>/delete/', views.pagamento_delete, name='pagamento_delete'),
     path("pagamentos/", views.pagamentos_filter_view, name="pagamentos_filter"),
+    path("pagamentos/acao/", views.pagamentos_acao, name="pagamentos_acao"),
+    path("pagamentos/exportar/", views.pagamentos_exportar, name="pagamentos_exportar"),
+    path("exportacoes/<uuid:tarefa>/", views.exportacao_status, name="exportacao_status"),
+    path("exportacoes/<uuid:tarefa>/download/", views.exportacao_download, name="exportacao_download"),
+
+    path("importacoes/", views.importacao_create, name="importacao_create"),
+    path("importacoes/<uuid:tarefa>/", views.importacao_status, name="importacao_status"),
+
+    path("conciliacoes/", views.conciliacao_create, name="conciliacao_create"),
+    path("conciliacoes/<int:pk>/", views.conciliacao_detail, name="conciliacao_detail"),
+    path("lancamentos/<int:pk>/revisar/", views.lancamento_revisar, name="lancamento_revisar"),
+
+    path("campanhas/create/", views.campanha_create, name="campanha_create"),
+    path("campanhas/<int:pk>/", views.campanha_detail, name="campanha_detail"),
 
     path('turmas/', views.turmas_list, name='turmas_list'),
     path('turmas/create/', views.turma_create, name='turma_create'),
@@ -1,33 +1,86 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Sum, F, Q
+from django.contrib import messages
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from .models import Aluno, Pagamento, Turma
-from .forms import AlunoForm, PagamentoForm, TurmaForm
-from datetime import date, timedelta
-import calendar
-from django.db.models import Count
+from .forms import AcaoPagamentosForm, AlunoForm, ConciliacaoForm, ImportacaoForm, PagamentoForm, TurmaForm
+from .filtros import ORDEM_PAGAMENTOS, filtrar_pagamentos, filtros_pagamentos
+from .paginacao import CursorPaginator, contagem_aproximada, parametros_filtro
+from .exportacao import FORMATOS, arquivo_pronto, csv_em_partes, linhas_pagamentos
+from .tasks import disparar_campanha, exportar_pagamentos, importar_csv
+from .importacao import PASTA as PASTA_IMPORTACAO, nome_relatorio
+from .models import Campanha, Conciliacao, LancamentoExtrato, MensagemCampanha
+from . import campanhas as campanhas_whatsapp
+from . import acoes, busca, cache as cache_dashboard, conciliacao as conciliacao_extrato, metricas, saldos
+from .arquivamento import historico_pagamentos
+from .datas import competencias, primeiro_dia, somar_meses, ultimo_dia
+from .concorrencia import em_paralelo
+from .mensagens import links_whatsapp
+from .roteamento import alias_leitura, leitura_replica
+from .turmas import filtro_turma, resumo_turmas, turma_selecionada, turmas_ativas
+from datetime import date
+from functools import partial
+import json
+from urllib.parse import urlencode
+import uuid
 from django.core.paginator import Paginator
+from django.urls import reverse
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
-import json
+from django.views.decorators.http import require_POST
 
 
 
 
 # ----- Alunos -----
 @login_required
+@leitura_replica
 def alunos_list(request):
-    alunos = Aluno.objects.filter(is_active=True).select_related("turma").order_by("nome_completo")
-    page_number = request.GET.get("page", 1)
-
-    # --- Paginação ---
-    paginator = Paginator(alunos, 20)
-    page_obj = paginator.get_page(page_number)
-
-    return render(request, "escolinha/alunos_list.html", {"alunos": page_obj, "page_obj": page_obj})
+    alunos = Aluno.objects.filter(is_active=True).select_related("turma")
+    termo = request.GET.get("q", "").strip()
+    cursor = request.GET.get("cursor")
+    ordem = request.GET.get("ordem", "nome")
+    if ordem not in saldos.ORDENS:
+        ordem = "nome"
+    situacao = request.GET.get("situacao", "")
+    if situacao not in saldos.SITUACOES:
+        situacao = ""
+
+    filtro = filtro_turma(request.GET)
+
+    # Busca por nome (sem acento, por início de palavra)
+    if termo:
+        alunos = busca.filtrar(alunos, termo)
+    if filtro["filtro_turma"]:
+        alunos = alunos.filter(turma_id=filtro["filtro_turma"])
+
+    # Saldo, atraso e último pagamento na mesma query da listagem
+    alunos = saldos.filtrar_situacao(saldos.anotar_saldos(alunos), situacao)
+
+    # --- Paginação por cursor ---
+    paginator = CursorPaginator(alunos, 20, ordering=saldos.ORDENS[ordem])
+    page_obj = paginator.get_page(cursor)
+
+    return render(request, "escolinha/alunos_list.html", {
+        "alunos": page_obj,
+        "page_obj": page_obj,
+        "filtro_q": termo,
+        "filtro_situacao": situacao,
+        "ordem": ordem,
+        # Filtros mantidos nos links da paginação
+        "filtros": parametros_filtro(
+            q=termo, situacao=situacao, turma=filtro["filtro_turma"], ordem=ordem if ordem != "nome" else "",
+        ),
+        **filtro,
+    })
 
 @login_required
+@leitura_replica
 def turmas_list(request):
-    turmas = Turma.objects.filter(status=True).order_by("nome")
+    # Números do mês de todas as turmas em um único GROUP BY
+    turmas = resumo_turmas()
     page_number = request.GET.get("page", 1)
 
     # --- Paginação ---
@@ -59,7 +112,7 @@ def turma_create(request):
 
 @login_required
 def aluno_update(request, pk):
-    aluno = get_object_or_404(Aluno, pk=pk)
+    aluno = get_object_or_404(Aluno.objects.select_related("turma"), pk=pk)
     if request.method == "POST":
         form = AlunoForm(request.POST, instance=aluno)
         if form.is_valid():
@@ -87,12 +140,14 @@ def turma_update(request, pk):
 @login_required
 def pagamentos_list(request, aluno_id):
     aluno = get_object_or_404(Aluno, pk=aluno_id)
-    pagamentos = aluno.pagamentos.select_related("aluno").all().order_by("-data_vencimento")
+    # Histórico arquivado só quando pedido (?arquivados=1)
+    arquivados = request.GET.get("arquivados") == "1"
+    pagamentos = historico_pagamentos(aluno, arquivados=arquivados)
+    links_whatsapp(pagamentos)
     return render(request, "escolinha/pagamentos_list.html", {
         "aluno": aluno, 
         "pagamentos": pagamentos,
-        "msg_cobranca": whatsapp_message("cobranca"),
-        "msg_aviso": whatsapp_message("aviso"),        
+        "arquivados": arquivados,
         })
 
 
@@ -116,7 +171,7 @@ def pagamento_create(request, aluno_id):
 
 @login_required
 def pagamento_update(request, pk):
-    pagamento = get_object_or_404(Pagamento, pk=pk)
+    pagamento = get_object_or_404(Pagamento.objects.select_related("aluno"), pk=pk)
     if request.method == "POST":
         form = PagamentoForm(request.POST, instance=pagamento)
         if form.is_valid():
@@ -130,7 +185,7 @@ def pagamento_update(request, pk):
 
 @login_required
 def pagamento_delete(request, pk):
-    pagamento = get_object_or_404(Pagamento, pk=pk)
+    pagamento = get_object_or_404(Pagamento.objects.select_related("aluno"), pk=pk)
     aluno_id = pagamento.aluno.id
     if request.method == "POST":
         pagamento.delete()
@@ -141,191 +196,360 @@ def pagamento_delete(request, pk):
 
 
 @login_required
-def dashboard(request):
+@leitura_replica
+async def dashboard(request):
+    # Só o esqueleto da página; os widgets vêm de metricas_dashboard, que
+    # calcula as agregações ao mesmo tempo.
     today = timezone.now().date()
     year = int(request.GET.get("year", today.year))
     month = int(request.GET.get("month", today.month))
-    turma = request.GET.get("turma")
-
-    first_day = date(year, month, 1)
-    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    context = {
+        "year": year,
+        "month": month,
+        **await sync_to_async(filtro_turma)(request.GET),
+    }
+    return await sync_to_async(render)(request, "escolinha/dashboard.html", context)
 
-    # Base queryset para aplicar filtro de turma
-    pagamentos_base = Pagamento.objects.filter(data_vencimento__range=(first_day, last_day))
-    if turma:
-        pagamentos_base = pagamentos_base.filter(aluno__turma__id=turma)
 
-    # --- Indicadores principais ---
-    esperado = pagamentos_base.aggregate(total=Sum("valor"))["total"] or 0
+@login_required
+def dashboard_cache_stats(request):
+    return JsonResponse(cache_dashboard.estatisticas())
 
-    recebido = pagamentos_base.filter(
-        data_pagamento__isnull=False
-    ).aggregate(total=Sum("valor"))["total"] or 0
 
-    ativos = (
-        pagamentos_base.values("aluno")
-        .distinct()
-        .count()
+# ----- Métricas (JSON) -----
+# Views assíncronas: cada cálculo (ORM + cache, síncronos) roda em uma
+# thread de escolinha.concorrencia, e os independentes rodam juntos.
+def _filtros_metricas(request):
+    """Mês (``year``/``month``) ou intervalo (``inicio``/``fim``, AAAA-MM-DD)
+    e turma dos endpoints de métricas. ValueError se inválidos."""
+    hoje = timezone.now().date()
+    turma = turma_selecionada(request.GET) or None
+    if "inicio" in request.GET or "fim" in request.GET:
+        try:
+            inicio = date.fromisoformat(request.GET["inicio"])
+            fim = date.fromisoformat(request.GET["fim"])
+        except KeyError:
+            raise ValueError("Informe inicio e fim.")
+        if inicio > fim:
+            raise ValueError("inicio deve ser anterior ou igual a fim.")
+        # Conta sem montar a lista: o intervalo ainda não foi limitado
+        if (fim.year - inicio.year) * 12 + fim.month - inicio.month >= settings.METRICAS_MAX_MESES:
+            raise ValueError(f"O intervalo pode ter no máximo {settings.METRICAS_MAX_MESES} meses.")
+        return None, inicio, fim, turma, hoje
+    ano = int(request.GET.get("year", hoje.year))
+    mes = int(request.GET.get("month", hoje.month))
+    return (ano, mes), primeiro_dia(ano, mes), ultimo_dia(ano, mes), turma, hoje
+
+
+async def _resposta_metricas(request, **calculos):
+    """Roda os ``calculos`` (nome -> função dos filtros) ao mesmo tempo. Com
+    um só cálculo os dados vão na raiz da resposta; com vários, cada um sob
+    o seu nome."""
+    try:
+        filtros = _filtros_metricas(request)
+    except ValueError as exc:
+        return JsonResponse({"erro": str(exc)}, status=400)
+    competencia, inicio, fim, turma, hoje = filtros
+    resultados = await em_paralelo(*(partial(calcular, *filtros) for calcular in calculos.values()))
+    dados = resultados[0] if len(calculos) == 1 else dict(zip(calculos, resultados))
+    return JsonResponse({
+        "inicio": inicio,
+        "fim": fim,
+        "turma": turma,
+        **dados,
+    })
+
+
+def _indicadores(competencia, inicio, fim, turma, hoje):
+    if competencia:
+        return cache_dashboard.obter_ou_calcular(
+            "indicadores", (*competencia, hoje), [inicio], turma,
+            lambda: metricas.indicadores_mes(*competencia, turma, hoje=hoje),
+        )
+    return cache_dashboard.obter_ou_calcular(
+        "indicadores", (inicio, fim, hoje), competencias(inicio, fim), turma,
+        lambda: metricas.indicadores(inicio, fim, turma, hoje=hoje),
     )
 
-    atrasado = pagamentos_base.filter(
-        data_pagamento__isnull=True,
-        data_vencimento__lt=today
-    ).aggregate(total=Sum("valor"))["total"] or 0
 
-    taxa = (float(recebido) / float(esperado) * 100) if esperado else None
+def _faturamento(competencia, inicio, fim, turma, hoje):
+    # Sem intervalo, os últimos 6 meses até hoje (como no dashboard)
+    meses = competencias(inicio, fim) if not competencia else [somar_meses(hoje, -i) for i in range(5, -1, -1)]
+    serie = cache_dashboard.obter_ou_calcular(
+        "faturamento", (meses[0], meses[-1]), meses, turma,
+        lambda: metricas.faturamento_mensal(meses[-1], meses=len(meses), turma=turma),
+    )
+    return {
+        "labels": [item["mes"] for item in serie],
+        "values": [item["valor"] for item in serie],
+    }
 
-    # --- Últimos 6 meses (base: data_vencimento) ---
-    faturamento_6m = []
-    for i in range(5, -1, -1):
-        ref = today.replace(day=1) - timedelta(days=30 * i)
-        ano, mes = ref.year, ref.month
-        primeiro = date(ano, mes, 1)
-        ultimo = date(ano, mes, calendar.monthrange(ano, mes)[1])
 
-        pagamentos_mes = Pagamento.objects.filter(
-            data_vencimento__range=(primeiro, ultimo),
-            data_pagamento__isnull=False
+def _formas(competencia, inicio, fim, turma, hoje):
+    if competencia:
+        formas = cache_dashboard.obter_ou_calcular(
+            "formas", competencia, [inicio], turma,
+            lambda: metricas.formas_pagamento_mes(*competencia, turma),
         )
-        if turma:
-            pagamentos_mes = pagamentos_mes.filter(aluno__turma__id=turma)
+    else:
+        formas = cache_dashboard.obter_ou_calcular(
+            "formas", (inicio, fim), competencias(inicio, fim), turma,
+            lambda: metricas.formas_pagamento(inicio, fim, turma),
+        )
+    return {
+        "labels": [f["forma_pagamento"] for f in formas],
+        "values": [f["total"] for f in formas],
+    }
 
-        total = pagamentos_mes.aggregate(total=Sum("valor"))["total"] or 0
-        faturamento_6m.append({
-            "mes": f"{mes:02d}/{ano}",
-            "valor": float(total),
-        })
 
-    faturamento_labels = [item["mes"] for item in faturamento_6m]
-    faturamento_values = [item["valor"] for item in faturamento_6m]
+@login_required
+@leitura_replica
+async def metricas_indicadores(request):
+    return await _resposta_metricas(request, indicadores=_indicadores)
 
-    # --- Formas de pagamento (também pelo mês de vencimento) ---
-    formas = (
-        pagamentos_base.filter(data_pagamento__isnull=False)
-        .values("forma_pagamento")
-        .annotate(total=Count("id"))
-    )
-    formas_labels = [f["forma_pagamento"] for f in formas]
-    formas_values = [f["total"] for f in formas]
 
-    # Buscar turmas ativas para o filtro
-    turmas = Turma.objects.filter(status=True).order_by("nome")
+@login_required
+@leitura_replica
+async def metricas_faturamento(request):
+    return await _resposta_metricas(request, faturamento=_faturamento)
 
-    context = {
-        "recebido": recebido,
-        "esperado": esperado,
-        "ativos": ativos,
-        "atrasado": atrasado,
-        "taxa": taxa,
-        "faturamento_labels": json.dumps(faturamento_labels),
-        "faturamento_values": json.dumps(faturamento_values),
-        "formas_labels": json.dumps(formas_labels),
-        "formas_values": json.dumps(formas_values),
-        "year": year,
-        "month": month,
-        "turmas": turmas,
-        "filtro_turma": turma,
-    }
-    return render(request, "escolinha/dashboard.html", context)
 
+@login_required
+@leitura_replica
+async def metricas_formas(request):
+    return await _resposta_metricas(request, formas=_formas)
 
 
 @login_required
-def pagamentos_filter_view(request):
-    aluno_nome = request.GET.get("aluno", "").strip()
-    status = request.GET.get("status")
-    turma = request.GET.get("turma")
-    data = request.GET.get("data")  # YYYY-MM
-    page_number = request.GET.get("page", 1)
+@leitura_replica
+async def metricas_dashboard(request):
+    """Os três widgets do dashboard em uma resposta, calculados ao mesmo tempo."""
+    return await _resposta_metricas(request, indicadores=_indicadores, faturamento=_faturamento, formas=_formas)
 
-    pagamentos = Pagamento.objects.select_related("aluno").all()
 
-    # Filtro por aluno
-    if aluno_nome:
-        pagamentos = pagamentos.filter(aluno__nome_completo__icontains=aluno_nome)
 
-    # Filtro por status
-    hoje = timezone.now().date()
-    if status == "pago":
-        pagamentos = pagamentos.filter(data_pagamento__isnull=False)
-    elif status == "pendente":
-        pagamentos = pagamentos.filter(data_pagamento__isnull=True, data_vencimento__gte=hoje)
-    elif status == "atrasado":
-        pagamentos = pagamentos.filter(data_pagamento__isnull=True, data_vencimento__lt=hoje)
-    
-    # Filtro por turma
-    if turma:
-        pagamentos = pagamentos.filter(aluno__turma__id=turma)
-
-    # Filtro por mês/ano
-    if data:
-        ano, mes = map(int, data.split('-'))
-        pagamentos = pagamentos.filter(data_vencimento__year=ano, data_vencimento__month=mes)
+@login_required
+@leitura_replica
+def pagamentos_filter_view(request):
+    filtros = filtros_pagamentos(request.GET)
+    cursor = request.GET.get("cursor")
 
-    # --- Paginação ---
-    paginator = Paginator(pagamentos, 20)  # 20 itens por página
-    page_obj = paginator.get_page(page_number)
+    pagamentos = filtrar_pagamentos(filtros, queryset=Pagamento.objects.select_related("aluno"))
+
+    # --- Paginação por cursor (vencimento desc, aluno, id) ---
+    paginator = CursorPaginator(pagamentos, 20, ordering=ORDEM_PAGAMENTOS)
+    page_obj = paginator.get_page(cursor)
+    links_whatsapp(page_obj.object_list)
 
-    turmas = Turma.objects.filter(status=True).order_by("nome")
-
-    # Extra query para manter filtros no href da paginação
-    extra_query = ""
-    if aluno_nome:
-        extra_query += f"&aluno={aluno_nome}"
-    if status:
-        extra_query += f"&status={status}"
-    if data:
-        extra_query += f"&data={data}"
-    if turma:
-        extra_query += f"&turma={turma}"
+    competencia = filtros["competencia"]
     context = {
         "page_obj": page_obj,
-        "filtro_aluno": aluno_nome,
-        "filtro_status": status,
-        "ano": str(ano) if data else "",
-        "mes": f"{mes:02d}" if data else "",
-        "extra_query": extra_query,
-        "msg_cobranca": whatsapp_message("cobranca"),
-        "msg_aviso": whatsapp_message("aviso"),
-        "turmas": turmas,
-        "filtro_turma": turma,
+        "filtro_aluno": filtros["aluno"],
+        "filtro_status": filtros["status"],
+        "ano": str(competencia.year) if competencia else "",
+        "mes": f"{competencia.month:02d}" if competencia else "",
+        # Filtros mantidos nos links da paginação
+        "filtros": parametros_filtro(
+            aluno=filtros["aluno"], status=filtros["status"], data=filtros["data"], turma=filtros["turma"],
+        ),
+        "turmas": turmas_ativas(),
+        "filtro_turma": filtros["turma"],
+        "acao_form": AcaoPagamentosForm(),
     }
     return render(request, "escolinha/pagamentos_filter.html", context)
 
 
+@login_required
+@require_POST
+def pagamentos_acao(request):
+    """Ação em massa nos pagamentos marcados ou em todo o resultado do filtro."""
+    form = AcaoPagamentosForm(request.POST)
+    if not form.is_valid():
+        for erros in form.errors.values():
+            messages.error(request, erros[0])
+    else:
+        dados = form.cleaned_data
+        pagamentos = acoes.selecionar(request.POST, dados["selecionados"], dados["todos"])
+        if dados["acao"] == acoes.PAGAR:
+            quantidade = acoes.marcar_pagos(pagamentos, dados["data_acao"], dados["forma_pagamento"])
+            messages.success(request, f"{quantidade} pagamento(s) marcados como pagos.")
+        elif dados["acao"] == acoes.VENCIMENTO:
+            quantidade = acoes.alterar_vencimento(pagamentos, dados["data_acao"])
+            messages.success(request, f"Vencimento alterado em {quantidade} pagamento(s).")
+        else:
+            quantidade = acoes.excluir(pagamentos)
+            messages.success(request, f"{quantidade} pagamento(s) excluídos.")
+    # Volta para a mesma tela, com os filtros
+    filtros = parametros_filtro(**{campo: request.POST.get(campo) for campo in ("aluno", "status", "turma", "data")})
+    return redirect(f"{reverse('pagamentos_filter')}?{urlencode(filtros)}" if filtros else "pagamentos_filter")
+
+
+# ----- Exportação -----
+@login_required
+@leitura_replica
+def pagamentos_exportar(request):
+    """Exporta os pagamentos com os filtros da tela de pagamentos.
+
+    CSV de até ``EXPORTACAO_LIMITE_STREAMING`` linhas é enviado em streaming
+    (lido depois que a view retorna, por isso o alias vai fixo no queryset);
+    acima disso (ou em XLSX, ou com ``segundo_plano=1``) vira uma tarefa e o
+    usuário acompanha o arquivo em ``exportacao_status``.
+    """
+    formato = request.GET.get("formato", "csv")
+    if formato not in FORMATOS:
+        formato = "csv"
+    filtros = filtros_pagamentos(request.GET)
+
+    segundo_plano = (
+        formato != "csv"
+        or request.GET.get("segundo_plano") == "1"
+        or contagem_aproximada(filtrar_pagamentos(filtros)) > settings.EXPORTACAO_LIMITE_STREAMING
+    )
+    if segundo_plano:
+        parametros = {campo: filtros[campo] for campo in ("aluno", "status", "turma", "data")}
+        tarefa = exportar_pagamentos.delay(parametros, formato)
+        return redirect("exportacao_status", tarefa=tarefa.id)
+
+    resposta = StreamingHttpResponse(
+        csv_em_partes(linhas_pagamentos(filtros, using=alias_leitura())), content_type="text/csv; charset=utf-8"
+    )
+    nome = f"pagamentos-{timezone.now():%Y%m%d-%H%M}.csv"
+    resposta["Content-Disposition"] = f'attachment; filename="{nome}"'
+    return resposta
 
-import urllib.parse
 
-def whatsapp_message(tipo="aviso"):
-    if tipo == "cobranca":
-        msg = """Olá! Tudo bem?
+@login_required
+def exportacao_status(request, tarefa):
+    pronto = arquivo_pronto(tarefa)
+    erro = False
+    if not pronto:
+        erro = exportar_pagamentos.AsyncResult(str(tarefa)).state == "FAILURE"
+    return render(request, "escolinha/exportacao_status.html", {
+        "tarefa": tarefa,
+        "pronto": pronto is not None,
+        "erro": erro,
+    })
 
-Verificamos que a mensalidade da escolinha de futsal ainda não foi identificada em nosso sistema.
-Pedimos, por gentileza, que o pagamento seja realizado o quanto antes, para evitar qualquer interrupção nas atividades do aluno.
 
-Pagamento via Pix
-Chave Pix: 51997457095
-Nome: Renato da Costa
+@login_required
+def exportacao_download(request, tarefa):
+    pronto = arquivo_pronto(tarefa)
+    if not pronto:
+        raise Http404("Exportação não encontrada ou ainda em andamento.")
+    nome, formato = pronto
+    return FileResponse(
+        default_storage.open(nome, "rb"), as_attachment=True, filename=f"pagamentos-{tarefa}.{formato}"
+    )
 
-Caso o pagamento já tenha sido efetuado, por favor, desconsidere esta mensagem. ✅
 
-Agradecemos sua compreensão e colaboração.
 
-Atenciosamente,
-Equipe AVCL – Associação Vila Costa Lagoão"""
+# ----- Importação -----
+@login_required
+def importacao_create(request):
+    """Recebe o CSV e agenda a importação; o resultado sai em ``importacao_status``."""
+    if request.method == "POST":
+        form = ImportacaoForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = default_storage.save(f"{PASTA_IMPORTACAO}/{uuid.uuid4().hex}.csv", form.cleaned_data["arquivo"])
+            tarefa = importar_csv.delay(form.cleaned_data["tipo"], arquivo)
+            return redirect("importacao_status", tarefa=tarefa.id)
     else:
-        msg = """Olá! Tudo bem?
+        form = ImportacaoForm()
+    return render(request, "escolinha/importacao_form.html", {"form": form})
 
-A AVCL – Associação Vila Costa Lagoão lembra que a mensalidade da escolinha de futsal já está disponível para pagamento.
-Pedimos que o pagamento seja realizado o quanto antes, garantindo que o aluno continue participando normalmente das atividades.
 
-Forma de pagamento – Pix
-Chave Pix: 51997457095
-Nome: Renato da Costa
+@login_required
+def importacao_status(request, tarefa):
+    relatorio = None
+    erro = False
+    if default_storage.exists(nome_relatorio(tarefa)):
+        with default_storage.open(nome_relatorio(tarefa)) as arquivo:
+            relatorio = json.load(arquivo)
+    else:
+        erro = importar_csv.AsyncResult(str(tarefa)).state == "FAILURE"
+    return render(request, "escolinha/importacao_status.html", {
+        "tarefa": tarefa,
+        "relatorio": relatorio,
+        "erro": erro,
+    })
 
-Agradecemos pela atenção e pela parceria de sempre!
 
-Atenciosamente,
-Equipe AVCL – Associação Vila Costa Lagoão"""
+# ----- Campanhas de WhatsApp -----
+@login_required
+@require_POST
+def campanha_create(request):
+    """Cria a campanha com os filtros da tela de pagamentos e agenda o envio."""
+    tipo = request.POST.get("tipo", "cobranca")
+    if tipo not in dict(Campanha.TIPOS):
+        tipo = "cobranca"
+    campanha = campanhas_whatsapp.criar_campanha(tipo, request.POST, usuario=request.user)
+    disparar_campanha.delay(campanha.id)
+    return redirect("campanha_detail", pk=campanha.pk)
 
-    return urllib.parse.quote(msg)  # aplica urlencode
\ No newline at end of file
+
+@login_required
+def campanha_detail(request, pk):
+    campanha = get_object_or_404(Campanha, pk=pk)
+    context = {
+        "campanha": campanha,
+        "resumo": campanhas_whatsapp.resumo(campanha),
+        "falhas": campanha.mensagens.filter(status=MensagemCampanha.FALHA).select_related("aluno")[:100],
+    }
+    return render(request, "escolinha/campanha_detail.html", context)
+
+
+# ----- Conciliação de extratos -----
+@login_required
+def conciliacao_create(request):
+    """Recebe o extrato e concilia na hora; os ambíguos vão para a revisão."""
+    if request.method == "POST":
+        form = ConciliacaoForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data["arquivo"]
+            try:
+                conciliacao = conciliacao_extrato.conciliar(arquivo.name, arquivo.read(), usuario=request.user)
+            except ValueError as erro:
+                form.add_error("arquivo", str(erro))
+            else:
+                return redirect("conciliacao_detail", pk=conciliacao.pk)
+    else:
+        form = ConciliacaoForm()
+    return render(request, "escolinha/conciliacao_form.html", {"form": form})
+
+
+@login_required
+def conciliacao_detail(request, pk):
+    conciliacao = get_object_or_404(Conciliacao, pk=pk)
+    lancamentos = list(conciliacao.lancamentos.select_related("pagamento__aluno"))
+    # Candidatos da fila de revisão em uma query
+    ids = {pk for l in lancamentos if l.status == LancamentoExtrato.REVISAO for pk in l.candidatos}
+    candidatos = Pagamento.objects.select_related("aluno").in_bulk(ids)
+    resumo = {status: 0 for status, _ in LancamentoExtrato.STATUS}
+    for lancamento in lancamentos:
+        resumo[lancamento.status] += 1
+        lancamento.opcoes = [
+            candidatos[pk] for pk in lancamento.candidatos
+            if pk in candidatos and candidatos[pk].data_pagamento is None
+        ]
+    return render(request, "escolinha/conciliacao_detail.html", {
+        "conciliacao": conciliacao,
+        "lancamentos": lancamentos,
+        "resumo": resumo,
+    })
+
+
+@login_required
+@require_POST
+def lancamento_revisar(request, pk):
+    """Confirma um candidato (``pagamento``) ou ignora o lançamento."""
+    lancamento = get_object_or_404(
+        LancamentoExtrato, pk=pk,
+        status__in=(LancamentoExtrato.REVISAO, LancamentoExtrato.SEM_CORRESPONDENCIA),
+    )
+    pagamento = request.POST.get("pagamento", "")
+    if request.POST.get("acao") == "ignorar":
+        lancamento.status = LancamentoExtrato.IGNORADO
+        lancamento.save(update_fields=["status"])
+    elif pagamento.isdigit():
+        conciliacao_extrato.confirmar(lancamento, int(pagamento))
+    return redirect("conciliacao_detail", pk=lancamento.conciliacao_id)
@@ -0,0 +1,94 @@
+# escolinha/whatsapp.py
+"""Backends de envio de mensagens de WhatsApp.
+
+O backend é escolhido por ``WHATSAPP_BACKEND`` (caminho da classe), como o
+``EMAIL_BACKEND`` do Django:
+
+- ``escolinha.whatsapp.HttpBackend``: API HTTP do gateway (WhatsApp Cloud
+  API ou compatível), em ``WHATSAPP_API_URL`` com ``WHATSAPP_API_TOKEN``;
+- ``escolinha.whatsapp.ArquivoBackend``: grava cada mensagem como uma linha
+  JSON em ``WHATSAPP_ARQUIVO`` (desenvolvimento);
+- ``escolinha.whatsapp.MemoriaBackend``: guarda em ``caixa_saida`` (testes).
+"""
+import json
+import urllib.error
+import urllib.request
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+def numero_internacional(contato):
+    """Contato só com dígitos; acrescenta o DDI 55 se faltar."""
+    return contato if contato.startswith("55") and len(contato) > 11 else f"55{contato}"
+
+
+class ErroEnvio(Exception):
+    """Falha temporária (rede, limite do gateway); o envio pode ser repetido."""
+
+
+class ErroEnvioPermanente(ErroEnvio):
+    """Falha que não adianta repetir (número inválido, mensagem recusada)."""
+
+
+# Mensagens enviadas pelo MemoriaBackend
+caixa_saida = []
+
+
+class BaseBackend:
+    def enviar(self, contato, texto):
+        """Envia ``texto`` para ``contato`` e devolve o id da mensagem no
+        gateway. Levanta ``ErroEnvio``/``ErroEnvioPermanente``."""
+        raise NotImplementedError
+
+
+class MemoriaBackend(BaseBackend):
+    def enviar(self, contato, texto):
+        identificador = uuid.uuid4().hex
+        caixa_saida.append({"id": identificador, "contato": contato, "texto": texto})
+        return identificador
+
+
+class ArquivoBackend(BaseBackend):
+    def enviar(self, contato, texto):
+        identificador = uuid.uuid4().hex
+        linha = {"id": identificador, "contato": contato, "texto": texto, "data": timezone.now().isoformat()}
+        with open(settings.WHATSAPP_ARQUIVO, "a", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+        return identificador
+
+
+class HttpBackend(BaseBackend):
+    timeout = 10
+
+    def enviar(self, contato, texto):
+        corpo = json.dumps({
+            "messaging_product": "whatsapp",
+            "to": numero_internacional(contato),
+            "type": "text",
+            "text": {"body": texto},
+        }).encode()
+        requisicao = urllib.request.Request(settings.WHATSAPP_API_URL, data=corpo, method="POST", headers={
+            "Authorization": f"Bearer {settings.WHATSAPP_API_TOKEN}",
+            "Content-Type": "application/json",
+        })
+        try:
+            with urllib.request.urlopen(requisicao, timeout=self.timeout) as resposta:
+                dados = json.load(resposta)
+        except urllib.error.HTTPError as erro:
+            # 429 e 5xx são temporários; os demais 4xx são recusa do gateway
+            if erro.code == 429 or erro.code >= 500:
+                raise ErroEnvio(f"HTTP {erro.code}") from erro
+            raise ErroEnvioPermanente(f"HTTP {erro.code}: {erro.read()[:500]!r}") from erro
+        except (urllib.error.URLError, TimeoutError) as erro:
+            raise ErroEnvio(str(erro)) from erro
+        try:
+            return dados["messages"][0]["id"]
+        except (KeyError, IndexError, TypeError):
+            return ""
+
+
+def obter_backend():
+    return import_string(settings.WHATSAPP_BACKEND)()